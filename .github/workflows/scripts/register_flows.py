@@ -8,6 +8,7 @@ from collections import (
     Counter,
     defaultdict,
 )
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import glob
 import hashlib
 import importlib
@@ -27,6 +28,7 @@ from typing import (
 
 import box
 from loguru import logger
+import networkx as nx
 import prefect
 from prefect.run_configs import UniversalRun
 from prefect.storage import Local
@@ -38,11 +40,26 @@ from prefect.utilities.graphql import (
 from typer import Typer
 
 import pipelines  # DO NOT REMOVE THIS LINE
+from pipelines.constants import constants
+from pipelines.flow_registry import build_manifest
+
+from code_tree_analysis import (  # pylint: disable=wrong-import-order
+    build_dependency_graph,
+)
+from replace_docker_tag import (  # pylint: disable=wrong-import-order
+    FILE_PATH as CONSTANTS_PATH,
+    REPLACE_IMAGE,
+    REPLACE_TAG,
+)
 
 
 app = Typer()
 FlowLike = Union[box.Box, "prefect.Flow"]
 
+# Files the Docker image is built from, added to the salt of the incremental
+# registration so every flow is registered again when the image changes
+IMAGE_FILES = ["Dockerfile", "pyproject.toml", "poetry.lock"]
+
 
 def build_and_register(  # pylint: disable=too-many-branches
     client: "prefect.Client",
@@ -51,6 +68,7 @@ def build_and_register(  # pylint: disable=too-many-branches
     max_retries: int = 5,
     retry_interval: int = 5,
     schedule: bool = True,
+    build_storage: bool = True,
 ) -> Counter:
     """
     (Adapted from Prefect original code.)
@@ -61,6 +79,8 @@ def build_and_register(  # pylint: disable=too-many-branches
         - client (prefect.Client): the prefect client to use
         - flows (List[FlowLike]): the flows to register
         - project_id (str): the project id in which to register the flows
+        - build_storage (bool, optional): whether to build the storage of the
+            flows (ie upload them to GCS) before registering
 
     Returns:
         - Counter: stats about the number of successful, failed, and skipped flows.
@@ -80,7 +100,7 @@ def build_and_register(  # pylint: disable=too-many-branches
     stats = Counter(registered=0, errored=0, skipped=0)
     for storage, _flows in storage_to_flows.items():
         # Build storage if needed
-        if storage is not None:
+        if storage is not None and build_storage:
             logger.info(f"  Building `{type(storage).__name__}` storage...")
             try:
                 storage.build()
@@ -118,8 +138,7 @@ def build_and_register(  # pylint: disable=too-many-branches
                             logger.error(f"Retrying in {retry_interval} seconds...")
                             sleep(retry_interval)
                         else:
-                            stats["errored"] += 1
-                            continue
+                            raise
 
             except Exception:  # pylint: disable=broad-except
                 logger.error(" Error")
@@ -485,6 +504,227 @@ def get_affected_flows(fpath: str = None):
     return flows
 
 
+def hash_source_closure(graph: nx.DiGraph, python_file: str, salt: str = "") -> str:
+    """
+    Returns a hash of a Python file and of every file it depends on, directly or
+    transitively, according to the dependency graph of `code_tree_analysis`.
+
+    Args:
+        - graph (nx.DiGraph): the dependency graph
+        - python_file (str): the path of the file, relative to the repository root
+        - salt (str, optional): extra content to add to the hash
+    """
+    files = {python_file}
+    if python_file in graph:
+        files.update(
+            node
+            for node in nx.ancestors(graph, python_file)
+            if node.endswith(".py") and Path(node).exists()
+        )
+    digest = hashlib.sha256(salt.encode())
+    for file_ in sorted(files):
+        digest.update(file_.encode())
+        digest.update(hashlib.sha256(read_source(file_)).digest())
+    return digest.hexdigest()
+
+
+def read_source(python_file: str) -> bytes:
+    """
+    Returns the content of a file of a source closure. On the constants file, the
+    Docker image name and tag written by `replace_docker_tag.py` are put back to
+    their placeholders, otherwise every commit would change every closure.
+    """
+    content = Path(python_file).read_bytes()
+    if Path(python_file) == CONSTANTS_PATH:
+        content = content.replace(
+            f'"{constants.DOCKER_TAG.value}"'.encode(), f'"{REPLACE_TAG}"'.encode()
+        ).replace(
+            f'"{constants.DOCKER_IMAGE_NAME.value}"'.encode(),
+            f'"{REPLACE_IMAGE}"'.encode(),
+        )
+    return content
+
+
+def get_image_salt() -> dict:
+    """
+    Returns what identifies the Docker image of the flows for the incremental
+    registration: the image name and a hash of the files it is built from. The
+    tag is left out, as it is the commit SHA: flows whose source closure didn't
+    change keep the tag they were last registered with.
+    """
+    digest = hashlib.sha256()
+    for file_ in IMAGE_FILES:
+        if Path(file_).exists():
+            digest.update(file_.encode())
+            digest.update(hashlib.sha256(Path(file_).read_bytes()).digest())
+    return {"name": constants.DOCKER_IMAGE_NAME.value, "files": digest.hexdigest()}
+
+
+def hash_serialized_flow(flow: "prefect.Flow") -> str:
+    """
+    Returns a hash of the serialized flow, without its storage: the storage key
+    has the time the flow was built, so it changes on every build.
+    """
+    serialized = flow.serialize(build=False)
+    serialized.pop("storage", None)
+    return hashlib.sha256(
+        json.dumps(serialized, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def load_registration_cache(path: str) -> dict:
+    """
+    Loads the cache of the incremental registration, as
+    {project_id: {flow_file: {"closure": str, "flows": {flow_name: str}}}}.
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_registration_cache(path: str, cache: dict) -> None:
+    """
+    Saves the cache of the incremental registration.
+    """
+    with open(path, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+
+def collect_changed_flows(
+    path: str,
+    cache: dict,
+    salt: str = "",
+) -> Tuple[Dict[str, List["prefect.Flow"]], Dict[str, dict], int]:
+    """
+    Finds the flow modules (from the manifest of `pipelines.flow_registry`)
+    under `path` whose source closure changed since they were cached, and
+    imports only those. Flows whose serialized hash is the same as the cached one
+    are dropped.
+
+    Returns:
+        - the changed flows, by flow file
+        - the new cache entries of the flow files that were imported
+        - the number of flows skipped
+    """
+    graph = build_dependency_graph("pipelines/")
+    prefix = Path(path).as_posix().rstrip("/")
+    skipped = 0
+    source_to_flows = {}
+    entries = {}
+    for package in build_manifest().values():
+        modules = defaultdict(list)
+        for name, module in package["flows"].items():
+            modules[module].append(name)
+        for module, names in modules.items():
+            flow_file = f"{module.replace('.', '/')}.py"
+            if not flow_file.startswith(prefix):
+                continue
+            closure = hash_source_closure(graph, flow_file, salt=salt)
+            cached = cache.get(flow_file, {})
+            if cached.get("closure") == closure:
+                skipped += len(names)
+                continue
+            logger.info(f"Source of {flow_file!r} changed, loading its flows...")
+            flows_module = importlib.import_module(module)
+            entry = entries[flow_file] = {"closure": closure, "flows": {}}
+            for name in names:
+                flow = getattr(flows_module, name)
+                entry["flows"][flow.name] = hash_serialized_flow(flow)
+                if cached.get("flows", {}).get(flow.name) == entry["flows"][flow.name]:
+                    skipped += 1
+                else:
+                    source_to_flows.setdefault(flow_file, []).append(flow)
+    return source_to_flows, entries, skipped
+
+
+def register_concurrently(
+    client: "prefect.Client",
+    flows: "List[prefect.Flow]",
+    project_id: str,
+    max_workers: int = 4,
+    **kwargs,
+) -> Dict[str, Counter]:
+    """
+    Builds and registers flows on a pool of at most `max_workers` threads.
+    Accepts the same arguments as `build_and_register`.
+
+    Returns:
+        - Dict[str, Counter]: the stats of each flow, by flow name
+    """
+    stats = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {}
+        for flow in flows:
+            future = executor.submit(
+                build_and_register, client, [flow], project_id, **kwargs
+            )
+            futures[future] = flow.name
+        for future in as_completed(futures):
+            try:
+                stats[futures[future]] = future.result()
+            except Exception:  # pylint: disable=broad-except
+                logger.error(f"Error registering {futures[future]!r}:")
+                logger.error(traceback.format_exc())
+                stats[futures[future]] = Counter(registered=0, errored=1, skipped=0)
+    return stats
+
+
+def register_incrementally(  # pylint: disable=too-many-arguments, too-many-locals
+    client: "prefect.Client",
+    project_id: str,
+    path: str,
+    cache_path: str,
+    max_workers: int = 4,
+    **kwargs,
+) -> Counter:
+    """
+    Registers only the flows whose source closure and serialized flow changed
+    since the last registration recorded on `cache_path`, building and
+    registering them concurrently. Accepts the same arguments as
+    `build_and_register`.
+    """
+    cache = load_registration_cache(cache_path)
+    project_cache = cache.setdefault(project_id, {})
+    salt = json.dumps(
+        {
+            "prefect": prefect.__version__,
+            "schedule": kwargs.get("schedule", True),
+            "image": get_image_salt(),
+        },
+        sort_keys=True,
+    )
+    source_to_flows, entries, skipped = collect_changed_flows(
+        path, project_cache, salt=salt
+    )
+    flows = [flow for flows in source_to_flows.values() for flow in flows]
+    logger.info(
+        f"{len(flows)} flows changed, {skipped} unchanged flows will be skipped"
+    )
+    flow_stats = register_concurrently(
+        client, flows, project_id, max_workers=max_workers, **kwargs
+    )
+
+    stats = Counter(registered=0, errored=0, skipped=skipped)
+    for flow_stats_ in flow_stats.values():
+        stats += flow_stats_
+    for flow_file, entry in entries.items():
+        failed = [
+            flow.name
+            for flow in source_to_flows.get(flow_file, [])
+            if flow_stats[flow.name]["errored"]
+        ]
+        if failed:
+            # Keeps the previous closure so the file is loaded again next time
+            entry["closure"] = project_cache.get(flow_file, {}).get("closure")
+            for name in failed:
+                entry["flows"].pop(name)
+        project_cache[flow_file] = entry
+    save_registration_cache(cache_path, cache)
+    return stats
+
+
 @app.command(name="register", help="Register a flow")
 def main(
     project: str = None,
@@ -493,6 +733,11 @@ def main(
     retry_interval: int = 5,
     schedule: bool = True,
     filter_affected_flows: bool = False,
+    incremental: bool = False,
+    cache_path: str = ".registration_cache.json",
+    max_workers: int = 4,
+    build_storage: bool = True,
+    api_server: str = None,
 ) -> None:
     """
     A helper for registering Prefect flows. The original implementation does not
@@ -503,6 +748,14 @@ def main(
         - path (str): The paths to the flows to register.
         - max_retries (int, optional): The maximum number of retries to attempt.
         - retry_interval (int, optional): The number of seconds to wait between
+        - incremental (bool, optional): Whether to register only the flows whose
+            source closure changed since the registration cached on `cache_path`.
+        - cache_path (str, optional): The cache of the incremental registration.
+        - max_workers (int, optional): The maximum number of flows registered at
+            the same time on the incremental registration.
+        - build_storage (bool, optional): Whether to build the storage of the
+            flows. Disable it to test against a stub Prefect API.
+        - api_server (str, optional): The Prefect API to use, ie the stub API.
     """
 
     if not (project and path):
@@ -512,9 +765,29 @@ def main(
     paths = expand_paths([path])
 
     # Gets the project ID
-    client = prefect.Client()
+    client = prefect.Client(api_server=api_server)
     project_id = get_project_id(client, project)
 
+    if incremental:
+        stats = register_incrementally(
+            client,
+            project_id,
+            path,
+            cache_path,
+            max_workers=max_workers,
+            max_retries=max_retries,
+            retry_interval=retry_interval,
+            schedule=schedule,
+            build_storage=build_storage,
+        )
+        logger.info(
+            f"Registered {stats['registered']} flows, skipped {stats['skipped']} "
+            f"flows, and errored {stats['errored']} flows."
+        )
+        if stats["errored"]:
+            raise Exception("One or more flows failed to register")
+        return
+
     # Collects flows from paths
     logger.info("Collecting flows...")
     source_to_flows = collect_flows(paths)
@@ -541,6 +814,7 @@ def main(
             max_retries=max_retries,
             retry_interval=retry_interval,
             schedule=schedule,
+            build_storage=build_storage,
         )
 
     # Output summary message
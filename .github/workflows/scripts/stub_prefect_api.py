@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Stub of the Prefect API, answering only the GraphQL queries made by
+`register_flows.py`, to test the registration locally:
+
+    python .github/workflows/scripts/stub_prefect_api.py --port 4200
+    PREFECT__BACKEND=server python .github/workflows/scripts/register_flows.py \\
+        --project main --path pipelines/ --incremental --no-build-storage \\
+        --api-server http://localhost:4200
+
+Flows are kept in memory. Registering a flow again with the same idempotency key
+returns the same flow id, like the real API does.
+"""
+
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+from threading import Lock
+from uuid import uuid4
+
+from loguru import logger
+from prefect.utilities.graphql import decompress
+from typer import Typer
+
+app = Typer()
+
+FLOWS = defaultdict(list)
+CALLS = Counter()
+LOCK = Lock()
+
+
+def get_name(query: str) -> str:
+    """
+    Returns the first name filtered with `_eq` on a GraphQL query.
+    """
+    match = re.search(r'_eq: ("(?:[^"\\]|\\.)*")', query)
+    return json.loads(match.group(1)) if match else None
+
+
+def answer(query: str, variables: dict) -> dict:
+    """
+    Answers a GraphQL request.
+    """
+    if "create_flow_from_compressed_string" in query:
+        inputs = variables["input"]
+        name = decompress(inputs["serialized_flow"])["name"]
+        key = inputs.get("idempotency_key")
+        with LOCK:
+            CALLS["create_flow"] += 1
+            versions = FLOWS[name]
+            if not versions or not key or versions[-1]["key"] != key:
+                versions.append(
+                    {"id": str(uuid4()), "key": key, "version": len(versions) + 1}
+                )
+            flow_id = versions[-1]["id"]
+        logger.info(f"create_flow {name!r}: {flow_id}")
+        return {"create_flow_from_compressed_string": {"id": flow_id}}
+    if "flow(" in query:
+        name = get_name(query)
+        with LOCK:
+            CALLS["flow"] += 1
+            versions = FLOWS.get(name) or []
+        return {
+            "flow": [
+                {"id": version["id"], "version": version["version"]}
+                for version in versions[-1:]
+            ]
+        }
+    if "project(" in query:
+        CALLS["project"] += 1
+        return {"project": [{"id": f"stub-{get_name(query)}"}]}
+    raise ValueError(f"Unexpected query: {query}")
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Handles the requests of the Prefect client.
+    """
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Answers a GraphQL request.
+        """
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        variables = body.get("variables") or {}
+        if isinstance(variables, str):
+            variables = json.loads(variables)
+        try:
+            response = {"data": answer(body["query"], variables)}
+        except Exception as exc:  # pylint: disable=broad-except
+            response = {"errors": [{"message": str(exc)}]}
+        content = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+@app.command()
+def main(host: str = "127.0.0.1", port: int = 4200) -> None:
+    """
+    Serves the stub API until interrupted, then logs the calls received.
+    """
+    server = ThreadingHTTPServer((host, port), Handler)
+    logger.info(f"Stub Prefect API listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Calls: {dict(CALLS)}, flows: {len(FLOWS)}")
+
+
+if __name__ == "__main__":
+    app()
@@ -2,5 +2,10 @@
 """
 Prefect flows for datario project
 """
+from pipelines.flow_registry import lazy_flows
 
-# from pipelines.datario.project.flows import *
+FLOW_MODULES = [
+    # "pipelines.datario.project.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of the flows of every project.
+
+Each project package lists its flow modules on `FLOW_MODULES` and only imports
+them when one of its flows is accessed, so importing a single flow (or any task
+or utility of a project) no longer imports every flow of the project, with all
+their dependencies. The names of the flows declared on each module are read from
+the source code, without importing it, and saved on `flows_manifest.json`.
+
+Update the manifest after adding, renaming or removing flows with:
+
+    python -m pipelines.flow_registry
+"""
+import ast
+from importlib import import_module
+import json
+from pathlib import Path
+import sys
+from typing import Any, Callable, Dict, List, Tuple
+
+PIPELINES_PATH = Path(__file__).parent
+MANIFEST_PATH = PIPELINES_PATH / "flows_manifest.json"
+
+# Project packages, in the order their flows are imported by `pipelines.flows`
+PACKAGES = [
+    "pipelines.datario",
+    "pipelines.rj_cor",
+    "pipelines.rj_cetrio",
+    "pipelines.rj_escritorio",
+    "pipelines.rj_rioaguas",
+    "pipelines.rj_segovi",
+    "pipelines.rj_seop",
+    "pipelines.rj_setur",
+    "pipelines.rj_sme",
+    "pipelines.rj_smfp",
+    "pipelines.rj_smi",
+    "pipelines.rj_smtr",
+    "pipelines.rj_sms",
+    "pipelines.utils",
+]
+
+_MANIFEST: Dict[str, Dict[str, Any]] = None
+
+
+def get_module_path(module: str, package: bool = False) -> Path:
+    """
+    Returns the path of the source file of a module of this repository.
+    """
+    path = PIPELINES_PATH.parent.joinpath(*module.split("."))
+    return path / "__init__.py" if package else path.with_suffix(".py")
+
+
+def get_flow_modules(package: str) -> List[str]:
+    """
+    Reads the `FLOW_MODULES` list of a project package from its source code.
+    """
+    tree = ast.parse(get_module_path(package, package=True).read_text("utf-8"))
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == "FLOW_MODULES"
+            for target in node.targets
+        ):
+            return ast.literal_eval(node.value)
+    return []
+
+
+def get_declared_flows(module: str) -> List[str]:
+    """
+    Returns the names of the flows declared on a module, read from its source
+    code: the targets of `with Flow(...) as name` and of `name = deepcopy(...)`.
+    """
+    tree = ast.parse(get_module_path(module).read_text("utf-8"))
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.With):
+            for item in node.items:
+                call = item.context_expr
+                if (
+                    isinstance(call, ast.Call)
+                    and isinstance(call.func, ast.Name)
+                    and call.func.id == "Flow"
+                    and isinstance(item.optional_vars, ast.Name)
+                ):
+                    names.append(item.optional_vars.id)
+        elif (
+            isinstance(node, ast.Assign)
+            and isinstance(node.value, ast.Call)
+            and isinstance(node.value.func, ast.Name)
+            and node.value.func.id == "deepcopy"
+        ):
+            names.extend(
+                target.id for target in node.targets if isinstance(target, ast.Name)
+            )
+    return [name for name in dict.fromkeys(names) if not name.startswith("_")]
+
+
+def build_package_manifest(package: str, flow_modules: List[str] = None) -> dict:
+    """
+    Builds the manifest of a project package: its flow modules and the module of
+    each flow. Flows declared on more than one module resolve to the last one,
+    like the previous star imports did.
+    """
+    if flow_modules is None:
+        flow_modules = get_flow_modules(package)
+    flows = {}
+    for module in flow_modules:
+        for name in get_declared_flows(module):
+            flows[name] = module
+    return {"modules": list(flow_modules), "flows": flows}
+
+
+def build_manifest() -> Dict[str, Dict[str, Any]]:
+    """
+    Builds the manifest of every project package.
+    """
+    return {package: build_package_manifest(package) for package in PACKAGES}
+
+
+def load_manifest() -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the manifest, read from `MANIFEST_PATH` on the first call or built
+    from the source code if the file doesn't exist.
+    """
+    global _MANIFEST  # pylint: disable=global-statement
+    if _MANIFEST is None:
+        try:
+            _MANIFEST = json.loads(MANIFEST_PATH.read_text("utf-8"))
+        except FileNotFoundError:
+            _MANIFEST = build_manifest()
+    return _MANIFEST
+
+
+def get_package_flows(package: str, flow_modules: List[str] = None) -> Dict[str, str]:
+    """
+    Returns the module of each flow of a project package. If `flow_modules`
+    doesn't match the manifest, which is then outdated, the package is scanned
+    again.
+    """
+    if flow_modules is None:
+        # Project packages check their manifest entry with their `FLOW_MODULES`
+        import_module(package)
+    manifest = load_manifest()
+    entry = manifest.get(package)
+    if entry is None or (
+        flow_modules is not None and entry["modules"] != list(flow_modules)
+    ):
+        entry = manifest[package] = build_package_manifest(package, flow_modules)
+    return entry["flows"]
+
+
+def lazy_flows(
+    package: str, flow_modules: List[str]
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]], List[str]]:
+    """
+    Returns the `__getattr__`, `__dir__` and `__all__` of a project package, so
+    its flows are imported only when accessed:
+
+        __getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
+    """
+    flows = get_package_flows(package, flow_modules)
+
+    def __getattr__(name: str) -> Any:
+        if name not in flows:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        return getattr(import_module(flows[name]), name)
+
+    def __dir__() -> List[str]:
+        return sorted(set(vars(sys.modules[package])) | set(flows))
+
+    return __getattr__, __dir__, list(flows)
+
+
+def get_flow(name: str, package: str = None):
+    """
+    Imports a flow by its variable name, importing only the module that declares
+    it. If `package` is not given, the last package declaring `name` is used.
+    """
+    packages = [package] if package else PACKAGES
+    module = None
+    for candidate in packages:
+        module = get_package_flows(candidate).get(name, module)
+    if module is None:
+        raise KeyError(f"Flow {name!r} not found")
+    return getattr(import_module(module), name)
+
+
+def import_all_flows() -> Dict[str, Any]:
+    """
+    Imports every flow module of every project, returning the flows by name.
+    """
+    flows = {}
+    manifest = load_manifest()
+    for package in PACKAGES:
+        package_flows = get_package_flows(package)
+        for module in manifest[package]["modules"]:
+            import_module(module)
+        for name, module in package_flows.items():
+            flows[name] = getattr(sys.modules[module], name)
+    return flows
+
+
+def main():
+    """
+    Writes the manifest. With `--check`, only checks that it is up to date.
+    """
+    manifest = build_manifest()
+    content = json.dumps(manifest, indent=4) + "\n"
+    if "--check" in sys.argv[1:]:
+        current = MANIFEST_PATH.read_text("utf-8") if MANIFEST_PATH.exists() else ""
+        if current != content:
+            print(
+                f"{MANIFEST_PATH} is outdated, run `python -m pipelines.flow_registry`"
+            )
+            sys.exit(1)
+        return
+    MANIFEST_PATH.write_text(content, "utf-8")
+    print(
+        f"Wrote {sum(len(entry['flows']) for entry in manifest.values())} flows "
+        f"to {MANIFEST_PATH}"
+    )
+
+
+if __name__ == "__main__":
+    main()
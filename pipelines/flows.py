@@ -1,22 +1,10 @@
 # -*- coding: utf-8 -*-
 """
 Imports all flows for every project so we can register all of them.
+
+Project packages import their flows lazily (see `pipelines.flow_registry`), so
+every flow is imported here explicitly.
 """
-# pylint: disable=W0401,W0614,W0611
-###############################################################################
-# Automatically managed, please do not touch                                  #
-###############################################################################
-from pipelines.datario import *
-from pipelines.rj_cor import *
-from pipelines.rj_cetrio import *
-from pipelines.rj_escritorio import *
-from pipelines.rj_rioaguas import *
-from pipelines.rj_segovi import *
-from pipelines.rj_seop import *
-from pipelines.rj_setur import *
-from pipelines.rj_sme import *
-from pipelines.rj_smfp import *
-from pipelines.rj_smi import *
-from pipelines.rj_smtr import *
-from pipelines.rj_sms import *
-from pipelines.utils import *
+from pipelines.flow_registry import import_all_flows
+
+globals().update(import_all_flows())
@@ -2,5 +2,10 @@
 """
 Prefect flows for rj_cetrio project in RJ
 """
+from pipelines.flow_registry import lazy_flows
 
-from pipelines.rj_cetrio.dump_db_pit.flows import *
+FLOW_MODULES = [
+    "pipelines.rj_cetrio.dump_db_pit.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
@@ -2,9 +2,15 @@
 """
 Prefect flows for cor project
 """
-from pipelines.rj_cor.bot_semaforo.flows import *
-from pipelines.rj_cor.meteorologia.meteorologia_inmet.flows import *
-from pipelines.rj_cor.meteorologia.precipitacao_alertario.flows import *
-from pipelines.rj_cor.meteorologia.satelite.flows import *
-from pipelines.rj_cor.meteorologia.precipitacao_websirene.flows import *
-from pipelines.rj_cor.comando.eventos.flows import *
+from pipelines.flow_registry import lazy_flows
+
+FLOW_MODULES = [
+    "pipelines.rj_cor.bot_semaforo.flows",
+    "pipelines.rj_cor.meteorologia.meteorologia_inmet.flows",
+    "pipelines.rj_cor.meteorologia.precipitacao_alertario.flows",
+    "pipelines.rj_cor.meteorologia.satelite.flows",
+    "pipelines.rj_cor.meteorologia.precipitacao_websirene.flows",
+    "pipelines.rj_cor.comando.eventos.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
@@ -17,3 +17,8 @@ class constants(Enum):  # pylint: disable=c0103
     TABLE_ID_ATIVIDADES_EVENTOS = "ocorrencias_orgaos_responsaveis"
     TABLE_ID_POPS = "procedimento_operacional_padrao"
     TABLE_ID_ATIVIDADES_POPS = "procedimento_operacional_padrao_orgaos_responsaveis"
+    # Requests to the API
+    API_MAX_WORKERS = 10
+    API_MAX_RETRIES = 5
+    API_RETRY_BASE_DELAY = 2
+    API_RETRY_MAX_DELAY = 60
@@ -9,7 +9,6 @@ from datetime import timedelta
 import json
 import os
 from pathlib import Path
-import time
 from typing import Any, Union, Tuple
 from uuid import uuid4
 
@@ -20,7 +19,13 @@ from prefect.engine.signals import ENDRUN
 from prefect.engine.state import Skipped
 from prefect.triggers import all_successful
 
-from pipelines.rj_cor.comando.eventos.utils import get_token, get_url, build_redis_key
+from pipelines.rj_cor.comando.eventos.utils import (
+    build_redis_key,
+    ComandoClient,
+    fetch_concurrently,
+    get_token,
+    get_url,
+)
 from pipelines.utils.utils import get_redis_client, get_vault_secret, log, to_partitions
 
 
@@ -100,23 +105,27 @@ def set_last_updated_on_redis(
 
 
 @task(
-    nout=3,
+    nout=4,
     max_retries=3,
     retry_delay=timedelta(seconds=60),
 )
-def download_eventos(date_interval, wait=None) -> Tuple[pd.DataFrame, str]:
+def download_eventos(
+    date_interval,
+    wait=None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, list]:
     """
-    Faz o request dos dados de eventos e das atividades do evento
+    Faz o request dos dados de eventos e das atividades do evento. As atividades
+    são baixadas em paralelo.
     """
 
-    auth_token = get_token()
+    client = ComandoClient()
 
     url_secret = get_vault_secret("comando")["data"]
     url_eventos = url_secret["endpoint_eventos"]
     url_atividades_evento = url_secret["endpoint_atividades_evento"]
 
     # Request Eventos
-    response = get_url(url=url_eventos, parameters=date_interval, token=auth_token)
+    response = client.get(url=url_eventos, parameters=date_interval)
 
     if "eventos" in response and len(response["eventos"]) > 0:
         eventos = pd.DataFrame(response["eventos"])
@@ -137,38 +146,30 @@ def download_eventos(date_interval, wait=None) -> Tuple[pd.DataFrame, str]:
 
     eventos.rename(rename_columns, inplace=True, axis=1)
     eventos["id_evento"] = eventos["id_evento"].astype("int")
-    evento_id_list = eventos["id_evento"].unique()
+    evento_id_list = eventos["id_evento"].unique().tolist()
 
     atividades_evento = []
     problema_ids_atividade = []
-    problema_ids_request = []
 
     # Request AtividadesDoEvento
+    responses = fetch_concurrently(
+        lambda i: client.get(url=url_atividades_evento + f"?eventoId={i}"),
+        evento_id_list,
+        is_error=lambda response: "atividades" not in response.keys(),
+    )
     for i in evento_id_list:
-        # log(f">>>>>>> Requesting AtividadesDoEvento for id_evento: {i}")
-        try:
-            response = get_url(
-                url=url_atividades_evento + f"?eventoId={i}", token=auth_token
-            )
-            if "atividades" in response.keys():
-                response = response["atividades"]
-                for elem in response:
-                    elem["id_evento"] = i
-                    atividades_evento.append(elem)
-            else:
-                problema_ids_atividade.append(i)
-        except Exception as exc:
+        if "atividades" in responses[i].keys():
+            for elem in responses[i]["atividades"]:
+                elem["id_evento"] = i
+                atividades_evento.append(elem)
+        else:
             log(
-                f"Request AtividadesDoEvento for id_evento: {i}"
-                + f"resulted in the following error: {exc}"
+                f"Request AtividadesDoEvento for id_evento: {i} "
+                + f"resulted in the following response: {responses[i]}"
             )
-            problema_ids_request.append(i)
-            raise exc
-    log(f"\n>>>>>>> problema_ids_request: {problema_ids_request}")
+            problema_ids_atividade.append(i)
     log(f"\n>>>>>>> problema_ids_atividade: {problema_ids_atividade}")
 
-    problema_ids_atividade = problema_ids_atividade + problema_ids_request
-
     atividades_evento = pd.DataFrame(atividades_evento)
     atividades_evento.rename(
         {
@@ -274,28 +275,24 @@ def get_atividades_pops(pops: pd.DataFrame, redis_pops: list) -> pd.DataFrame:
     """
     log(">>>>>>> Requesting POP's activities")
 
-    auth_token = get_token()
+    client = ComandoClient()
 
     url_secret = get_vault_secret("comando")["data"]
     url = url_secret["endpoint_atividades_pop"]
 
-    pop_ids = pops["id_pop"].unique()
+    pop_ids = pops["id_pop"].unique().tolist()
+
+    responses = fetch_concurrently(
+        lambda pop_id: client.get(url=url + f"?popId={pop_id}"),
+        pop_ids,
+        is_error=lambda response: "error" in response.keys(),
+    )
 
     atividades_pops = []
     for pop_id in pop_ids:
-        log(f">>>>>>> Requesting POP's activities for pop_id: {pop_id}")
-        response = get_url(url=url + f"?popId={pop_id}", token=auth_token)
-
-        tentativa = 0
-        while "error" in response.keys() and tentativa <= 5:
-            log(
-                f">>>>>>> Requesting POP's activities for pop_id: {pop_id} Time: {tentativa+1}"
-            )
-            time.sleep(60)
-            response = get_url(url=url + f"?popId={pop_id}", token=auth_token)
-            tentativa += 1
-
-        if "error" in response.keys() and tentativa > 5:
+        response = responses[pop_id]
+        if "error" in response.keys():
+            log(f">>>>>>> Requesting POP's activities for pop_id: {pop_id} failed")
             continue
 
         row_template = {
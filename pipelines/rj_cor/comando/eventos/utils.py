@@ -3,12 +3,20 @@
 General purpose functions for the comando project
 """
 # pylint: disable=W0611
+from concurrent.futures import ThreadPoolExecutor
 import json
-import requests
-from requests.adapters import HTTPAdapter, Retry
+import random
+from threading import Lock
+import time
+from typing import Any, Callable, Dict, List
 
+from pipelines.rj_cor.comando.eventos.constants import constants
+from pipelines.utils.http_client import get_http_client
 from pipelines.utils.utils import get_vault_secret, log
 
+# Retry policy of the requests to comando's API
+COMANDO_HTTP_CLIENT = {"max_retries": 5, "backoff_factor": 1.5}
+
 
 def build_redis_key(dataset_id: str, table_id: str, name: str, mode: str = "prod"):
     """
@@ -28,7 +36,11 @@ def get_token():
     username = dicionario["data"]["username"]
     password = dicionario["data"]["password"]
     payload = {"username": username, "password": password}
-    return requests.post(host, json=payload).text
+    return (
+        get_http_client(**COMANDO_HTTP_CLIENT)
+        .post(host, json=payload, timeout=None)
+        .text
+    )
 
 
 # pylint: disable=W0703
@@ -38,15 +50,106 @@ def get_url(url, parameters: dict = None, token: str = None):  # pylint: disable
         parameters = {}
     if not token:
         token = get_token()
-    sess = requests.Session()
-    retries = Retry(total=5, backoff_factor=1.5)
-    sess.mount("http://", HTTPAdapter(max_retries=retries))
+    return request_url(url, parameters, token)[1]
+
+
+def request_url(url, parameters: dict, token: str) -> tuple:
+    """
+    Make request to comando's API, returning the status code (None if the request
+    failed) and the JSON response
+    """
     headers = {"Authorization": token}
 
     try:
-        response = sess.get(url, json=parameters, headers=headers)
-        response = response.json()
+        response = get_http_client(**COMANDO_HTTP_CLIENT).get(
+            url, json=parameters, headers=headers, timeout=None
+        )
+        return response.status_code, response.json()
     except Exception as exc:
         log(f"This resulted in the following error: {exc}")
-        response = {"response": None}
-    return response
+        return None, {"response": None}
+
+
+class ComandoClient:
+    """
+    Client of comando's API that gets a token once and reuses it on every request,
+    asking for a new one only when the API rejects it. Can be shared by threads.
+    """
+
+    def __init__(self, token: str = None):
+        self._token = token
+        self._lock = Lock()
+
+    @property
+    def token(self) -> str:
+        """
+        Current token, requested on first use
+        """
+        with self._lock:
+            if self._token is None:
+                self._token = get_token()
+            return self._token
+
+    def refresh_token(self, rejected: str) -> str:
+        """
+        Get a new token, unless another thread already replaced the rejected one
+        """
+        with self._lock:
+            if self._token in (None, rejected):
+                log("Token rejected by comando's API, requesting a new one")
+                self._token = get_token()
+            return self._token
+
+    def get(self, url: str, parameters: dict = None) -> dict:
+        """
+        Make request to comando's API, as `get_url`
+        """
+        token = self.token
+        status_code, response = request_url(url, parameters or {}, token)
+        if status_code in (401, 403):
+            status_code, response = request_url(
+                url, parameters or {}, self.refresh_token(token)
+            )
+        return response
+
+
+def fetch_concurrently(  # pylint: disable=too-many-arguments
+    fetch: Callable[[Any], dict],
+    items: List[Any],
+    is_error: Callable[[dict], bool],
+    max_workers: int = constants.API_MAX_WORKERS.value,
+    max_retries: int = constants.API_MAX_RETRIES.value,
+    base_delay: float = constants.API_RETRY_BASE_DELAY.value,
+    max_delay: float = constants.API_RETRY_MAX_DELAY.value,
+) -> Dict[Any, dict]:
+    """
+    Call `fetch` for every item with at most `max_workers` requests at a time.
+    Responses for which `is_error` is True (or exceptions) are retried up to
+    `max_retries` times, waiting a random time up to an exponential backoff
+    (full jitter), so failed requests don't hit the API again all at once.
+
+    Returns a dict with the last response of each item. Items that still failed
+    have an error response, or `{"error": <exception>}`.
+    """
+
+    def fetch_with_retry(item: Any) -> dict:
+        for attempt in range(max_retries + 1):
+            try:
+                response = fetch(item)
+            except Exception as exc:  # pylint: disable=W0703
+                response = {"error": exc}
+            if not is_error(response) or attempt == max_retries:
+                return response
+            delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+            log(
+                f"Request for {item} failed (attempt {attempt + 1}), "
+                f"retrying in {delay:.1f}s"
+            )
+            time.sleep(delay)
+        return response
+
+    if not items:
+        return {}
+    max_workers = max(1, min(max_workers, len(items)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(items, executor.map(fetch_with_retry, items)))
@@ -5,7 +5,7 @@ Flows for meteorologia_inmet
 """
 from datetime import timedelta
 
-from prefect import case, Parameter
+from prefect import case, Parameter, unmapped
 from prefect.run_configs import KubernetesRun
 from prefect.storage import GCS
 from prefect.tasks.prefect import create_flow_run, wait_for_flow_run
@@ -14,6 +14,7 @@ from pipelines.constants import constants
 from pipelines.utils.constants import constants as utils_constants
 from pipelines.rj_cor.meteorologia.meteorologia_inmet.tasks import (
     get_dates,
+    get_date_chunks,
     # slice_data,
     download,
     tratar_dados,
@@ -43,6 +44,8 @@ with Flow(
     # data_inicio e data_fim devem ser strings no formato "YYYY-MM-DD"
     data_inicio = Parameter("data_inicio", default="", required=False)
     data_fim = Parameter("data_fim", default="", required=False)
+    # Backfills são baixados e tratados em intervalos de até backfill_chunk_days dias
+    backfill_chunk_days = Parameter("backfill_chunk_days", default=30, required=False)
 
     # Materialization parameters
     MATERIALIZE_AFTER_DUMP = Parameter(
@@ -64,8 +67,11 @@ with Flow(
 
     data_inicio_, data_fim_, backfill = get_dates(data_inicio, data_fim)
     # data = slice_data(current_time=CURRENT_TIME)
-    dados = download(data_inicio_, data_fim_)
-    dados = tratar_dados(dados, backfill)
+    data_inicio_intervalos, data_fim_intervalos = get_date_chunks(
+        data_inicio_, data_fim_, backfill_chunk_days
+    )
+    dados = download.map(data_inicio_intervalos, data_fim_intervalos)
+    dados = tratar_dados.map(dados, unmapped(backfill))
     PATH = salvar_dados(dados=dados)
 
     # Create table in BigQuery
@@ -2,10 +2,10 @@
 """
 Tasks for meteorologia_inmet
 """
-from datetime import datetime, timedelta
+from datetime import timedelta
 import json
 from pathlib import Path
-from typing import Tuple, Union
+from typing import List, Tuple, Union
 
 import pandas as pd
 import pendulum
@@ -13,10 +13,11 @@ from prefect import task
 import requests
 
 from pipelines.constants import constants
-from pipelines.utils.utils import get_vault_secret, log, to_partitions
+from pipelines.utils.utils import get_vault_secret, log, PartitionWriter
 from pipelines.rj_cor.meteorologia.precipitacao_alertario.utils import (
     parse_date_columns,
 )
+from pipelines.rj_cor.meteorologia.utils import normalize_datetime, split_date_range
 
 # from pipelines.rj_cor.meteorologia.meteorologia_inmet.meteorologia_utils import converte_timezone
 
@@ -42,6 +43,21 @@ def get_dates(data_inicio: str, data_fim: str) -> Tuple[str, str]:
     return data_inicio, data_fim, backfill
 
 
+@task(nout=2)
+def get_date_chunks(
+    data_inicio: str, data_fim: str, chunk_days: int = None
+) -> Tuple[List[str], List[str]]:
+    """
+    Divide o período entre data_inicio e data_fim em intervalos de até chunk_days
+    dias, para que o backfill de períodos longos seja baixado e tratado por partes.
+    Retorna a lista de datas de início e a de fim de cada intervalo.
+    """
+    intervalos = split_date_range(data_inicio, data_fim, chunk_days)
+    log(f"Período dividido em {len(intervalos)} intervalo(s): {intervalos}")
+    inicios, fins = zip(*intervalos)
+    return list(inicios), list(fins)
+
+
 @task()
 def slice_data(current_time: str) -> str:
     """
@@ -110,18 +126,6 @@ def tratar_dados(dados: pd.DataFrame, backfill: bool = 0) -> pd.DataFrame:
     Renomeia colunas e filtra dados com a hora do timestamp de execução
     """
 
-    def converte_timezone(data: str, horario: str) -> str:
-        """
-        Recebe o formato de data em YYYY-MM-DD e hora em HH:mm:SS no UTC
-        e retorna no mesmo formato no horário São Paulo
-        """
-        datahora = pendulum.from_format(data + " " + horario, "YYYY-MM-DD HH:mm:SS")
-        datahora = datahora.in_tz("America/Sao_Paulo")
-
-        data = datahora.format("YYYY-MM-DD")
-        horario = datahora.format("HH:mm:SS")
-        return data, horario
-
     drop_cols = [
         "DC_NOME",
         "VL_LATITUDE",
@@ -167,14 +171,12 @@ def tratar_dados(dados: pd.DataFrame, backfill: bool = 0) -> pd.DataFrame:
 
     dados = dados.rename(columns=rename_cols)
 
-    # Converte coluna de horas de 2300 para 23:00:00
-    dados["horario"] = pd.to_datetime(dados.horario, format="%H%M")
-    dados["horario"] = dados.horario.apply(lambda x: datetime.strftime(x, "%H:%M:%S"))
-
-    # Converte horário de UTC para America/Sao Paulo
-    dados[["data", "horario"]] = dados[["data", "horario"]].apply(
-        lambda x: converte_timezone(x.data, x.horario), axis=1, result_type="expand"
+    # Converte data e hora (no formato 2300) de UTC para America/Sao Paulo
+    datahora = normalize_datetime(
+        dados["data"] + " " + dados["horario"], date_format="%Y-%m-%d %H%M"
     )
+    dados["data"] = datahora.dt.tz_localize(None).dt.normalize()
+    dados["horario"] = datahora.dt.time
 
     # Ordenamento de variáveis
     chaves_primarias = ["id_estacao", "data", "horario"]
@@ -204,9 +206,6 @@ def tratar_dados(dados: pd.DataFrame, backfill: bool = 0) -> pd.DataFrame:
     ]
     dados[float_cols] = dados[float_cols].astype(float)
 
-    dados["horario"] = pd.to_datetime(dados.horario, format="%H:%M:%S").dt.time
-    dados["data"] = pd.to_datetime(dados.data, format="%Y-%m-%d")
-
     # Pegar o dia no nosso timezone como partição
     br_timezone = pendulum.now("America/Sao_Paulo").format("YYYY-MM-DD")
 
@@ -248,23 +247,26 @@ def tratar_dados(dados: pd.DataFrame, backfill: bool = 0) -> pd.DataFrame:
 
 
 @task
-def salvar_dados(dados: pd.DataFrame) -> Union[str, Path]:
+def salvar_dados(dados: Union[pd.DataFrame, List[pd.DataFrame]]) -> Union[str, Path]:
     """
-    Salvar dados em csv
+    Salvar dados em csv. Recebe um dataframe ou a lista de dataframes de cada
+    intervalo do backfill, que são adicionados às mesmas partições.
     """
 
     prepath = Path("/tmp/precipitacao_alertario/")
     prepath.mkdir(parents=True, exist_ok=True)
 
+    if isinstance(dados, pd.DataFrame):
+        dados = [dados]
+
     partition_column = "data"
-    dataframe, partitions = parse_date_columns(dados, partition_column)
 
     # Cria partições a partir da data
-    to_partitions(
-        data=dataframe,
-        partition_columns=partitions,
-        savepath=prepath,
-        data_type="csv",
-    )
+    with PartitionWriter(savepath=prepath, data_type="csv") as writer:
+        for dados_intervalo in dados:
+            dataframe, partitions = parse_date_columns(
+                dados_intervalo, partition_column
+            )
+            writer.write(dataframe, partitions)
     log(f"[DEBUG] Files saved on {prepath}")
     return prepath
@@ -83,7 +83,7 @@ def tratar_dados(
     see_cols = ["data_medicao", "id_estacao", "acumulado_chuva_15_min"]
     log(f"DEBUG: data antes {dados[see_cols]}")
 
-    dados.data_medicao = dados.data_medicao.apply(treat_date_col)
+    dados.data_medicao = treat_date_col(dados.data_medicao)
     log(f"DEBUG: data dps {dados[see_cols]}")
 
     # Alterando valores ND, '-' e np.nan para NULL
@@ -55,10 +55,8 @@ def parse_date_columns(
     return dataframe, [ano_col, mes_col, data_col]
 
 
-def treat_date_col(row):
+def treat_date_col(dates: pd.Series) -> pd.Series:
     """
-    Add zero hour if date cames without it
+    Add zero hour to the dates that came without it
     """
-    if len(row) == 10:
-        row = row + " 00:00:00"
-    return row
+    return dates.mask(dates.str.len() == 10, dates + " 00:00:00")
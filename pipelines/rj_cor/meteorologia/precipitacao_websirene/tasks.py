@@ -12,6 +12,7 @@ from prefect import task
 import pandas_read_xml as pdx
 
 from pipelines.constants import constants
+from pipelines.rj_cor.meteorologia.utils import normalize_datetime
 from pipelines.utils.utils import (
     log,
     to_partitions,
@@ -72,14 +73,9 @@ def tratar_dados(
     dfr = pdx.fully_flatten(dfr).drop(drop_cols, axis=1).rename(rename_cols, axis=1)
 
     # Converte de UTC para horário São Paulo
-    date_format = "%Y-%m-%d %H:%M:%S"
-    dfr["data_medicao_utc"] = pd.to_datetime(dfr["data_medicao_utc"])
     dfr["data_medicao"] = (
-        dfr["data_medicao_utc"]
-        .dt.tz_convert("America/Sao_Paulo")
-        .dt.strftime(date_format)
+        normalize_datetime(dfr["data_medicao_utc"]).dt.tz_localize(None).dt.floor("S")
     )
-    dfr["data_medicao"] = pd.to_datetime(dfr["data_medicao"])
 
     dfr = dfr.drop(["data_medicao_utc"], axis=1)
 
@@ -100,7 +96,6 @@ def tratar_dados(
         table_id,
         unique_id="id_estacao",
         date_column="data_medicao",
-        date_format=date_format,
         mode=mode,
     )
 
@@ -13,9 +13,14 @@ class constants(Enum):
     """
 
     DATASET_ID = "clima_satelite"
+    # Tables of Parquet files, with one row per grid cell (resolucao, pixel) joined
+    # to TABLE_ID_GRID. The previous CSV tables, with longitude and latitude on
+    # every row, keep their names without the _v2 suffix and are no longer updated.
     VARIAVEL_RR = "RRQPEF"
-    TABLE_ID_RR = "taxa_precipitacao_goes_16"
+    TABLE_ID_RR = "taxa_precipitacao_goes_16_v2"
     VARIAVEL_TPW = "TPWF"
-    TABLE_ID_TPW = "quantidade_agua_precipitavel_goes_16"
+    TABLE_ID_TPW = "quantidade_agua_precipitavel_goes_16_v2"
     VARIAVEL_cmip = "CMIPF"
-    TABLE_ID_cmip = "infravermelho_longo_banda_13_goes_16"
+    TABLE_ID_cmip = "infravermelho_longo_banda_13_goes_16_v2"
+    TABLE_ID_GRID = "grade_goes_16"
+    RESOLUCAO = 3
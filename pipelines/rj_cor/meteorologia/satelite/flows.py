@@ -16,9 +16,10 @@ from pipelines.utils.constants import constants as utils_constants
 from pipelines.rj_cor.meteorologia.satelite.tasks import (
     get_dates,
     slice_data,
-    download,
-    tratar_dados,
-    save_data,
+    download_new_files,
+    list_files,
+    process_files,
+    save_grid,
 )
 from pipelines.rj_cor.tasks import (
     get_on_redis,
@@ -56,10 +57,38 @@ with Flow(
     ref_filename = Parameter("ref_filename", default=None, required=False)
     current_time = Parameter("current_time", default=None, required=False)
     mode_redis = Parameter("mode_redis", default="prod", required=False)
+    catch_up_hours = Parameter("catch_up_hours", default=0, required=False)
+    max_files = Parameter("max_files", default=None, required=False)
+    max_workers = Parameter("max_workers", default=None, required=False)
     current_time = get_dates(current_time)
 
     date_hour_info = slice_data(current_time=current_time, ref_filename=ref_filename)
 
+    # Lista os arquivos de todos os produtos de uma vez
+    files = list_files(
+        products=[
+            {"variavel": satelite_constants.VARIAVEL_RR.value},
+            {"variavel": satelite_constants.VARIAVEL_TPW.value},
+            {"variavel": satelite_constants.VARIAVEL_cmip.value, "band": "13"},
+        ],
+        date_hour_info=date_hour_info,
+        ref_filename=ref_filename,
+        catch_up_hours=catch_up_hours,
+    )
+
+    # Longitude e latitude das células da grade, salvas uma vez em tabela própria
+    path_grid = save_grid(
+        resolution=satelite_constants.RESOLUCAO.value, mode_redis=mode_redis
+    )
+    create_table_and_upload_to_gcs(
+        data_path=path_grid,
+        dataset_id=dataset_id,
+        table_id=satelite_constants.TABLE_ID_GRID.value,
+        dump_mode=dump_mode,
+        data_type="parquet",
+        wait=path_grid,
+    )
+
     # Para taxa de precipitação
     variavel_rr = satelite_constants.VARIAVEL_RR.value
     table_id_rr = satelite_constants.TABLE_ID_RR.value
@@ -67,19 +96,21 @@ with Flow(
     # Get filenames that were already treated on redis
     redis_files_rr = get_on_redis(dataset_id, table_id_rr, mode=mode_redis)
 
-    # Download raw data from API
-    filename_rr, redis_files_rr_updated = download(
+    # Download new raw data from API
+    filenames_rr, redis_files_rr_updated = download_new_files(
         variavel=variavel_rr,
-        date_hour_info=date_hour_info,
+        files=files,
         redis_files=redis_files_rr,
         ref_filename=ref_filename,
+        max_files=max_files,
         wait=redis_files_rr,
         mode_redis=mode_redis,
     )
 
     # Start data treatment if there are new files
-    info_rr = tratar_dados(filename=filename_rr, mode_redis=mode_redis)
-    path_rr = save_data(info=info_rr, file_path=filename_rr, mode_redis=mode_redis)
+    path_rr = process_files(
+        filenames=filenames_rr, mode_redis=mode_redis, max_workers=max_workers
+    )
 
     # Create table in BigQuery
     upload_table_rr = create_table_and_upload_to_gcs(
@@ -87,6 +118,7 @@ with Flow(
         dataset_id=dataset_id,
         table_id=table_id_rr,
         dump_mode=dump_mode,
+        data_type="parquet",
         wait=path_rr,
     )
 
@@ -106,25 +138,28 @@ with Flow(
     # Get filenames that were already treated on redis
     redis_files_tpw = get_on_redis(dataset_id, table_id_tpw, mode=mode_redis)
 
-    # Download raw data from API
-    filename_tpw, redis_files_tpw_updated = download(
+    # Download new raw data from API
+    filenames_tpw, redis_files_tpw_updated = download_new_files(
         variavel=variavel_tpw,
-        date_hour_info=date_hour_info,
+        files=files,
         redis_files=redis_files_tpw,
         ref_filename=ref_filename,
+        max_files=max_files,
         wait=redis_files_tpw,
         mode_redis=mode_redis,
     )
 
     # Start data treatment if there are new files
-    info_tpw = tratar_dados(filename=filename_tpw, mode_redis=mode_redis)
-    path_tpw = save_data(info=info_tpw, file_path=filename_tpw, mode_redis=mode_redis)
+    path_tpw = process_files(
+        filenames=filenames_tpw, mode_redis=mode_redis, max_workers=max_workers
+    )
 
     upload_table_tpw = create_table_and_upload_to_gcs(
         data_path=path_tpw,
         dataset_id=dataset_id,
         table_id=table_id_tpw,
         dump_mode=dump_mode,
+        data_type="parquet",
         wait=path_tpw,
     )
 
@@ -144,21 +179,20 @@ with Flow(
     # Get filenames that were already treated on redis
     redis_files_cmip = get_on_redis(dataset_id, table_id_cmip, mode=mode_redis)
 
-    # Download raw data from API
-    filename_cmip, redis_files_cmip_updated = download(
+    # Download new raw data from API
+    filenames_cmip, redis_files_cmip_updated = download_new_files(
         variavel=variavel_cmip,
-        date_hour_info=date_hour_info,
-        band="13",
+        files=files,
         redis_files=redis_files_cmip,
         ref_filename=ref_filename,
+        max_files=max_files,
         wait=redis_files_cmip,
         mode_redis=mode_redis,
     )
 
     # Start data treatment if there are new files
-    info_cmip = tratar_dados(filename=filename_cmip, mode_redis=mode_redis)
-    path_cmip = save_data(
-        info=info_cmip, file_path=filename_cmip, mode_redis=mode_redis
+    path_cmip = process_files(
+        filenames=filenames_cmip, mode_redis=mode_redis, max_workers=max_workers
     )
 
     # Create table in BigQuery
@@ -167,6 +201,7 @@ with Flow(
         dataset_id=dataset_id,
         table_id=table_id_cmip,
         dump_mode=dump_mode,
+        data_type="parquet",
         wait=path_cmip,
     )
 
@@ -4,9 +4,28 @@
 Converte coordenada X,Y para latlon
 """
 
+import hashlib
+import os
+from typing import Dict, Tuple
+
 import netCDF4 as nc
 import numpy as np
-from osgeo import osr, gdal  # pylint: disable=E0401
+from osgeo import gdal  # pylint: disable=E0401
+
+# Define KM_PER_DEGREE
+KM_PER_DEGREE = 111.32
+
+# GOES-16 Spatial Reference System
+# sourcePrj.ImportFromProj4('+proj=geos +h=35786023.0 +a=6378137.0\
+# +b=6356752.31414 +f=0.00335281068119356027489803406172 +lat_0=0.0\
+# +lon_0=-75 +sweep=x +no_defs')
+GOES16_HEIGHT = 35786000
+GOES16_SEMI_MAJOR_AXIS = 6378140
+GOES16_SEMI_MINOR_AXIS = 6356750
+GOES16_LONGITUDE = -75
+
+# Reprojection indexes already built or loaded on this process
+REMAP_INDEXES: Dict[tuple, np.ndarray] = {}
 
 
 def export_image(image, path):
@@ -26,112 +45,186 @@ def get_geot(extent, nlines, ncols):
     return [extent[0], resx, 0, extent[3], 0, -resy]
 
 
-def get_scale_offset(path, variable):
+def get_grid_size(extent: list, resolution: int) -> Tuple[int, int]:
+    """
+    Número de linhas e colunas da grade lat/lon na resolução (em km) desejada
+    """
+    sizex = int(((extent[2] - extent[0]) * KM_PER_DEGREE) / resolution)
+    sizey = int(((extent[3] - extent[1]) * KM_PER_DEGREE) / resolution)
+    return sizey, sizex
+
+
+def get_grid_coordinates(
+    extent: list, resolution: int
+) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Obtem o scale offset
+    Longitude e latitude do centro de cada célula da grade lat/lon, na mesma ordem
+    da grade achatada (linha a linha, começando pelo norte)
     """
-    data = nc.Dataset(path, mode="r")
+    sizey, sizex = get_grid_size(extent, resolution)
+    geot = get_geot(extent, sizey, sizex)
+    lons = geot[0] + (np.arange(sizex) + 0.5) * geot[1]
+    lats = geot[3] + (np.arange(sizey) + 0.5) * geot[5]
+    lon, lat = np.meshgrid(lons, lats)
+    return lon.reshape(-1), lat.reshape(-1)
 
-    if variable in ("BCM", "Phase", "Smoke", "Dust", "Mask", "Power"):
+
+def get_scale_offset(data: nc.Dataset, variable: str) -> Tuple[float, float]:
+    """
+    Obtem o scale offset de um NetCDF já aberto
+    """
+    if variable in ("BCM", "Phase", "Smoke", "Dust", "Mask", "Power", "DQF"):
         scale = 1
         offset = 0
     else:
         scale = data.variables[variable].scale_factor
         offset = data.variables[variable].add_offset
-    # scale = 0
-    # offset = 0
-    data.close()
     return scale, offset
 
 
-def remap(
-    path, variable, extent, resolution, goes16_extent
-):  # pylint: disable=too-many-locals
+def read_raw_variable(data: nc.Dataset, variable: str) -> np.ndarray:
     """
-    Converte coordenada X, Y para latlon
+    Lê os valores da variável sem aplicar scale, offset ou máscara, como o GDAL faz
     """
-    scale = 1
-    offset = 0
-
-    # Define KM_PER_DEGREE
-    km_per_degree = 111.32
-
-    # GOES-16 Spatial Reference System
-    source_prj = osr.SpatialReference()
-    # sourcePrj.ImportFromProj4('+proj=geos +h=35786023.0 +a=6378137.0\
-    # +b=6356752.31414 +f=0.00335281068119356027489803406172 +lat_0=0.0\
-    # +lon_0=-75 +sweep=x +no_defs')
-    source_prj.ImportFromProj4(
-        "+proj=geos +h=35786000 +a=6378140 +b=6356750 +lon_0=-75 +sweep=x"
-    )
-
-    # Lat/lon WSG84 Spatial Reference System
-    target_prj = osr.SpatialReference()
-    # targetPrj.ImportFromProj4('+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs')
-    target_prj.ImportFromProj4("+proj=latlong +datum=WGS84")
+    nc_variable = data.variables[variable]
+    nc_variable.set_auto_maskandscale(False)
+    array = np.asarray(nc_variable[:])
+    if str(getattr(nc_variable, "_Unsigned", "false")).lower() == "true":
+        array = array.view(array.dtype.str.replace("i", "u"))
+    return array
 
-    # GOES-16 Extent (satellite projection) [llx, lly, urx, ury]
-    # goes16_extent = [x_1, y_1, x_2, y_2]
 
-    # Setup NetCDF driver
-    gdal.SetConfigOption("GDAL_NETCDF_BOTTOMUP", "NO")
+def latlon_to_goes16(lon: np.ndarray, lat: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Projeta longitudes e latitudes (em graus) para as coordenadas x, y (em metros)
+    da projeção geoestacionária do GOES-16, com as mesmas fórmulas do PROJ
+    (`+proj=geos +sweep=x`). Também retorna quais pontos são visíveis pelo satélite.
+    """
+    radius_p = GOES16_SEMI_MINOR_AXIS / GOES16_SEMI_MAJOR_AXIS
+    radius_g = 1 + GOES16_HEIGHT / GOES16_SEMI_MAJOR_AXIS
 
-    if not variable == "DQF":
-        # Read scale/offset from file
-        scale, offset = get_scale_offset(path, variable)
+    lam = np.radians(lon - GOES16_LONGITUDE)
+    # Latitude geocêntrica
+    phi = np.arctan(radius_p**2 * np.tan(np.radians(lat)))
+    radius = radius_p / np.hypot(radius_p * np.cos(phi), np.sin(phi))
 
-    connection_info = 'NETCDF:"' + path + '"://' + variable
+    vector_x = radius * np.cos(lam) * np.cos(phi)
+    vector_y = radius * np.sin(lam) * np.cos(phi)
+    vector_z = radius * np.sin(phi)
+    tmp = radius_g - vector_x
 
-    raw = gdal.Open(connection_info)
+    visible = (tmp * vector_x - vector_y**2 - vector_z**2 / radius_p**2) >= 0
+    x = GOES16_HEIGHT * np.arctan(vector_y / np.hypot(vector_z, tmp))
+    y = GOES16_HEIGHT * np.arctan(vector_z / tmp)
+    return x, y, visible
 
-    # Setup projection and geo-transformation
-    raw.SetProjection(source_prj.ExportToWkt())
-    # raw.SetGeoTransform(get_geot(goes16_extent, raw.RasterYSize, raw.RasterXSize))
-    raw.SetGeoTransform(get_geot(goes16_extent, raw.RasterYSize, raw.RasterXSize))
 
-    # Compute grid dimension
-    sizex = int(((extent[2] - extent[0]) * km_per_degree) / resolution)
-    sizey = int(((extent[3] - extent[1]) * km_per_degree) / resolution)
+def build_remap_index(
+    source_shape: Tuple[int, int], goes16_extent: list, extent: list, resolution: int
+) -> np.ndarray:
+    """
+    Calcula, para cada célula da grade lat/lon de `extent`, o índice (na matriz
+    achatada) do pixel do GOES-16 mais próximo do seu centro, como o
+    `gdal.ReprojectImage` com `GRA_NearestNeighbour` faz. Células sem pixel
+    correspondente recebem -1.
+    """
+    nlines, ncols = source_shape[-2:]
+    sizey, sizex = get_grid_size(extent, resolution)
+    source_geot = get_geot(goes16_extent, nlines, ncols)
+
+    # Centro de cada célula da grade
+    lon, lat = get_grid_coordinates(extent, resolution)
+    lon, lat = lon.reshape(sizey, sizex), lat.reshape(sizey, sizex)
+
+    x, y, visible = latlon_to_goes16(lon, lat)
+    with np.errstate(invalid="ignore"):
+        cols = np.floor((x - source_geot[0]) / source_geot[1])
+        rows = np.floor((y - source_geot[3]) / source_geot[5])
+        valid = visible & (cols >= 0) & (cols < ncols) & (rows >= 0) & (rows < nlines)
+
+    index = np.full((sizey, sizex), -1, dtype=np.int64)
+    index[valid] = rows[valid].astype(np.int64) * ncols + cols[valid].astype(np.int64)
+    return index
+
+
+def get_remap_index(
+    source_shape: Tuple[int, int],
+    goes16_extent: list,
+    extent: list,
+    resolution: int,
+    cache_dir: str = None,
+) -> np.ndarray:
+    """
+    Retorna o índice de reprojeção para a grade do produto (formato e extensão da
+    imagem do GOES-16), a resolução e a extensão desejadas. O índice só é calculado
+    uma vez: fica em memória e é salvo em `cache_dir` para as próximas execuções.
+    """
+    key = (
+        tuple(int(size) for size in source_shape[-2:]),
+        tuple(round(float(value), 3) for value in goes16_extent),
+        tuple(round(float(value), 6) for value in extent),
+        resolution,
+    )
+    if key in REMAP_INDEXES:
+        return REMAP_INDEXES[key]
 
-    # Get memory driver
-    mem_driver = gdal.GetDriverByName("MEM")
+    if cache_dir is None:
+        cache_dir = os.path.join(os.getcwd(), "data", "satelite", "remap_index")
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+    index_path = os.path.join(cache_dir, f"{digest}.npy")
 
-    # Create grid
-    grid = mem_driver.Create("grid", sizex, sizey, 1, gdal.GDT_Float32)
+    if os.path.exists(index_path):
+        index = np.load(index_path)
+    else:
+        index = build_remap_index(source_shape, goes16_extent, extent, resolution)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Salva em arquivo temporário para não deixar um índice pela metade
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.save(file, index)
+        os.replace(tmp_path, index_path)
 
-    # Setup projection and geo-transformation
-    grid.SetProjection(target_prj.ExportToWkt())
-    grid.SetGeoTransform(get_geot(extent, grid.RasterYSize, grid.RasterXSize))
+    REMAP_INDEXES[key] = index
+    return index
 
-    # Perform the projection/resampling
 
-    # print("Remapping", path)
+def apply_remap_index(
+    array: np.ndarray, index: np.ndarray, fill_value: float = 0
+) -> np.ndarray:
+    """
+    Reprojeta a imagem do GOES-16 para a grade lat/lon usando o índice de reprojeção
+    """
+    remapped = np.asarray(array).reshape(-1)[np.maximum(index, 0)]
+    remapped = remapped.astype(np.float32)
+    remapped[index < 0] = fill_value
+    return remapped
 
-    gdal.ReprojectImage(
-        raw,
-        grid,
-        source_prj.ExportToWkt(),
-        target_prj.ExportToWkt(),
-        gdal.GRA_NearestNeighbour,
-        options=["NUM_THREADS=ALL_CPUS"],
-    )
 
-    # Close file
-    raw = None
+def remap(
+    data: nc.Dataset,
+    variable: str,
+    extent: list,
+    resolution: int,
+    goes16_extent: list,
+    cache_dir: str = None,
+) -> np.ndarray:
+    """
+    Converte coordenada X, Y para latlon. Recebe o NetCDF já aberto e usa o índice
+    de reprojeção em cache, de forma que só lê a variável e indexa a matriz.
+    Retorna a grade lat/lon, com a primeira linha ao norte.
+    """
+    # Read scale/offset from file
+    scale, offset = get_scale_offset(data, variable)
 
-    # Read grid data
-    array = grid.ReadAsArray()
+    raw = read_raw_variable(data, variable)
+    index = get_remap_index(raw.shape, goes16_extent, extent, resolution, cache_dir)
 
-    # Mask fill values (i.e. invalid values)
-    np.ma.masked_where(array, array == -1, False)
+    # Cells outside of the GOES-16 image are 0, as in the GDAL grid
+    array = apply_remap_index(raw, index, fill_value=0)
 
     array = array.astype(np.uint16)
 
-    # Apply scale and offset
-    array = array * scale + offset
-    # np.ma.masked_where(array, array == 100, False)
-
-    # grid.GetRasterBand(1).SetNoDataValue(-1)
-    grid.GetRasterBand(1).WriteArray(array)
+    # Apply scale and offset, keeping the Float32 precision of the GDAL grid
+    array = (array * scale + offset).astype(np.float32)
 
-    return grid
+    return array
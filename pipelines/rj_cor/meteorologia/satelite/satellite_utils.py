@@ -61,21 +61,23 @@ Funções úteis no tratamento de dados de satélite
 # Required Libraries
 # ====================================================================
 
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import os
 from pathlib import Path
 import re
-from typing import Tuple, Union
+from typing import Dict, List, Tuple, Union
 
 from google.cloud import storage
 import netCDF4 as nc
 import numpy as np
-from osgeo import gdal  # pylint: disable=E0401
 import pandas as pd
 import pendulum
-import xarray as xr
+import pyarrow as pa
+import pyarrow.parquet as pq
+import s3fs
 
-from pipelines.rj_cor.meteorologia.satelite.remap import remap
+from pipelines.rj_cor.meteorologia.satelite.remap import get_grid_coordinates, remap
 from pipelines.utils.utils import get_credentials_from_env, list_blobs_with_prefix, log
 
 
@@ -124,6 +126,123 @@ def download_blob(
     )
 
 
+def get_hours_to_sweep(date_hour_info: dict, catch_up_hours: int = 0) -> List[dict]:
+    """
+    Lista ano, dia juliano e hora (UTC) da hora de `date_hour_info` e das
+    `catch_up_hours` horas anteriores, para recuperar arquivos perdidos
+    """
+    hour = datetime.datetime.strptime(
+        f"{date_hour_info['year']} {int(date_hour_info['julian_day']):03d} "
+        f"{date_hour_info['hour_utc'][:2]}",
+        "%Y %j %H",
+    )
+    hours = []
+    for delta in range(int(catch_up_hours or 0) + 1):
+        sweep_hour = hour - datetime.timedelta(hours=delta)
+        hours.append(
+            {
+                "year": sweep_hour.strftime("%Y"),
+                "julian_day": sweep_hour.strftime("%j"),
+                "hour_utc": sweep_hour.strftime("%H"),
+            }
+        )
+    return hours
+
+
+def list_files_on_api(
+    variavel: str, date_hour_info: dict, band: str = None, s3_fs=None
+) -> Tuple[List[str], str]:
+    """
+    Lista os arquivos de um produto em uma hora na AWS ou, se não for possível,
+    na GCP. Retorna os arquivos e a origem.
+    """
+    year = date_hour_info["year"]
+    julian_day = date_hour_info["julian_day"]
+    hour_utc = date_hour_info["hour_utc"][:2]
+    try:
+        # Use the anonymous credentials to access public data
+        if s3_fs is None:
+            s3_fs = s3fs.S3FileSystem(anon=True)
+        path_files = s3_fs.find(
+            f"noaa-goes16/ABI-L2-{variavel}/{year}/{julian_day}/{hour_utc}/"
+        )
+        origem = "aws"
+    except IndexError:
+        bucket_name = "gcp-public-data-goes-16"
+        partition_file = f"ABI-L2-{variavel}/{year}/{julian_day}/{hour_utc}/"
+        path_files = [
+            blob.name
+            for blob in list_blobs_with_prefix(bucket_name, partition_file, "prod")
+        ]
+        origem = "gcp"
+
+    # Mantém apenas arquivos de determinada banda
+    if band is not None:
+        path_files = [f for f in path_files if bool(re.search("C" + band, f))]
+    return sorted(path_files), origem
+
+
+def list_products_files(
+    products: List[dict], hours: List[dict], max_workers: int = 8
+) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Lista, de forma concorrente, os arquivos de todos os produtos (dicionários com
+    `variavel` e, opcionalmente, `band`) em todas as horas. Retorna, para cada
+    produto, os arquivos encontrados e sua origem.
+    """
+    s3_fs = s3fs.S3FileSystem(anon=True)
+    sweeps = [(product, hour) for product in products for hour in hours]
+
+    def list_sweep(sweep: Tuple[dict, dict]) -> Tuple[List[str], str]:
+        product, hour = sweep
+        return list_files_on_api(
+            product["variavel"], hour, band=product.get("band"), s3_fs=s3_fs
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sweeps)))) as pool:
+        results = list(pool.map(list_sweep, sweeps))
+
+    files = {product["variavel"]: [] for product in products}
+    for (product, _), (path_files, origem) in zip(sweeps, results):
+        files[product["variavel"]].extend((path, origem) for path in path_files)
+    for product_files in files.values():
+        product_files.sort()
+    return files
+
+
+def download_files(
+    files: List[Tuple[str, str]], base_path: str, max_workers: int = 8
+) -> List[str]:
+    """
+    Faz o download de vários arquivos (caminho e origem) em `base_path`. Os arquivos
+    da AWS são baixados juntos pelo s3fs, que faz as requisições de forma
+    concorrente, e os da GCP em paralelo.
+    """
+    aws_files = [path for path, origem in files if origem == "aws"]
+    gcp_files = [path for path, origem in files if origem == "gcp"]
+
+    if aws_files:
+        s3_fs = s3fs.S3FileSystem(anon=True)
+        s3_fs.get(
+            aws_files,
+            [os.path.join(base_path, path.split("/")[-1]) for path in aws_files],
+        )
+
+    def download_gcp_file(path: str):
+        download_blob(
+            bucket_name="gcp-public-data-goes-16",
+            source_blob_name=path,
+            destination_file_name=os.path.join(base_path, path.split("/")[-1]),
+            mode="prod",
+        )
+
+    if gcp_files:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(gcp_files))) as pool:
+            list(pool.map(download_gcp_file, gcp_files))
+
+    return [os.path.join(base_path, path.split("/")[-1]) for path, _ in files]
+
+
 def converte_timezone(datetime_save: str) -> str:
     """
     Recebe o formato de data hora em 'YYYYMMDD HHmm' no UTC e
@@ -405,52 +524,21 @@ def remap_g16(
     extent: list,
     resolution: int,
     variable: str,
-    datetime_save: str,
-    mode_redis: str = "prod",
-):
+) -> Tuple[np.ndarray, list]:
     """
     the GOES-16 image is reprojected to the rectangular projection in the extent region
     """
-    # Open the file using the NetCDF4 library
-    data = nc.Dataset(path)
-    # see_data = np.ma.getdata(data.variables[variable][:])
-    # print('\n\n>>>>>> netcdf ', np.unique(see_data)[:100])
+    # Open the file using the NetCDF4 library, only once for extent and data
+    with nc.Dataset(path) as data:
+        # see_data = np.ma.getdata(data.variables[variable][:])
+        # print('\n\n>>>>>> netcdf ', np.unique(see_data)[:100])
 
-    # Calculate the image extent required for the reprojection
-    goes16_extent = get_goes_extent(data)
+        # Calculate the image extent required for the reprojection
+        goes16_extent = get_goes_extent(data)
 
-    # Close the NetCDF file after getting the data
-    data.close()
+        # Call the reprojection funcion, which reuses the cached reprojection index
+        grid = remap(data, variable, extent, resolution, goes16_extent)
 
-    # Call the reprojection funcion
-    grid = remap(path, variable, extent, resolution, goes16_extent)
-
-    #     You may export the grid to GeoTIFF (and any other format supported by GDAL).
-    # using GDAL from osgeo
-    time_save = str(int(datetime_save[9:11]))
-
-    year = datetime_save[:4]
-    month = str(int(datetime_save[4:6]))
-    day = str(int(datetime_save[6:8]))
-    data = year + "-" + month.zfill(2) + "-" + day.zfill(2)
-    partitions = os.path.join(
-        f"ano_particao={year}",
-        f"mes_particao={month}",
-        f"data_particao={data}",
-        f"hora_particao={time_save}",
-    )
-
-    tif_path = os.path.join(
-        os.getcwd(), mode_redis, "data", "satelite", variable, "temp", partitions
-    )
-
-    if not os.path.exists(tif_path):
-        os.makedirs(tif_path)
-
-    # Export the result to GeoTIFF
-    driver = gdal.GetDriverByName("GTiff")
-    filename = os.path.join(tif_path, "dados.tif")
-    driver.CreateCopy(filename, grid, 0)
     return grid, goes16_extent
 
 
@@ -494,8 +582,9 @@ def treat_data(
         resolution = reprojection_variables["resolution"]
         goes16_extent = reprojection_variables["goes16_extent"]
 
-        grid = remap(path, "DQF", extent, resolution, goes16_extent)
-        data_dqf = grid.ReadAsArray()
+        # The DQF has the same grid, so the same reprojection index is used
+        with nc.Dataset(path) as nc_data:
+            data_dqf = remap(nc_data, "DQF", extent, resolution, goes16_extent)
         # If the Quality Flag is not 0, set as NaN
         data[data_dqf != 0] = np.nan
 
@@ -523,11 +612,9 @@ def treat_data(
     return data
 
 
-def save_data_in_file(
-    variable: str, datetime_save: str, file_path: str, mode_redis: str = "prod"
-) -> Union[str, Path]:
+def get_partitions(datetime_save: str) -> str:
     """
-    Save data in parquet
+    Partições de ano, mês, data e hora onde os dados de `datetime_save` são salvos
     """
     date_save = datetime_save[:8]
     time_save = str(int(datetime_save[9:11]))
@@ -536,41 +623,28 @@ def save_data_in_file(
     month = str(int(date_save[4:6]))
     day = str(int(date_save[6:8]))
     date = year + "-" + month.zfill(2) + "-" + day.zfill(2)
-    partitions = os.path.join(
+    return os.path.join(
         f"ano_particao={year}",
         f"mes_particao={month}",
         f"data_particao={date}",
         f"hora_particao={time_save}",
     )
 
-    tif_data = os.path.join(
-        os.getcwd(),
-        mode_redis,
-        "data",
-        "satelite",
-        variable,
-        "temp",
-        partitions,
-        "dados.tif",
-    )
-    log(f"debug path >>>>>>{tif_data}")
-    data = xr.open_dataset(tif_data, engine="rasterio")
-    # print('>>>>>>>>>>>>>>> data', data['band_data'].values)
-
-    # Converte para dataframe trocando o nome das colunas
 
-    data = (
-        data.to_dataframe()
-        .reset_index()[["x", "y", "band_data"]]
-        .rename(
-            {
-                "y": "latitude",
-                "x": "longitude",
-                "band_data": f"{variable.lower()}",
-            },
-            axis=1,
-        )
-    )
+def save_data_in_file(
+    variable: str,
+    datetime_save: str,
+    file_path: str,
+    data: np.ndarray,
+    resolution: int,
+    mode_redis: str = "prod",
+) -> Union[str, Path]:
+    """
+    Save data in parquet. Each row has the grid cell (`resolucao` and `pixel`, the
+    position on the flattened grid), whose longitude and latitude are saved once
+    by `save_grid_in_file`.
+    """
+    partitions = get_partitions(datetime_save)
 
     # cria pasta de partições se elas não existem
     output_path = os.path.join(
@@ -582,24 +656,59 @@ def save_data_in_file(
         os.makedirs(parquet_path)
 
     # Guarda horário do arquivo na coluna
-    data["horario"] = pendulum.from_format(
-        datetime_save, "YYYYMMDD HHmmss"
-    ).to_time_string()
-    # Fixa ordem das colunas
-    data = data[["longitude", "latitude", "horario", variable.lower()]]
+    horario = pendulum.from_format(datetime_save, "YYYYMMDD HHmmss").to_time_string()
+    values = np.asarray(data, dtype=np.float32).reshape(-1)
+    table = pa.table(
+        {
+            "resolucao": pa.array(np.full(len(values), resolution, dtype=np.int32)),
+            "pixel": pa.array(np.arange(len(values), dtype=np.int32)),
+            "horario": pa.array([horario] * len(values), type=pa.string()),
+            variable.lower(): pa.array(values, from_pandas=True),
+        }
+    )
 
-    # salva em csv
+    # salva em parquet
     filename = file_path.split("/")[-1].replace(".nc", "")
     log(f"\n\n[DEGUB]: Saving {filename} on {parquet_path}\n\n")
-    log(f"Data_save: {date_save}, time_save: {time_save}")
-    file_path = os.path.join(parquet_path, f"{filename}.csv")
-    data.to_csv(file_path, index=False)
+    log(f"Data_save: {datetime_save[:8]}, time_save: {int(datetime_save[9:11])}")
+    file_path = os.path.join(parquet_path, f"{filename}.parquet")
+    pq.write_table(table, file_path)
+    return output_path
+
+
+def save_grid_in_file(
+    resolution: int, extent: list = None, mode_redis: str = "prod"
+) -> Union[str, Path]:
+    """
+    Save the longitude and latitude of each grid cell (`pixel`) in parquet, as a
+    dimension table for the data saved by `save_data_in_file`
+    """
+    if extent is None:
+        extent = get_extent()
+    longitude, latitude = get_grid_coordinates(extent, resolution)
+    table = pa.table(
+        {
+            "resolucao": pa.array(np.full(len(longitude), resolution, dtype=np.int32)),
+            "pixel": pa.array(np.arange(len(longitude), dtype=np.int32)),
+            "longitude": pa.array(longitude),
+            "latitude": pa.array(latitude),
+        }
+    )
+
+    output_path = os.path.join(os.getcwd(), mode_redis, "data", "satelite", "grade")
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+
+    # The name is fixed so that uploading it again replaces the old file
+    file_path = os.path.join(output_path, f"grade_{resolution}km.parquet")
+    pq.write_table(table, file_path)
+    log(f"Saved grid with resolution {resolution}km on {file_path}")
     return output_path
 
 
-def main(path: Union[str, Path], mode_redis: str = "prod"):
+def get_extent() -> list:
     """
-    Função principal para converter dados x,y em lon,lat
+    Extensão [lon_min, lat_min, lon_max, lat_max] da região tratada
     """
     # Create the basemap reference for the Rectangular Projection.
     # You may choose the region you want.
@@ -622,7 +731,14 @@ def main(path: Union[str, Path], mode_redis: str = "prod"):
     # Estado do RJ
     # lat_max, lon_max = (-20.69080839963545, -40.28483671464648)
     # lat_min, lon_min = (-23.801876626302175, -45.05290312102409)
-    extent = [lon_min, lat_min, lon_max, lat_max]
+    return [lon_min, lat_min, lon_max, lat_max]
+
+
+def main(path: Union[str, Path]):
+    """
+    Função principal para converter dados x,y em lon,lat
+    """
+    extent = get_extent()
 
     # Get information from the image file
     product_caracteristics, datetime_save = get_info(path)
@@ -631,14 +747,12 @@ def main(path: Union[str, Path], mode_redis: str = "prod"):
     # Choose the image resolution (the higher the number the faster the processing is)
     resolution = product_caracteristics["resolution"]
 
-    # Call the remap function to convert x, y to lon, lat and save geotiff
+    # Call the remap function to convert x, y to lon, lat
     grid, goes16_extent = remap_g16(
         path,
         extent,
         resolution,
         product_caracteristics["variable"],
-        datetime_save,
-        mode_redis,
     )
 
     info = {
@@ -654,3 +768,19 @@ def main(path: Union[str, Path], mode_redis: str = "prod"):
     }
 
     return grid, goes16_extent, info
+
+
+def process_file(path: Union[str, Path], mode_redis: str = "prod") -> Union[str, Path]:
+    """
+    Converte os dados x,y de um arquivo em lon,lat e salva em parquet. Pode ser
+    executada em outro processo.
+    """
+    grid, _, info = main(path)
+    return save_data_in_file(
+        info["variable"],
+        info["datetime_save"],
+        str(path),
+        grid,
+        resolution=info["resolution"],
+        mode_redis=mode_redis,
+    )
@@ -4,25 +4,25 @@
 Tasks for emd
 """
 
+from concurrent.futures import ProcessPoolExecutor
 import datetime as dt
+import multiprocessing
 import os
-import re
 from pathlib import Path
-from typing import Union
+from typing import List, Tuple, Union
 
-import numpy as np
 import pendulum
 from prefect import task
 from prefect.engine.signals import ENDRUN
 from prefect.engine.state import Skipped
-import s3fs
 
 from pipelines.rj_cor.meteorologia.satelite.satellite_utils import (
+    download_files,
     extract_julian_day_and_hour_from_filename,
-    main,
-    save_data_in_file,
-    get_blob_with_prefix,
-    download_blob,
+    get_hours_to_sweep,
+    list_products_files,
+    process_file,
+    save_grid_in_file,
 )
 from pipelines.utils.utils import log
 
@@ -72,49 +72,46 @@ def slice_data(current_time: str, ref_filename: str = None) -> dict:
     return date_hour_info
 
 
+@task(max_retries=10, retry_delay=dt.timedelta(seconds=60))
+def list_files(
+    products: List[dict],
+    date_hour_info: dict,
+    ref_filename: str = None,
+    catch_up_hours: int = 0,
+    max_workers: int = 8,
+) -> dict:
+    """
+    Lista de uma vez, de forma concorrente, os arquivos de todos os produtos
+    (dicionários com `variavel` e, opcionalmente, `band`) na hora especificada e nas
+    `catch_up_hours` horas anteriores
+    """
+    # Only the hour of the reference file is needed
+    if ref_filename is not None:
+        catch_up_hours = 0
+    hours = get_hours_to_sweep(date_hour_info, catch_up_hours)
+    log(f"Listing files of {len(products)} products on {len(hours)} hours")
+    files = list_products_files(products, hours, max_workers=max_workers)
+    for variavel, product_files in files.items():
+        log(f"{variavel}: {len(product_files)} available files on API")
+    return files
+
+
 @task(nout=2, max_retries=10, retry_delay=dt.timedelta(seconds=60))
-def download(
+def download_new_files(
     variavel: str,
-    date_hour_info: dict,
-    band: str = None,
+    files: dict,
     ref_filename: str = None,
     redis_files: list = [],
+    max_files: int = None,
+    max_workers: int = 8,
     wait=None,
     mode_redis: str = "prod",
-) -> Union[str, Path]:
+) -> Tuple[List[str], list]:
     """
-    Acessa o S3 e faz o download do primeiro arquivo da data-hora especificada
+    Faz o download, em paralelo, de todos os arquivos listados por `list_files` para
+    o produto que não têm o nome salvo no redis
     """
-
-    year = date_hour_info["year"]
-    julian_day = date_hour_info["julian_day"]
-    hour_utc = date_hour_info["hour_utc"][:2]
-
-    try:
-        # Use the anonymous credentials to access public data
-        s3_fs = s3fs.S3FileSystem(anon=True)
-
-        # Get all files of GOES-16 data (multiband format) at this hour
-        path_files = np.sort(
-            np.array(
-                s3_fs.find(
-                    f"noaa-goes16/ABI-L2-{variavel}/{year}/{julian_day}/{hour_utc}/"
-                )
-                # s3_fs.find(f"noaa-goes16/ABI-L2-CMIPF/2022/270/10/OR_ABI-L2-CMIPF-M6C13_G16_s20222701010208_e20222701019528_c20222701020005.nc")
-            )
-        )
-        # Mantém apenas arquivos de determinada banda
-        if variavel == "CMIPF":
-            # para capturar banda 13
-            path_files = [f for f in path_files if bool(re.search("C" + band, f))]
-        origem = "aws"
-    except IndexError:
-        bucket_name = "gcp-public-data-goes-16"
-        partition_file = f"ABI-L2-{variavel}/{year}/{julian_day}/{hour_utc}/"
-        path_files = get_blob_with_prefix(
-            bucket_name=bucket_name, prefix=partition_file, mode="prod"
-        )
-        origem = "gcp"
+    path_files = files.get(variavel, [])
 
     # Skip task if there is no file on API
     if len(path_files) == 0:
@@ -122,80 +119,66 @@ def download(
         skip = Skipped("No available files on API")
         raise ENDRUN(state=skip)
 
-    base_path = os.path.join(
-        os.getcwd(), mode_redis, "data", "satelite", variavel[:-1], "input"
-    )
-
-    if not os.path.exists(base_path):
-        os.makedirs(base_path)
-
-    # Seleciona primeiro arquivo que não tem o nome salvo no redis
-    log(f"\n\n[DEBUG]: available files on API: {path_files}")
-    log(f"\n\n[DEBUG]: filenames already saved on redis_files: {redis_files}")
-    log(f"\n\n[DEBUG]: ref_filename: {ref_filename}")
-
     # keep only ref_filename if it exists
     if ref_filename is not None:
-        # extract this part of the name s_20222911230206_e20222911239514
         ref_date = ref_filename[ref_filename.find("_s") + 1 : ref_filename.find("_e")]
-        log(f"\n\n[DEBUG]: ref_date: {ref_date}")
-        match_text = re.compile(f".*{ref_date}")
-        path_files = list(filter(match_text.match, path_files))
-        log(f"\n\n[DEBUG]: path_files: {path_files}")
-
-    # keep the first file if it is not on redis
-    path_files.sort()
-    download_file = None
-    for path_file in path_files:
-        filename = path_file.split("/")[-1]
-        log(f"\n\n[DEBUG]: {filename} check if is in redis")
-        if filename not in redis_files:
-            log(f"\n\n[DEBUG]: {filename} not in redis")
-            redis_files.append(filename)
-            path_filename = os.path.join(base_path, filename)
-            download_file = path_file
-            # log(f"[DEBUG]: filename to be append on redis_files: {redis_files}")
-            break
+        path_files = [(path, origem) for path, origem in path_files if ref_date in path]
+
+    # keep the files that are not on redis
+    redis_files = list(redis_files)
+    new_files = [
+        (path, origem)
+        for path, origem in path_files
+        if path.split("/")[-1] not in redis_files
+    ]
+    if max_files is not None:
+        new_files = new_files[: int(max_files)]
 
     # Skip task if there is no new file
-    if download_file is None:
+    if len(new_files) == 0:
         log("No new available files")
         skip = Skipped("No new available files")
         raise ENDRUN(state=skip)
 
-    # Faz download da aws ou da gcp
-    if origem == "aws":
-        s3_fs.get(download_file, path_filename)
-    else:
-        download_blob(
-            bucket_name=bucket_name,
-            source_blob_name=download_file,
-            destination_file_name=path_filename,
-            mode="prod",
-        )
+    base_path = os.path.join(
+        os.getcwd(), mode_redis, "data", "satelite", variavel[:-1], "input"
+    )
+    if not os.path.exists(base_path):
+        os.makedirs(base_path)
+
+    log(f"Downloading {len(new_files)} new files of {variavel}")
+    path_filenames = download_files(new_files, base_path, max_workers=max_workers)
+    redis_files.extend(path.split("/")[-1] for path, _ in new_files)
 
-    return path_filename, redis_files
+    return path_filenames, redis_files
 
 
 @task
-def tratar_dados(filename: str, mode_redis: str = "prod") -> dict:
+def process_files(
+    filenames: List[str], mode_redis: str = "prod", max_workers: int = None
+) -> Union[str, Path]:
     """
-    Converte coordenadas X, Y para latlon e recorta área
+    Converte coordenadas X, Y para latlon e salva os arquivos em parquet, em
+    paralelo, em um pool de processos
     """
-    log(f"\n>>>> Started treating file: {filename}")
-    grid, goes16_extent, info = main(filename, mode_redis)
-    del grid, goes16_extent
-    return info
+    log(f"Processing {len(filenames)} files")
+    if len(filenames) == 1:
+        return process_file(filenames[0], mode_redis)
+
+    # Forked workers keep Prefect's context, so they can log
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("fork")
+    ) as pool:
+        output_paths = list(
+            pool.map(process_file, filenames, [mode_redis] * len(filenames))
+        )
+    return output_paths[0]
 
 
 @task
-def save_data(info: dict, file_path: str, mode_redis: str = "prod") -> Union[str, Path]:
+def save_grid(resolution: int, mode_redis: str = "prod") -> Union[str, Path]:
     """
-    Convert tif data to csv
+    Save the longitude and latitude of the grid cells in parquet
     """
-
-    variable = info["variable"]
-    datetime_save = info["datetime_save"]
-    print(f"Saving {variable} in parquet")
-    output_path = save_data_in_file(variable, datetime_save, file_path, mode_redis)
+    output_path = save_grid_in_file(resolution=resolution, mode_redis=mode_redis)
     return output_path
@@ -3,7 +3,10 @@
 """
 General utilities for meteorologia.
 """
+from typing import List, Tuple
+
 import pandas as pd
+import pendulum
 
 from pipelines.utils.utils import (
     get_redis_client,
@@ -84,3 +87,43 @@ def save_updated_rows_on_redis(
     [redis_client.hset(key, k, v) for k, v in new_updates.items()]
 
     return dfr.reset_index()
+
+
+def normalize_datetime(
+    values: pd.Series,
+    date_format: str = None,
+    from_tz: str = "UTC",
+    to_tz: str = "America/Sao_Paulo",
+) -> pd.Series:
+    """
+    Converte uma série de datas (texto ou datetime) para o fuso `to_tz` de forma
+    vetorizada. Datas sem fuso são consideradas no fuso `from_tz`.
+    Retorna uma série datetime tz-aware.
+    """
+    datahora = pd.to_datetime(values, format=date_format)
+    if datahora.dt.tz is None:
+        datahora = datahora.dt.tz_localize(from_tz)
+    return datahora.dt.tz_convert(to_tz)
+
+
+def split_date_range(
+    data_inicio: str, data_fim: str, chunk_days: int = None
+) -> List[Tuple[str, str]]:
+    """
+    Divide o intervalo entre `data_inicio` e `data_fim` (inclusive, no formato
+    YYYY-MM-DD) em intervalos consecutivos de até `chunk_days` dias. Se
+    `chunk_days` não for passado, retorna o intervalo inteiro.
+    """
+    if not chunk_days:
+        return [(data_inicio, data_fim)]
+
+    inicio = pendulum.from_format(data_inicio, "YYYY-MM-DD")
+    fim = pendulum.from_format(data_fim, "YYYY-MM-DD")
+    intervalos = []
+    while inicio <= fim:
+        fim_intervalo = min(inicio.add(days=chunk_days - 1), fim)
+        intervalos.append(
+            (inicio.format("YYYY-MM-DD"), fim_intervalo.format("YYYY-MM-DD"))
+        )
+        inicio = fim_intervalo.add(days=1)
+    return intervalos or [(data_inicio, data_fim)]
@@ -5,21 +5,27 @@ Prefect flows for emd project
 ###############################################################################
 # Automatically managed, please do not touch
 ###############################################################################
-from pipelines.rj_escritorio.bot_sistemas.flows import *
-from pipelines.rj_escritorio.dados_mestres_dump_datario.flows import *
-from pipelines.rj_escritorio.data_catalog.flows import *
-from pipelines.rj_escritorio.dummy_predict.flows import *
-from pipelines.rj_escritorio.notify_flooding.flows import *
-from pipelines.rj_escritorio.template_pipeline.flows import *
-from pipelines.rj_escritorio.tweets_flamengo.flows import *
-from pipelines.rj_escritorio.birthdays.flows import *
-from pipelines.rj_escritorio.logs.flows import *
-from pipelines.rj_escritorio.cleanup.flows import *
-from pipelines.rj_escritorio.waze.flows import *
-from pipelines.rj_escritorio.geolocator.flows import *
-from pipelines.rj_escritorio.inea.flows import *
-from pipelines.rj_escritorio.seconserva_buracos_refresh_data.flows import *
-from pipelines.rj_escritorio.dump_url_turismo.flows import *
-from pipelines.rj_escritorio.dump_policy_matrix.flows import *
-from pipelines.rj_escritorio.rain_dashboard.flows import *
-from pipelines.rj_escritorio.dump_url_seeketing.flows import *
+from pipelines.flow_registry import lazy_flows
+
+FLOW_MODULES = [
+    "pipelines.rj_escritorio.bot_sistemas.flows",
+    "pipelines.rj_escritorio.dados_mestres_dump_datario.flows",
+    "pipelines.rj_escritorio.data_catalog.flows",
+    "pipelines.rj_escritorio.dummy_predict.flows",
+    "pipelines.rj_escritorio.notify_flooding.flows",
+    "pipelines.rj_escritorio.template_pipeline.flows",
+    "pipelines.rj_escritorio.tweets_flamengo.flows",
+    "pipelines.rj_escritorio.birthdays.flows",
+    "pipelines.rj_escritorio.logs.flows",
+    "pipelines.rj_escritorio.cleanup.flows",
+    "pipelines.rj_escritorio.waze.flows",
+    "pipelines.rj_escritorio.geolocator.flows",
+    "pipelines.rj_escritorio.inea.flows",
+    "pipelines.rj_escritorio.seconserva_buracos_refresh_data.flows",
+    "pipelines.rj_escritorio.dump_url_turismo.flows",
+    "pipelines.rj_escritorio.dump_policy_matrix.flows",
+    "pipelines.rj_escritorio.rain_dashboard.flows",
+    "pipelines.rj_escritorio.dump_url_seeketing.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
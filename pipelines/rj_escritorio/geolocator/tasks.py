@@ -14,9 +14,11 @@ import pandas as pd
 import pendulum
 from prefect import task
 
-from pipelines.rj_escritorio.geolocator.utils import (
-    geolocator,
-    checar_point_pertence_cidade,
+from pipelines.rj_escritorio.geolocator.utils import geolocator
+from pipelines.utils.georeference.utils import (
+    filter_points_in_rio,
+    geocode_addresses,
+    GeocodingCache,
 )
 from pipelines.utils.utils import log
 
@@ -67,22 +69,33 @@ def seleciona_enderecos_novos() -> Tuple[pd.DataFrame, bool]:
 
 # Geolocalizando
 @task
-def geolocaliza_enderecos(base_enderecos_novos: pd.DataFrame) -> pd.DataFrame:
+def geolocaliza_enderecos(
+    base_enderecos_novos: pd.DataFrame,
+    max_workers: int = 4,
+    requests_per_second: float = 5,
+) -> pd.DataFrame:
     """
     Geolocaliza todos os novos endereços que entraram no dia anterior
     e verifica se pontos pertencem a cidade do Rio de Janeiro.
+    Os resultados ficam em cache no Redis e os endereços são geolocalizados por
+    `max_workers` threads, com no máximo `requests_per_second` chamadas à API.
     """
     start_time = time.time()
-    coordenadas = base_enderecos_novos["endereco_completo"].apply(
-        lambda x: pd.Series(geolocator(x), index=["lat", "long"])
+    locations, stats = geocode_addresses(
+        base_enderecos_novos["endereco_completo"].tolist(),
+        geocode=geolocator,
+        provider="waze",
+        rate=requests_per_second,
+        max_workers=max_workers,
+        cache=GeocodingCache(),
     )
-
-    coordenadas[["lat", "long"]] = coordenadas.apply(
-        lambda x: checar_point_pertence_cidade(x.lat, x.long),
-        axis=1,
-        result_type="expand",
+    log(f"Geocoding stats: {stats}")
+    coordenadas = pd.DataFrame(
+        locations, columns=["lat", "long"], index=base_enderecos_novos.index
     )
 
+    coordenadas = filter_points_in_rio(coordenadas, "lat", "long")
+
     log(f"--- {(time.time() - start_time)} seconds ---")
 
     try:
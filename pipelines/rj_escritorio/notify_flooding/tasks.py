@@ -6,16 +6,18 @@ from typing import Any, Dict, List, Tuple, Union
 from uuid import uuid4
 
 from prefect import task
-import requests
 
 from pipelines.rj_escritorio.notify_flooding.utils import (
     get_circle,
+    is_legacy_cache,
     send_email,
 )
+from pipelines.utils.http_client import get_http_client
 from pipelines.utils.utils import (
     get_redis_client,
     get_vault_secret,
     log,
+    RedisHashState,
 )
 
 
@@ -51,7 +53,7 @@ def get_open_occurrences(api_url: str) -> List[Dict[str, Union[str, int, float]]
         List of open occurrences.
     """
     try:
-        response = requests.get(api_url)
+        response = get_http_client().get(api_url)
         response.raise_for_status()
     except Exception as exc:
         raise Exception(f"Error getting open occurrences from API: {exc}") from exc
@@ -113,10 +115,13 @@ def get_cached_flooding_occurences(
         List of flooding occurrences.
     """
     redis_client = get_redis_client(host=host, port=port, db=db, password=password)
-    flooding_occurrences = redis_client.get(redis_key)
-    if flooding_occurrences is None:
-        flooding_occurrences = []
-    return flooding_occurrences
+    if is_legacy_cache(redis_client, redis_key):
+        flooding_occurrences = redis_client.get(redis_key)
+        if flooding_occurrences is None:
+            flooding_occurrences = []
+        return flooding_occurrences
+    state = RedisHashState(redis_key, redis_client=redis_client)
+    return list(state.read().values())
 
 
 @task(nout=3)
@@ -138,10 +143,10 @@ def compare_flooding_occurences(
         Tuple with the new flooding occurrences, the closed flooding occurrences and the
         current flooding occurrences.
     """
-    ids_from_api = [occurrence["id"] for occurrence in from_api]
-    log(f"IDs from API: {ids_from_api}")
-    ids_from_cache = [occurrence["id"] for occurrence in from_cache]
-    log(f"IDs from cache: {ids_from_cache}")
+    ids_from_api = {occurrence["id"] for occurrence in from_api}
+    log(f"IDs from API: {sorted(ids_from_api)}")
+    ids_from_cache = {occurrence["id"] for occurrence in from_cache}
+    log(f"IDs from cache: {sorted(ids_from_cache)}")
     new_occurrences = [
         occurrence for occurrence in from_api if occurrence["id"] not in ids_from_cache
     ]
@@ -183,7 +188,16 @@ def update_flooding_occurences_cache(  # pylint: disable=R0913
         password: Redis password.
     """
     redis_client = get_redis_client(host=host, port=port, db=db, password=password)
-    redis_client.set(redis_key, flooding_occurrences)
+    if is_legacy_cache(redis_client, redis_key):
+        redis_client.delete(redis_key)
+    state = RedisHashState(redis_key, redis_client=redis_client)
+    delta = state.publish(
+        {occurrence["id"]: occurrence for occurrence in flooding_occurrences}
+    )
+    log(
+        f"Cache updated: added {delta['added']}, changed {delta['changed']}, "
+        f"removed {delta['removed']}, version {delta['version']}"
+    )
 
 
 @task
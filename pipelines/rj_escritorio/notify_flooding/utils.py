@@ -83,3 +83,21 @@ def send_email(
     text = message.as_string()
     session.sendmail(from_address, to_address, text)
     session.quit()
+
+
+def is_legacy_cache(redis_client, redis_key: str) -> bool:
+    """
+    Whether the cache on `redis_key` is the whole list of occurrences saved as a
+    single value, as done before it became a hash with one field per occurrence.
+
+    Args:
+        redis_client: Redis client.
+        redis_key: Key to the flooding occurrences in Redis.
+
+    Returns:
+        True if the key holds a single value.
+    """
+    key_type = redis_client.type(redis_key)
+    if isinstance(key_type, bytes):
+        key_type = key_type.decode("utf-8")
+    return key_type == "string"
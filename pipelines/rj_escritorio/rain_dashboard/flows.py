@@ -2,7 +2,7 @@
 """
 Flows for setting rain data in Redis.
 """
-from prefect import Parameter
+from prefect import case, Parameter
 from prefect.run_configs import KubernetesRun
 from prefect.storage import GCS
 
@@ -15,6 +15,7 @@ from pipelines.rj_escritorio.rain_dashboard.constants import (
 from pipelines.rj_escritorio.rain_dashboard.tasks import (
     dataframe_to_dict,
     get_data,
+    publish_redis_hash,
     set_redis_key,
 )
 from pipelines.utils.decorators import Flow
@@ -31,6 +32,10 @@ with Flow(
     query_update = Parameter("query_update")
     mode = Parameter("mode", default="prod")
     redis_data_key = Parameter("redis_data_key", default="data_last_15min_rain")
+    # Same data, one field per H3 cell, with a version key for readers to poll
+    redis_data_hash_key = Parameter(
+        "redis_data_hash_key", default="data_last_15min_rain_h3"
+    )
     redis_update_key = Parameter(
         "redis_update_key", default="data_last_15min_rain_update"
     )
@@ -43,13 +48,23 @@ with Flow(
     dataframe_update = get_data(query=query_update, mode=mode)
     dictionary = dataframe_to_dict(dataframe=dataframe)
     dictionary_update = dataframe_to_dict(dataframe=dataframe_update)
-    set_redis_key(
-        key=redis_data_key,
+    data_changed = publish_redis_hash(
+        key=redis_data_hash_key,
         value=dictionary,
+        id_column="id_h3",
         host=redis_host,
         port=redis_port,
         db=redis_db,
     )
+    # The full list is only rewritten when the data changed
+    with case(data_changed, True):
+        set_redis_key(
+            key=redis_data_key,
+            value=dictionary,
+            host=redis_host,
+            port=redis_port,
+            db=redis_db,
+        )
     set_redis_key(
         key=redis_update_key,
         value=dictionary_update,
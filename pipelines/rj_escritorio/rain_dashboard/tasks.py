@@ -9,7 +9,7 @@ from basedosdados.upload.base import Base
 import pandas as pd
 from prefect import task
 
-from pipelines.utils.utils import get_redis_client, log
+from pipelines.utils.utils import get_redis_client, log, RedisHashState
 
 
 @task(checkpoint=False)
@@ -76,3 +76,29 @@ def set_redis_key(
     redis_client = get_redis_client(host=host, port=port, db=db)
     redis_client.set(key, value)
     log("Redis key set successfully.")
+
+
+@task(checkpoint=False)
+def publish_redis_hash(  # pylint: disable=R0913
+    key: str,
+    value: List[Dict[str, Union[str, float]]],
+    id_column: str = "id_h3",
+    host: str = "redis.redis.svc.cluster.local",
+    port: int = 6379,
+    db: int = 0,  # pylint: disable=C0103
+) -> bool:
+    """
+    Publish the records on a Redis hash, with one field per `id_column` value.
+    Only changed records are written and the version key (`{key}:version`) is
+    incremented when anything changes. Returns whether the data changed.
+    """
+    log("Publishing Redis hash...")
+    redis_client = get_redis_client(host=host, port=port, db=db)
+    state = RedisHashState(key, redis_client=redis_client)
+    delta = state.publish({record[id_column]: record for record in value})
+    log(
+        f"Redis hash published: {len(delta['added'])} added, "
+        f"{len(delta['changed'])} changed, {len(delta['removed'])} removed, "
+        f"version {delta['version']}"
+    )
+    return delta["version"] is not None
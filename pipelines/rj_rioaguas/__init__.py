@@ -2,6 +2,12 @@
 """
 Prefect flows para níveis dos reservatórios
 """
-from pipelines.rj_rioaguas.saneamento_drenagem.nivel_lagoa.flows import *
-from pipelines.rj_rioaguas.saneamento_drenagem.nivel_lamina_agua.flows import *
-from pipelines.rj_rioaguas.saneamento_drenagem.nivel_reservatorio.flows import *
+from pipelines.flow_registry import lazy_flows
+
+FLOW_MODULES = [
+    "pipelines.rj_rioaguas.saneamento_drenagem.nivel_lagoa.flows",
+    "pipelines.rj_rioaguas.saneamento_drenagem.nivel_lamina_agua.flows",
+    "pipelines.rj_rioaguas.saneamento_drenagem.nivel_reservatorio.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
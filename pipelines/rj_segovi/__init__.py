@@ -2,7 +2,12 @@
 """
 Prefect flows for segovi project
 """
+from pipelines.flow_registry import lazy_flows
 
-from pipelines.rj_segovi.dump_db_1746.flows import *
-from pipelines.rj_segovi.dump_url_adm_processorio_sicop.flows import *
-from pipelines.rj_segovi.dump_ftp_adm_processorio_sicop.flows import *
+FLOW_MODULES = [
+    "pipelines.rj_segovi.dump_db_1746.flows",
+    "pipelines.rj_segovi.dump_url_adm_processorio_sicop.flows",
+    "pipelines.rj_segovi.dump_ftp_adm_processorio_sicop.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
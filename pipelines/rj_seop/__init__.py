@@ -2,5 +2,10 @@
 """
 Prefect flows for SEOP's project
 """
+from pipelines.flow_registry import lazy_flows
 
-from pipelines.rj_seop.dump_url_conservacao_ambiental.flows import *
+FLOW_MODULES = [
+    "pipelines.rj_seop.dump_url_conservacao_ambiental.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
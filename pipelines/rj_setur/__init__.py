@@ -2,6 +2,11 @@
 """
 Prefect flows for rj_cetrio project in RJ
 """
+from pipelines.flow_registry import lazy_flows
 
-from pipelines.rj_setur.dump_url_seeketing.flows import *
-from pipelines.rj_setur.dbt_seeketing.flows import *
+FLOW_MODULES = [
+    "pipelines.rj_setur.dump_url_seeketing.flows",
+    "pipelines.rj_setur.dbt_seeketing.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
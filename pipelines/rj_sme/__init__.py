@@ -2,6 +2,11 @@
 """
 Prefect flows for sme project
 """
+from pipelines.flow_registry import lazy_flows
 
-from pipelines.rj_sme.dump_db_educacao_basica.flows import *
-from pipelines.rj_sme.dump_url_educacao_basica.flows import *
+FLOW_MODULES = [
+    "pipelines.rj_sme.dump_db_educacao_basica.flows",
+    "pipelines.rj_sme.dump_url_educacao_basica.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
@@ -2,10 +2,15 @@
 """
 Prefect flows for rj_smfp project in RJ
 """
+from pipelines.flow_registry import lazy_flows
 
-from pipelines.rj_smfp.dump_db_ergon.flows import *
-from pipelines.rj_smfp.dump_db_ergon_comlurb.flows import *
-from pipelines.rj_smfp.dump_db_metas.flows import *
-from pipelines.rj_smfp.dump_inadimplente.flows import *
-from pipelines.rj_smfp.dump_url_metas.flows import *
-from pipelines.rj_smfp.goals_dashboard_dbt.flows import *
+FLOW_MODULES = [
+    "pipelines.rj_smfp.dump_db_ergon.flows",
+    "pipelines.rj_smfp.dump_db_ergon_comlurb.flows",
+    "pipelines.rj_smfp.dump_db_metas.flows",
+    "pipelines.rj_smfp.dump_inadimplente.flows",
+    "pipelines.rj_smfp.dump_url_metas.flows",
+    "pipelines.rj_smfp.goals_dashboard_dbt.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
@@ -2,5 +2,10 @@
 """
 Prefect flows for rj_smi project
 """
+from pipelines.flow_registry import lazy_flows
 
-from pipelines.rj_smi.dump_db_siscob.flows import *
+FLOW_MODULES = [
+    "pipelines.rj_smi.dump_db_siscob.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
@@ -2,5 +2,10 @@
 """
 Prefect flows for rj_sms project
 """
+from pipelines.flow_registry import lazy_flows
 
-from pipelines.rj_sms.dump_db_sivep.flows import *
+FLOW_MODULES = [
+    "pipelines.rj_sms.dump_db_sivep.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
@@ -119,6 +119,7 @@ with Flow(
             upstream=True,
             exclude="+data_versao_efetiva",
             _vars=[date_range, dataset_sha],
+            stream_logs=True,
         )
         set_last_run_timestamp(
             dataset_id=dataset_id,
@@ -15,7 +15,7 @@ from pipelines.utils.utils import log
 # SMTR Imports #
 
 from pipelines.rj_smtr.constants import constants
-from pipelines.rj_smtr.utils import log_critical, map_dict_keys
+from pipelines.rj_smtr.utils import log_critical, treat_gps_payload
 
 # Tasks #
 
@@ -40,7 +40,6 @@ def pre_treatment_br_rj_riodejaneiro_brt_gps(status: dict, timestamp):
 
     error = None
     data = status["data"]["veiculos"]
-    timezone = constants.TIMEZONE.value
     log(
         f"""
     Received inputs:
@@ -52,31 +51,27 @@ def pre_treatment_br_rj_riodejaneiro_brt_gps(status: dict, timestamp):
     columns = [key_column, "timestamp_gps", "timestamp_captura", "content"]
     df = pd.DataFrame(columns=columns)  # pylint: disable=c0103
 
-    # map_dict_keys change data keys to match project data structure
-    df["content"] = [
-        map_dict_keys(piece, constants.GPS_BRT_MAPPING_KEYS.value) for piece in data
-    ]
-    df[key_column] = [piece[key_column] for piece in data]
-    df["timestamp_gps"] = [piece["timestamp_gps"] for piece in data]
-    df["timestamp_captura"] = timestamp
-    log(f"timestamp captura is:\n{df['timestamp_captura']}")
-
-    # Remove timezone and force it to be config timezone
-    log(f"Before converting, timestamp_gps was: \n{df['timestamp_gps']}")
-    df["timestamp_gps"] = (
-        pd.to_datetime(df["timestamp_gps"], unit="ms")
-        .dt.tz_localize("UTC")
-        .dt.tz_convert(timezone)
-    )
-    log(f"After converting the timezone, timestamp_gps is: \n{df['timestamp_gps']}")
-
     # Filter data for 0 <= time diff <= 1min
     try:
-        log(f"Shape antes da filtragem: {df.shape}")
-
-        mask = (df["timestamp_captura"] - df["timestamp_gps"]) <= timedelta(minutes=1)
-        df = df[mask]  # pylint: disable=C0103
-        log(f"Shape após a filtragem: {df.shape}")
+        # map_dict_keys change data keys to match project data structure
+        df, rows_before = treat_gps_payload(  # pylint: disable=C0103
+            data,
+            timestamp,
+            delay_filters=[
+                {
+                    "column": "timestamp_gps",
+                    "reference_column": "timestamp_captura",
+                    "max_delay": timedelta(minutes=1),
+                    "min_delay": None,
+                }
+            ],
+            output_columns=columns,
+            columns=[key_column, "timestamp_gps"],
+            timestamp_columns=["timestamp_gps"],
+            content_column="content",
+            content_mapping=constants.GPS_BRT_MAPPING_KEYS.value,
+        )
+        log(f"Shape antes da filtragem: {rows_before}, após a filtragem: {df.shape}")
         if df.shape[0] == 0:
             error = ValueError("After filtering, the dataframe is empty!")
             log_critical(f"@here\nFailed to filter BRT data: \n{error}")
@@ -34,17 +34,24 @@ from pipelines.rj_smtr.tasks import (
     get_materialization_date_range,
     # get_local_dbt_client,
     get_raw,
+    get_raw_batch,
     parse_timestamp_to_string,
     query_logs,
     save_raw_local,
+    save_raw_local_batch,
     save_treated_local,
+    save_treated_local_batch,
     set_last_run_timestamp,
     upload_logs_to_bq,
+    upload_logs_to_bq_batch,
     bq_upload,
+    bq_upload_batch,
 )
 from pipelines.rj_smtr.br_rj_riodejaneiro_onibus_gps.tasks import (
     pre_treatment_br_rj_riodejaneiro_onibus_gps,
+    pre_treatment_br_rj_riodejaneiro_onibus_gps_batch,
     create_api_url_onibus_gps,
+    create_api_urls_onibus_gps,
     create_api_url_onibus_realocacao,
     pre_treatment_br_rj_riodejaneiro_onibus_realocacao,
 )
@@ -203,6 +210,7 @@ with Flow(
             exclude="+data_versao_efetiva",
             _vars=[date_range, dataset_sha],
             upstream=True,
+            stream_logs=True,
         )
         set_last_run_timestamp(
             dataset_id=dataset_id,
@@ -288,6 +296,8 @@ with Flow("SMTR - GPS SPPO Recapturas", code_owners=["caio", "fernanda"]) as rec
     version = Parameter("version", default=2)
     datetime_filter = Parameter("datetime_filter", default=None)
     materialize = Parameter("materialize", default=True)
+    # Recaptures are made in batch, so a whole day of failures fits in a run
+    max_recaptures = Parameter("max_recaptures", default=24 * 60)
     # SETUP #
     LABELS = get_current_flow_labels()
 
@@ -295,6 +305,7 @@ with Flow("SMTR - GPS SPPO Recapturas", code_owners=["caio", "fernanda"]) as rec
         dataset_id=constants.GPS_SPPO_RAW_DATASET_ID.value,
         table_id=constants.GPS_SPPO_RAW_TABLE_ID.value,
         datetime_filter=datetime_filter,
+        max_recaptures=max_recaptures,
     )
 
     rename_flow_run = rename_current_flow_run_now_time(
@@ -326,43 +337,44 @@ with Flow("SMTR - GPS SPPO Recapturas", code_owners=["caio", "fernanda"]) as rec
             partitions=partitions,
         )
 
-        url = create_api_url_onibus_gps.map(
-            version=unmapped(version), timestamp=timestamps
-        )
+        urls = create_api_urls_onibus_gps(version=version, timestamps=timestamps)
 
         # EXTRACT #
-        raw_status = get_raw.map(url)
+        raw_status = get_raw_batch(urls)
 
-        raw_filepath = save_raw_local.map(status=raw_status, file_path=filepath)
+        raw_filepath = save_raw_local_batch(file_paths=filepath, statuses=raw_status)
 
         # # CLEAN #
-        trated_status = pre_treatment_br_rj_riodejaneiro_onibus_gps.map(
-            status=raw_status,
-            timestamp=timestamps,
-            version=unmapped(version),
+        trated_status = pre_treatment_br_rj_riodejaneiro_onibus_gps_batch(
+            statuses=raw_status,
+            timestamps=timestamps,
+            version=version,
         )
 
-        treated_filepath = save_treated_local.map(
-            status=trated_status, file_path=filepath
+        treated_filepath = save_treated_local_batch(
+            file_paths=filepath,
+            statuses=trated_status,
+            timestamps=timestamps,
+            suffix=parse_timestamp_to_string(get_current_timestamp()),
         )
 
         # # LOAD #
-        error = bq_upload.map(
-            dataset_id=unmapped(constants.GPS_SPPO_RAW_DATASET_ID.value),
-            table_id=unmapped(constants.GPS_SPPO_RAW_TABLE_ID.value),
-            filepath=treated_filepath,
-            raw_filepath=raw_filepath,
+        error = bq_upload_batch(
+            dataset_id=constants.GPS_SPPO_RAW_DATASET_ID.value,
+            table_id=constants.GPS_SPPO_RAW_TABLE_ID.value,
+            table_dir=treated_filepath,
+            raw_filepaths=raw_filepath,
             partitions=partitions,
-            status=trated_status,
+            statuses=trated_status,
         )
 
-        UPLOAD_LOGS = upload_logs_to_bq.map(
-            dataset_id=unmapped(constants.GPS_SPPO_RAW_DATASET_ID.value),
-            parent_table_id=unmapped(constants.GPS_SPPO_RAW_TABLE_ID.value),
-            error=error,
-            previous_error=previous_errors,
-            timestamp=timestamps,
-            recapture=unmapped(True),
+        UPLOAD_LOGS = upload_logs_to_bq_batch(
+            dataset_id=constants.GPS_SPPO_RAW_DATASET_ID.value,
+            parent_table_id=constants.GPS_SPPO_RAW_TABLE_ID.value,
+            timestamps=timestamps,
+            errors=error,
+            previous_errors=previous_errors,
+            recapture=True,
         )
         with case(materialize, True):
             run_materialize = create_flow_run(
@@ -5,7 +5,7 @@ Tasks for br_rj_riodejaneiro_onibus_gps
 
 import traceback
 from datetime import datetime, timedelta
-from typing import Dict
+from typing import Dict, List
 import pandas as pd
 from prefect import task
 import pendulum
@@ -17,6 +17,11 @@ from pipelines.utils.utils import log, get_vault_secret
 # SMTR Imports #
 
 from pipelines.rj_smtr.constants import constants
+from pipelines.rj_smtr.utils import treat_gps_payload
+from pipelines.rj_smtr.br_rj_riodejaneiro_onibus_gps.utils import (
+    build_api_url_onibus_gps,
+    get_api_onibus_gps_source,
+)
 
 # Tasks #
 
@@ -118,12 +123,7 @@ def create_api_url_onibus_gps(version: str, timestamp: datetime = None) -> str:
     Generates the complete URL to get data from API.
     """
 
-    if version == 2:
-        url = constants.GPS_SPPO_API_BASE_URL_V2.value
-        source = constants.GPS_SPPO_API_SECRET_PATH_V2.value
-    if version == 1:
-        url = constants.GPS_SPPO_API_BASE_URL.value
-        source = constants.GPS_SPPO_API_SECRET_PATH.value
+    url, source = get_api_onibus_gps_source(version)
 
     if not timestamp:
         timestamp = pendulum.now(constants.TIMEZONE.value).replace(
@@ -131,18 +131,26 @@ def create_api_url_onibus_gps(version: str, timestamp: datetime = None) -> str:
         )
 
     headers = get_vault_secret(source)["data"]
-    key = list(headers)[0]
-    url = f"{url}{key}={{secret}}"
+    log(
+        "Request data from URL: "
+        f"{build_api_url_onibus_gps(url, source, headers, timestamp, mask=True)}"
+    )
+    return build_api_url_onibus_gps(url, source, headers, timestamp)
 
-    if source == "sppo_api_v2":
-        date_range = {
-            "start": (timestamp - timedelta(minutes=6)).strftime("%Y-%m-%d+%H:%M:%S"),
-            "end": (timestamp - timedelta(minutes=5)).strftime("%Y-%m-%d+%H:%M:%S"),
-        }
-        url += f"&dataInicial={date_range['start']}&dataFinal={date_range['end']}"
 
-    log(f"Request data from URL: {url}")
-    return url.format(secret=headers[key])
+@task
+def create_api_urls_onibus_gps(version: int, timestamps: List[datetime]) -> List[str]:
+    """
+    Generates the complete URLs to get data from API for many timestamps,
+    reading the API secret once.
+    """
+    url, source = get_api_onibus_gps_source(version)
+    headers = get_vault_secret(source)["data"]
+    log(f"Request data for {len(timestamps)} timestamps from URL: {url}")
+    return [
+        build_api_url_onibus_gps(url, source, headers, timestamp)
+        for timestamp in timestamps
+    ]
 
 
 @task
@@ -171,12 +179,9 @@ def pre_treatment_br_rj_riodejaneiro_onibus_gps(
         return {"data": pd.DataFrame(), "error": status["error"]}
 
     error = None
-    timezone = constants.TIMEZONE.value
+    df_gps = pd.DataFrame()  # pylint: disable=c0103
 
     log(f"Data received to treat: \n{status['data'][:5]}")
-    df_gps = pd.DataFrame(status["data"])  # pylint: disable=c0103
-    df_gps["timestamp_captura"] = timestamp
-    log(f"Before converting, datahora is: \n{df_gps['datahora']}")
 
     # Remove timezone and force it to be config timezone
     if version == 1:
@@ -185,33 +190,33 @@ def pre_treatment_br_rj_riodejaneiro_onibus_gps(
         timestamp_cols = ["datahora", "datahoraenvio"]
     if recapture:
         timestamp_cols.append("datahoraservidor")
-    for col in timestamp_cols:
-        print(f"Before converting, {col} is: \n{df_gps[col].head()}")  # log
-        df_gps[col] = (
-            pd.to_datetime(df_gps[col].astype(float), unit="ms")
-            .dt.tz_localize(tz="UTC")
-            .dt.tz_convert(timezone)
-        )
-        log(f"After converting the timezone, {col} is: \n{df_gps[col].head()}")
 
     # Filter data
     try:
-        log(f"Shape before filtering: {df_gps.shape}")
         if version == 1:
             filter_col = "timestamp_captura"
             time_delay = constants.GPS_SPPO_CAPTURE_DELAY_V1.value
         elif version == 2:
             filter_col = "datahoraenvio"
             time_delay = constants.GPS_SPPO_CAPTURE_DELAY_V2.value
+        delay_filters = [
+            {
+                "column": "datahora",
+                "reference_column": filter_col,
+                "max_delay": timedelta(minutes=time_delay),
+            }
+        ]
         if recapture:
-            server_mask = (
-                df_gps["datahoraenvio"] - df_gps["datahoraservidor"]
-            ) <= timedelta(minutes=constants.GPS_SPPO_RECAPTURE_DELAY_V2.value)
-            df_gps = df_gps[server_mask]  # pylint: disable=c0103
-
-        mask = (df_gps[filter_col] - df_gps["datahora"]).apply(
-            lambda x: timedelta(seconds=0) <= x <= timedelta(minutes=time_delay)
-        )
+            delay_filters.append(
+                {
+                    "column": "datahoraservidor",
+                    "reference_column": "datahoraenvio",
+                    "max_delay": timedelta(
+                        minutes=constants.GPS_SPPO_RECAPTURE_DELAY_V2.value
+                    ),
+                    "min_delay": None,
+                }
+            )
 
         # Select and drop duplicated data
         cols = [
@@ -223,12 +228,24 @@ def pre_treatment_br_rj_riodejaneiro_onibus_gps(
             "linha",
             "timestamp_captura",
         ]
-        df_gps = df_gps[mask][cols]  # pylint: disable=c0103
-        df_gps = df_gps.drop_duplicates(  # pylint: disable=c0103
-            ["ordem", "latitude", "longitude", "datahora", "timestamp_captura"]
+        df_gps, rows_before = treat_gps_payload(  # pylint: disable=c0103
+            status["data"],
+            timestamp,
+            delay_filters=delay_filters,
+            output_columns=cols,
+            duplicated_subset=[
+                "ordem",
+                "latitude",
+                "longitude",
+                "datahora",
+                "timestamp_captura",
+            ],
+            columns=[col for col in cols if col != "timestamp_captura"]
+            + [col for col in timestamp_cols if col != "datahora"],
+            timestamp_columns=timestamp_cols,
         )
 
-        log(f"Shape after filtering: {df_gps.shape}")
+        log(f"Shape before filtering: {rows_before}, after filtering: {df_gps.shape}")
         if df_gps.shape[0] == 0:
             error = ValueError("After filtering, the dataframe is empty!")
             log(f"[CATCHED] Task failed with error: \n{error}", level="error")
@@ -237,3 +254,30 @@ def pre_treatment_br_rj_riodejaneiro_onibus_gps(
         log(f"[CATCHED] Task failed with error: \n{error}", level="error")
 
     return {"data": df_gps, "error": error}
+
+
+@task
+def pre_treatment_br_rj_riodejaneiro_onibus_gps_batch(
+    statuses: List[dict],
+    timestamps: List[datetime],
+    version: int = 1,
+    recapture: bool = False,
+) -> List[Dict]:
+    """Applies `pre_treatment_br_rj_riodejaneiro_onibus_gps` to the data
+    captured for each timestamp, in a single task run.
+
+    Args:
+        statuses (list): status dicts of the requests, in the same order as `timestamps`
+        timestamps (list): Capture data timestamps.
+        version (int, optional): Source API version.
+        recapture (bool, optional): Whether the data is being recaptured.
+
+    Returns:
+        list: status dicts containing the treated data of each timestamp.
+    """
+    return [
+        pre_treatment_br_rj_riodejaneiro_onibus_gps.run(
+            status=status, timestamp=timestamp, version=version, recapture=recapture
+        )
+        for status, timestamp in zip(statuses, timestamps)
+    ]
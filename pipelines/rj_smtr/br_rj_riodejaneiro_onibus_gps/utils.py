@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+General purpose functions for the br_rj_riodejaneiro_onibus_gps project
+"""
+
+from datetime import datetime, timedelta
+
+from pipelines.rj_smtr.constants import constants
+
+
+def get_api_onibus_gps_source(version: int) -> tuple:
+    """
+    Returns the base URL and the Vault secret path of the GPS API version.
+    """
+    if version == 2:
+        return (
+            constants.GPS_SPPO_API_BASE_URL_V2.value,
+            constants.GPS_SPPO_API_SECRET_PATH_V2.value,
+        )
+    return (
+        constants.GPS_SPPO_API_BASE_URL.value,
+        constants.GPS_SPPO_API_SECRET_PATH.value,
+    )
+
+
+def build_api_url_onibus_gps(
+    url: str, source: str, headers: dict, timestamp: datetime, mask: bool = False
+) -> str:
+    """
+    Builds the complete URL to get data from API for a capture timestamp.
+
+    Args:
+        url (str): API base URL
+        source (str): Vault secret path of the API
+        headers (dict): Secret read from `source`
+        timestamp (datetime): Capture timestamp
+        mask (bool, optional): If True, the secret is left as `{secret}`, to log
+        the URL.
+
+    Returns:
+        str: URL to request
+    """
+    key = list(headers)[0]
+    url = f"{url}{key}={{secret}}"
+
+    if source == "sppo_api_v2":
+        date_range = {
+            "start": (timestamp - timedelta(minutes=6)).strftime("%Y-%m-%d+%H:%M:%S"),
+            "end": (timestamp - timedelta(minutes=5)).strftime("%Y-%m-%d+%H:%M:%S"),
+        }
+        url += f"&dataInicial={date_range['start']}&dataFinal={date_range['end']}"
+
+    if mask:
+        return url
+    return url.format(secret=headers[key])
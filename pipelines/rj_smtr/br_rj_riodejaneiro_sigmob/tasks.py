@@ -9,10 +9,10 @@ from pathlib import Path
 import jinja2
 import pendulum
 from prefect import task
-import requests
 
 from pipelines.rj_smtr.constants import constants
 from pipelines.rj_smtr.utils import generate_df_and_save, log_critical
+from pipelines.utils.http_client import get_http_client
 from pipelines.utils.utils import log
 
 
@@ -36,6 +36,9 @@ def request_data(endpoints: dict):
     # Initialize empty dict for storing file paths
     paths_dict = {}
 
+    # Pages of an endpoint are requested through the same connection
+    client = get_http_client()
+
     # Iterate over endpoints
     for key in endpoints.keys():
         log("#" * 80)
@@ -62,7 +65,7 @@ def request_data(endpoints: dict):
 
                 # Get data
                 log(f"URL = {next_page}")
-                data = requests.get(
+                data = client.get(
                     next_page, timeout=constants.SIGMOB_GET_REQUESTS_TIMEOUT.value
                 )
 
@@ -131,5 +134,7 @@ def request_data(endpoints: dict):
 
         # Move on to the next endpoint.
 
+    client.log_stats()
+
     # Return paths
     return paths_dict
@@ -52,13 +52,12 @@ from datetime import timedelta
 import traceback
 
 import pandas as pd
-import pendulum
 from prefect import task
 
 
 from pipelines.rj_smtr.constants import constants
 from pipelines.utils.utils import log
-from pipelines.rj_smtr.utils import log_critical
+from pipelines.rj_smtr.utils import log_critical, treat_gps_payload
 
 
 @task
@@ -86,48 +85,35 @@ def pre_treatment_br_rj_riodejaneiro_stpl_gps(status_dict, timestamp):
 
     # initialize df for nested columns
     df = pd.DataFrame(columns=columns)
-    timestamp_captura = pd.to_datetime(timestamp)
-    # separate each nested piece in data into a row
-    df["content"] = list(data)
-    # retrive key field from each nested piece in data
-    df[key_column] = [piece[key_column] for piece in data]
-    df["dataHora"] = [piece["dataHora"] for piece in data]
-    df["timestamp_captura"] = timestamp_captura
-    df["dataHora"] = df["dataHora"].apply(
-        lambda ms: pd.to_datetime(
-            pendulum.from_timestamp(ms / 1000.0, timezone).isoformat()
-        )
-    )
+    timestamp_captura = pd.Timestamp(timestamp)
+    if timestamp_captura.tzinfo is None:
+        timestamp_captura = timestamp_captura.tz_localize(timezone)
+    else:
+        timestamp_captura = timestamp_captura.tz_convert(timezone)
 
     # Filter data for 0 <= time diff <= 1min
     try:
-        datahora_col = "dataHora"
-        df_treated = df
-        try:
-            df_treated[datahora_col] = df_treated[datahora_col].apply(
-                lambda x: x.tz_convert(timezone)
-            )
-        except TypeError:
-            df_treated[datahora_col] = df_treated[datahora_col].apply(
-                lambda x: x.tz_localize(timezone)
-            )
-        try:
-            df_treated["timestamp_captura"] = df_treated["timestamp_captura"].apply(
-                lambda x: x.tz_convert(timezone)
-            )
-        except TypeError:
-            df_treated["timestamp_captura"] = df_treated["timestamp_captura"].apply(
-                lambda x: x.tz_localize(timezone)
-            )
-        mask = (df_treated["timestamp_captura"] - df_treated[datahora_col]).apply(
-            lambda x: timedelta(seconds=0) <= x <= timedelta(minutes=1)
+        # separate each nested piece in data into a row
+        df, rows_before = treat_gps_payload(
+            data,
+            timestamp_captura,
+            delay_filters=[
+                {
+                    "column": "dataHora",
+                    "reference_column": "timestamp_captura",
+                    "max_delay": timedelta(minutes=1),
+                }
+            ],
+            output_columns=columns,
+            columns=[key_column, "dataHora"],
+            timestamp_columns=["dataHora"],
+            content_column="content",
+            timezone=timezone,
         )
-        df_treated = df_treated[mask]
-        log(f"Shape antes da filtragem: {df.shape}")
-        log(f"Shape após a filtragem: {df_treated.shape}")
-        if df_treated.shape[0] == 0:
+        log(f"Shape antes da filtragem: {rows_before}")
+        log(f"Shape após a filtragem: {df.shape}")
+        if df.shape[0] == 0:
             error = ValueError("After filtering, the dataframe is empty!")
-        df = df_treated
     except Exception:
         error = traceback.format_exc()
         log_critical(f"Failed to filter STPL data: \n{error}")
@@ -22,6 +22,9 @@ class constants(Enum):  # pylint: disable=c0103
     MAX_RETRIES = 3
     RETRY_DELAY = 10
 
+    # RECAPTURE #
+    MAX_RECAPTURE_WORKERS = 10
+
     # GPS STPL #
     GPS_STPL_API_BASE_URL = "http://zn4.m2mcontrol.com.br/api/integracao/veiculos"
     GPS_STPL_API_SECRET_PATH = "stpl_api"
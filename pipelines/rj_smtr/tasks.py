@@ -4,13 +4,13 @@ Tasks for rj_smtr
 """
 # pylint: disable=W0703
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import json
 import os
 from pathlib import Path
 import traceback
-from typing import Dict
-import io
+from typing import Dict, List
 
 from basedosdados import Storage, Table
 import basedosdados as bd
@@ -28,9 +28,15 @@ from pipelines.rj_smtr.utils import (
     get_table_min_max_value,
     get_last_run_timestamp,
     log_critical,
+    request_raw,
 )
 from pipelines.utils.execute_dbt_model.utils import get_dbt_client
-from pipelines.utils.utils import log, get_redis_client, get_vault_secret
+from pipelines.utils.http_client import get_http_client
+from pipelines.utils.utils import (
+    log,
+    get_redis_client,
+    to_partitions,
+)
 
 ###############
 #
@@ -268,6 +274,74 @@ def save_treated_local(file_path: str, status: dict, mode: str = "staging") -> s
     return _file_path
 
 
+@task
+def save_raw_local_batch(
+    file_paths: List[str], statuses: List[dict], mode: str = "raw"
+) -> List[str]:
+    """
+    Saves many json responses from API to .json files, as `save_raw_local`.
+
+    Args:
+        file_paths (list): Paths which to save raw files
+        statuses (list): status dicts, in the same order as `file_paths`
+        mode (str, optional): Folder to save locally, later folder which to upload to GCS.
+
+    Returns:
+        list: Paths to the saved files
+    """
+    return [
+        save_raw_local.run(file_path=file_path, status=status, mode=mode)
+        for file_path, status in zip(file_paths, statuses)
+    ]
+
+
+@task
+def save_treated_local_batch(
+    file_paths: List[str],
+    statuses: List[dict],
+    timestamps: List[datetime],
+    suffix: str,
+    mode: str = "staging",
+) -> str:
+    """
+    Save many treated dataframes as a single frame, with one CSV file per
+    `data`/`hora` partition of the capture timestamps.
+
+    Args:
+        file_paths (list): Paths which to save each treated file, as
+        created by `create_local_partition_path`. Only the table folder is used.
+        statuses (list): status dicts from the treatment, in the same order as
+        `timestamps`
+        timestamps (list): Capture timestamps of each status
+        suffix (str): Suffix of the file saved on each partition, ie the run timestamp
+        mode (str, optional): Folder to save locally, later folder which to upload to GCS.
+
+    Returns:
+        str: Path to the table folder
+    """
+    # climb up the partition directories to reach the table dir
+    table_dir = Path(file_paths[0].format(mode=mode, filetype="csv")).parent
+    while "=" in table_dir.name:
+        table_dir = table_dir.parent
+
+    dataframes = [
+        status["data"].assign(
+            data=timestamp.strftime("%Y-%m-%d"), hora=timestamp.strftime("%H")
+        )
+        for status, timestamp in zip(statuses, timestamps)
+        if status["error"] is None and not status["data"].empty
+    ]
+    if dataframes:
+        to_partitions(
+            data=pd.concat(dataframes, ignore_index=True),
+            partition_columns=["data", "hora"],
+            savepath=table_dir,
+            suffix=suffix,
+        )
+    log(f"Treated data of {len(dataframes)} timestamps saved under: {table_dir}")
+    return str(table_dir)
+
+
 ###############
 #
 # Extract data
@@ -371,8 +445,12 @@ def query_logs(
 
 
 @task
-def get_raw(  # pylint: disable=R0912
-    url: str, headers: str = None, filetype: str = "json", csv_args: dict = None
+def get_raw(
+    url: str,
+    headers: str = None,
+    filetype: str = "json",
+    csv_args: dict = None,
+    conditional: bool = False,
 ) -> Dict:
     """
     Request data from URL API
@@ -382,48 +460,87 @@ def get_raw(  # pylint: disable=R0912
         headers (str, optional): Path to headers guardeded on Vault, if needed.
         filetype (str, optional): Filetype to be formatted (supported only: json, csv and txt)
         csv_args (dict, optional): Arguments for read_csv, if needed
+        conditional (bool, optional): If True, sends the ETag/Last-Modified of the last
+        response and returns empty data if the payload did not change.
     Returns:
         dict: Conatining keys
           * `data` (json): data result
           * `error` (str): catched error, if any. Otherwise, returns None
     """
-    data = None
-    error = None
-
-    try:
-        if headers is not None:
-            headers = get_vault_secret(headers)["data"]
-
-        response = requests.get(
-            url, headers=headers, timeout=constants.MAX_TIMEOUT_SECONDS.value
-        )
-
-        if response.ok:  # status code is less than 400
-            if filetype == "json":
-                data = response.json()
+    client = get_http_client()
+    if headers is not None:
+        try:
+            headers = client.get_secret_headers(headers)
+        except Exception as exp:
+            log(f"[CATCHED] Task failed with error: \n{exp}", level="error")
+            return {"data": None, "error": exp}
+
+    return request_raw(
+        url=url,
+        headers=headers,
+        filetype=filetype,
+        csv_args=csv_args,
+        session=client,
+        conditional=conditional,
+    )
 
-                # todo: move to data check on specfic API # pylint: disable=W0102
-                if isinstance(data, dict) and "DescricaoErro" in data.keys():
-                    error = data["DescricaoErro"]
 
-            elif filetype in ("txt", "csv"):
-                if csv_args is None:
-                    csv_args = {}
-                data = pd.read_csv(io.StringIO(response.text), **csv_args).to_dict(
-                    orient="records"
-                )
-            else:
-                error = (
-                    "Unsupported raw file extension. Supported only: json, csv and txt"
-                )
+@task
+def get_raw_batch(
+    urls: List[str],
+    headers: str = None,
+    filetype: str = "json",
+    csv_args: dict = None,
+    max_workers: int = constants.MAX_RECAPTURE_WORKERS.value,
+) -> List[Dict]:
+    """
+    Request data from many URLs of the same API concurrently, reusing the
+    connections of the shared HTTP client. Used to recapture many timestamps in
+    one task run.
 
-    except Exception as exp:
-        error = exp
+    Args:
+        urls (list): URLs to send requests
+        headers (str, optional): Path to headers guardeded on Vault, if needed.
+        It is read once for all requests.
+        filetype (str, optional): Filetype to be formatted (supported only: json, csv and txt)
+        csv_args (dict, optional): Arguments for read_csv, if needed
+        max_workers (int, optional): Maximum number of simultaneous requests
 
-    if error is not None:
-        log(f"[CATCHED] Task failed with error: \n{error}", level="error")
+    Returns:
+        list: status dicts, in the same order as `urls`, each containing keys
+          * `data` (json): data result
+          * `error` (str): catched error, if any. Otherwise, returns None
+    """
+    if not urls:
+        return []
+
+    max_workers = max(1, min(max_workers, len(urls)))
+    client = get_http_client(pool_maxsize=max_workers)
+    if headers is not None:
+        try:
+            headers = client.get_secret_headers(headers)
+        except Exception as exp:
+            log(f"[CATCHED] Task failed with error: \n{exp}", level="error")
+            return [{"data": None, "error": exp} for _ in urls]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        statuses = list(
+            executor.map(
+                lambda url: request_raw(
+                    url=url,
+                    headers=headers,
+                    filetype=filetype,
+                    csv_args=csv_args,
+                    session=client,
+                ),
+                urls,
+            )
+        )
+    client.log_stats()
 
-    return {"data": data, "error": error}
+    failed = sum(status["error"] is not None for status in statuses)
+    log(f"Requested {len(urls)} URLs: {len(urls) - failed} succeeded, {failed} failed")
+    return statuses
 
 
 ###############
@@ -501,6 +618,68 @@ def bq_upload(
     return error
 
 
+@task
+def bq_upload_batch(  # pylint: disable=R0913
+    dataset_id: str,
+    table_id: str,
+    table_dir: str,
+    raw_filepaths: List[str],
+    partitions: List[str],
+    statuses: List[dict],
+    max_workers: int = constants.MAX_RECAPTURE_WORKERS.value,
+) -> List[str]:
+    """
+    Upload many raw files and the partitioned treated data to GCS and BigQuery,
+    appending the treated data to the table once.
+
+    Args:
+        dataset_id (str): dataset_id on BigQuery
+        table_id (str): table_id on BigQuery
+        table_dir (str): Path to the table folder with the treated partitions, as
+        returned by `save_treated_local_batch`
+        raw_filepaths (list): Paths to the raw .json files
+        partitions (list): Partition of each raw file, ie "data=2022-03-01/hora=10"
+        statuses (list): status dicts from the treatment, in the same order as
+        `raw_filepaths`
+        max_workers (int, optional): Maximum number of simultaneous raw uploads
+
+    Returns:
+        list: error of each status, if any. Otherwise, None
+    """
+    errors = [status["error"] for status in statuses]
+    succeeded = [i for i, error in enumerate(errors) if error is None]
+    log(f"Uploading {len(succeeded)} of {len(statuses)} captures to {table_id}")
+    if not succeeded:
+        return errors
+
+    def upload_raw(index: int):
+        Storage(table_id=table_id, dataset_id=dataset_id).upload(
+            path=raw_filepaths[index],
+            partitions=partitions[index],
+            mode="raw",
+            if_exists="replace",
+        )
+
+    try:
+        # Raw files are uploaded one by one, since they are not csv files
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            list(executor.map(upload_raw, succeeded))
+
+        # Creates and publish table if it does not exist, append to it otherwise
+        create_or_append_table(
+            dataset_id=dataset_id,
+            table_id=table_id,
+            path=table_dir,
+        )
+    except Exception:
+        error = traceback.format_exc()
+        log(f"[CATCHED] Task failed with error: \n{error}", level="error")
+        for i in succeeded:
+            errors[i] = error
+
+    return errors
+
+
 @task
 def bq_upload_from_dict(paths: dict, dataset_id: str, partition_levels: int = 1):
     """Upload multiple tables from a dict structured as {table_id: csv_path}.
@@ -598,6 +777,74 @@ def upload_logs_to_bq(  # pylint: disable=R0913
         raise Exception(f"Pipeline failed with error: {error}")
 
 
+@task
+def upload_logs_to_bq_batch(  # pylint: disable=R0913
+    dataset_id: str,
+    parent_table_id: str,
+    timestamps: List[datetime],
+    errors: List[str],
+    previous_errors: List[str],
+    recapture: bool = True,
+):
+    """
+    Upload the execution status of many timestamps to BigQuery at once, as
+    `upload_logs_to_bq` does for each one. Raises if any timestamp failed.
+
+    Args:
+        dataset_id (str): dataset_id on BigQuery
+        parent_table_id (str): Parent table id related to the status table
+        timestamps (list): Capture timestamps
+        errors (list): Error of each timestamp, if any. Otherwise, None
+        previous_errors (list): Error of the previous capture of each timestamp
+        recapture (bool, optional): Whether the timestamps are being recaptured
+
+    Returns:
+        None
+    """
+    table_id = parent_table_id + "_logs"
+    dataframe = pd.DataFrame(
+        {
+            "timestamp_captura": timestamps,
+            "sucesso": [error is None for error in errors],
+            "erro": [
+                f"[recapturado]{previous_error}"
+                if error is None and recapture is True
+                else error
+                for error, previous_error in zip(errors, previous_errors)
+            ],
+        }
+    )
+    dataframe["data"] = [str(timestamp.date()) for timestamp in timestamps]
+    log(
+        f"Uploading {len(dataframe)} logs: "
+        f"{dataframe['sucesso'].sum()} succeeded, {(~dataframe['sucesso']).sum()} failed"
+    )
+
+    table_dir = Path(f"data/staging/{dataset_id}/{table_id}")
+    to_partitions(
+        data=dataframe,
+        partition_columns=["data"],
+        savepath=table_dir,
+        suffix=f"{table_id}_{timestamps[0].isoformat()}",
+    )
+    create_or_append_table(
+        dataset_id=dataset_id,
+        table_id=table_id,
+        path=table_dir.as_posix(),
+    )
+
+    failed = [
+        (timestamp, error)
+        for timestamp, error in zip(timestamps, errors)
+        if error is not None
+    ]
+    if failed:
+        raise Exception(
+            f"Pipeline failed for {len(failed)} timestamps. First error on "
+            f"{failed[0][0]}: {failed[0][1]}"
+        )
+
+
 @task(
     checkpoint=False,
     max_retries=constants.MAX_RETRIES.value,
@@ -3,8 +3,10 @@
 General purpose functions for rj_smtr
 """
 
+from datetime import timedelta
 from ftplib import FTP
 from pathlib import Path
+from typing import List, Tuple
 
 import io
 import basedosdados as bd
@@ -12,6 +14,11 @@ from basedosdados import Table
 import pandas as pd
 from pipelines.rj_smtr.implicit_ftp import ImplicitFtpTls
 
+from pipelines.utils.http_client import (
+    get_http_client,
+    HTTPClient,
+    RedisValidatorStore,
+)
 from pipelines.utils.utils import log
 from pipelines.utils.utils import (
     get_vault_secret,
@@ -45,12 +52,14 @@ def create_or_append_table(
     Args:
         dataset_id (str): target dataset_id on BigQuery
         table_id (str): target table_id on BigQuery
-        path (str): Path to .csv data file
+        path (str): Path to .csv data file, or to the table folder holding
+        the partitioned files
+        partitions (str, optional): Partition of `path`, if it is a single file
     """
     tb_obj = Table(table_id=table_id, dataset_id=dataset_id)
     if not tb_obj.table_exists("staging"):
         log("Table does not exist in STAGING, creating table...")
-        dirpath = path.split(partitions)[0]
+        dirpath = path.split(partitions)[0] if partitions else path
         tb_obj.create(
             path=dirpath,
             if_table_exists="pass",
@@ -377,3 +386,201 @@ def data_info_str(data: pd.DataFrame):
     buffer = io.StringIO()
     data.info(buf=buffer)
     return buffer.getvalue()
+
+
+def gps_payload_to_dataframe(
+    data: List[dict],
+    columns: List[str] = None,
+    timestamp_columns: List[str] = None,
+    content_column: str = None,
+    content_mapping: dict = None,
+    timezone: str = constants.TIMEZONE.value,
+) -> pd.DataFrame:
+    """
+    Parse a GPS API payload (one dict per vehicle) straight into columns
+
+    Args:
+        data (list): API payload
+        columns (list, optional): keys read as columns. Defaults to the keys of the
+        first dict
+        timestamp_columns (list, optional): columns with unix time in milliseconds,
+        converted to datetimes on `timezone`
+        content_column (str, optional): if set, each dict is also kept in this column
+        content_mapping (dict, optional): old to new keys, applied to each dict
+        before reading the columns
+        timezone (str, optional): timezone of the datetime columns
+
+    Returns:
+        pd.DataFrame: parsed data
+    """
+    if content_mapping:
+        data = [map_dict_keys(piece, content_mapping) for piece in data]
+    if columns is None:
+        columns = list(data[0].keys()) if data else []
+
+    dataframe = pd.DataFrame(
+        {column: [piece.get(column) for piece in data] for column in columns}
+    )
+    for column in timestamp_columns or []:
+        dataframe[column] = pd.to_datetime(
+            dataframe[column].astype(float), unit="ms", utc=True
+        ).dt.tz_convert(timezone)
+    if content_column:
+        dataframe[content_column] = list(data)
+    return dataframe
+
+
+def gps_delay_mask(
+    data: pd.DataFrame,
+    column: str,
+    reference_column: str,
+    max_delay: timedelta,
+    min_delay: timedelta = timedelta(0),
+) -> pd.Series:
+    """
+    Vectorized mask of the rows where `min_delay <= reference_column - column <=
+    max_delay`. Rows with missing values are filtered out.
+
+    Args:
+        data (pd.DataFrame): GPS data
+        column (str): datetime column of the GPS signal
+        reference_column (str): datetime column it is compared to (e.g. capture)
+        max_delay (timedelta): maximum delay
+        min_delay (timedelta, optional): minimum delay, None to skip the check
+
+    Returns:
+        pd.Series: boolean mask
+    """
+    delay = data[reference_column] - data[column]
+    mask = delay <= max_delay
+    if min_delay is not None:
+        mask &= delay >= min_delay
+    return mask
+
+
+def drop_duplicated_gps(data: pd.DataFrame, subset: List[str]) -> pd.DataFrame:
+    """
+    Drop duplicated rows on `subset`, keeping the first one, by hashing each row
+
+    Args:
+        data (pd.DataFrame): GPS data
+        subset (list): columns that identify a row
+
+    Returns:
+        pd.DataFrame: data without duplicates
+    """
+    hashes = pd.util.hash_pandas_object(data[subset], index=False)
+    return data[~hashes.duplicated().to_numpy()]
+
+
+def treat_gps_payload(  # pylint: disable=R0913
+    data: List[dict],
+    timestamp,
+    delay_filters: List[dict],
+    output_columns: List[str] = None,
+    duplicated_subset: List[str] = None,
+    **parse_kwargs,
+) -> Tuple[pd.DataFrame, int]:
+    """
+    GPS treatment shared by the onibus, BRT and STPL captures: parse the payload,
+    set the capture timestamp, keep the rows within the delay filters, select the
+    output columns and drop duplicates
+
+    Args:
+        data (list): API payload
+        timestamp: capture timestamp, stored on the column `timestamp_captura`
+        delay_filters (list): `gps_delay_mask` arguments for each filter
+        output_columns (list, optional): columns kept after filtering
+        duplicated_subset (list, optional): columns used to drop duplicates
+        **parse_kwargs: `gps_payload_to_dataframe` arguments
+
+    Returns:
+        tuple: treated data and number of rows before filtering
+    """
+    dataframe = gps_payload_to_dataframe(data, **parse_kwargs)
+    dataframe["timestamp_captura"] = timestamp
+    rows_before = len(dataframe)
+
+    mask = pd.Series(True, index=dataframe.index)
+    for delay_filter in delay_filters:
+        mask &= gps_delay_mask(dataframe, **delay_filter)
+    dataframe = dataframe[mask]
+
+    if output_columns:
+        dataframe = dataframe[output_columns]
+    if duplicated_subset:
+        dataframe = drop_duplicated_gps(dataframe, duplicated_subset)
+    return dataframe, rows_before
+
+
+def request_raw(
+    url: str,
+    headers: dict = None,
+    filetype: str = "json",
+    csv_args: dict = None,
+    session: HTTPClient = None,
+    conditional: bool = False,
+) -> dict:
+    """
+    Request data from URL API. Used by `get_raw` and `get_raw_batch`.
+
+    Args:
+        url (str): URL to send request
+        headers (dict, optional): Headers already read from Vault, if needed
+        filetype (str, optional): Filetype to be formatted (supported only: json, csv and txt)
+        csv_args (dict, optional): Arguments for read_csv, if needed
+        session (HTTPClient, optional): Client to reuse connections with. Defaults
+        to the shared client of the process.
+        conditional (bool, optional): If True, the payload is skipped (`data` is an
+        empty list) when the API answers that it did not change since the last request.
+
+    Returns:
+        dict: Conatining keys
+          * `data` (json): data result
+          * `error` (str): catched error, if any. Otherwise, returns None
+    """
+    data = None
+    error = None
+
+    try:
+        session = session or get_http_client()
+        response = session.get(
+            url,
+            headers=headers,
+            timeout=constants.MAX_TIMEOUT_SECONDS.value,
+            conditional=conditional,
+            validator_store=RedisValidatorStore(get_redis_client())
+            if conditional
+            else None,
+        )
+
+        if response.not_modified:
+            log("Payload not modified since the last request, skipping it")
+            data = []
+
+        elif response.ok:  # status code is less than 400
+            if filetype == "json":
+                data = response.json()
+
+                # todo: move to data check on specfic API # pylint: disable=W0102
+                if isinstance(data, dict) and "DescricaoErro" in data.keys():
+                    error = data["DescricaoErro"]
+
+            elif filetype in ("txt", "csv"):
+                if csv_args is None:
+                    csv_args = {}
+                data = pd.read_csv(io.StringIO(response.text), **csv_args).to_dict(
+                    orient="records"
+                )
+            else:
+                error = (
+                    "Unsupported raw file extension. Supported only: json, csv and txt"
+                )
+
+    except Exception as exp:  # pylint: disable=W0703
+        error = exp
+
+    if error is not None:
+        log(f"[CATCHED] Task failed with error: \n{error}", level="error")
+
+    return {"data": data, "error": error}
@@ -2,12 +2,18 @@
 """
 Helper flows that could fit any pipeline.
 """
-from pipelines.utils.backfill_flow.flows import *
-from pipelines.utils.dump_datario.flows import *
-from pipelines.utils.dump_db.flows import *
-from pipelines.utils.dump_to_gcs.flows import *
-from pipelines.utils.dump_url.flows import *
-from pipelines.utils.execute_dbt_model.flows import *
-from pipelines.utils.georeference.flows import *
-from pipelines.utils.predict_flow.flows import *
-from pipelines.utils.whatsapp_bot.flows import *
+from pipelines.flow_registry import lazy_flows
+
+FLOW_MODULES = [
+    "pipelines.utils.backfill_flow.flows",
+    "pipelines.utils.dump_datario.flows",
+    "pipelines.utils.dump_db.flows",
+    "pipelines.utils.dump_to_gcs.flows",
+    "pipelines.utils.dump_url.flows",
+    "pipelines.utils.execute_dbt_model.flows",
+    "pipelines.utils.georeference.flows",
+    "pipelines.utils.predict_flow.flows",
+    "pipelines.utils.whatsapp_bot.flows",
+]
+
+__getattr__, __dir__, __all__ = lazy_flows(__name__, FLOW_MODULES)
@@ -6,14 +6,13 @@ Backfill flow definition
 from prefect import Parameter
 from prefect.run_configs import KubernetesRun
 from prefect.storage import GCS
-from prefect.utilities.edges import unmapped
 
 from pipelines.constants import constants
 from pipelines.utils.backfill_flow.tasks import (
     create_timestamp_parameters,
-    launch_flow,
     parse_datetime,
     parse_duration,
+    run_backfill,
 )
 from pipelines.utils.constants import constants as utils_constants
 from pipelines.utils.decorators import Flow
@@ -43,8 +42,13 @@ with Flow(
     flow_name = Parameter("flow_name")
     flow_project = Parameter("flow_project", default="main")
     help_name = Parameter("help_name", default=None, required=False)
+    # Maximum number of windows running at the same time
+    max_concurrency = Parameter("max_concurrency", default=4)
     parameter_defaults = Parameter("parameter_defaults", default=None, required=False)
     reverse = Parameter("reverse", default=True)
+    # Skip the windows that already succeeded on a previous run of the backfill
+    resume = Parameter("resume", default=True)
+    progress_key = Parameter("progress_key", default=None, required=False)
 
     # Parse inputs
     backfill_start_datetime = parse_datetime(
@@ -67,16 +71,20 @@ with Flow(
     )
 
     # Launch runs
-    launch_flow.map(
-        flow_name=unmapped(flow_name),
-        parameter=timestamp_parameters,
-        agent_label=unmapped(agent_label),
-        flow_project=unmapped(flow_project),
-        parameter_defaults=unmapped(parameter_defaults),
-        help_name=unmapped(help_name),
-        datetime_start_param=unmapped(datetime_start_param),
-        datetime_end_param=unmapped(datetime_end_param),
-        fetch_flow_run_info_sleep_time=unmapped(fetch_flow_run_info_sleep_time),
+    run_backfill(
+        flow_name=flow_name,
+        parameters=timestamp_parameters,
+        agent_label=agent_label,
+        flow_project=flow_project,
+        parameter_defaults=parameter_defaults,
+        help_name=help_name,
+        datetime_start_param=datetime_start_param,
+        datetime_end_param=datetime_end_param,
+        datetime_format=datetime_format,
+        max_concurrency=max_concurrency,
+        fetch_flow_run_info_sleep_time=fetch_flow_run_info_sleep_time,
+        resume=resume,
+        progress_key=progress_key,
     )
 
 backfill_flow_definition.storage = GCS(constants.GCS_FLOWS_BUCKET.value)
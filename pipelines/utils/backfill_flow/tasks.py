@@ -4,12 +4,18 @@ Tasks for the backfill flow
 """
 
 from time import sleep
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import pendulum
 from prefect import Client, task
 from prefect.engine.state import State
 
+from pipelines.utils.backfill_flow.utils import (
+    BackfillProgress,
+    BackfillScheduler,
+    build_backfill_progress_key,
+    get_flow_runs_states,
+)
 from pipelines.utils.utils import log, run_registered
 
 
@@ -82,8 +88,8 @@ def launch_flow(
         None
     """
 
-    if parameter_defaults is None:
-        parameter_defaults = {}
+    # Copy, since the same dict is shared by every mapped run
+    parameter_defaults = dict(parameter_defaults or {})
 
     if help_name is None:
         help_name = flow_name
@@ -125,6 +131,101 @@ def launch_flow(
         )
 
 
+@task
+# pylint: disable=too-many-arguments, too-many-locals
+def run_backfill(
+    flow_name: str,
+    parameters: List[Dict[str, Any]],
+    agent_label: str,
+    flow_project: str = "main",
+    parameter_defaults: Dict[str, Any] = None,
+    help_name: str = None,
+    datetime_start_param: str = None,
+    datetime_end_param: str = None,
+    datetime_format: str = "YYYY-MM-DD",
+    max_concurrency: int = 4,
+    fetch_flow_run_info_sleep_time: int = 30,
+    resume: bool = True,
+    progress_key: str = None,
+    prefect_client: Client = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Run a flow for every backfill window, with at most `max_concurrency` runs at
+    a time. The states of all running windows are fetched with a single query
+    and the windows that succeed are saved on Redis, so a restarted backfill
+    skips them.
+
+    Args:
+        flow_name: The name of the flow to launch
+        parameters: The backfill parameters (windows), in the order to launch them
+        agent_label: The agent label to use when launching the flow
+        flow_project: The project to use when launching the flow
+        parameter_defaults: The default parameters to use when launching the flow
+        help_name: A help name to use when setting the flow run name
+        datetime_start_param: The name of the start datetime parameter
+        datetime_end_param: The name of the end datetime parameter
+        datetime_format: The format of the timestamps of the windows
+        max_concurrency: The maximum number of windows running at the same time
+        fetch_flow_run_info_sleep_time: The time to sleep between fetching flow run info
+        resume: Whether to skip the windows that already succeeded
+        progress_key: The Redis key of the progress (default: built from the flow
+            and its parameters)
+        prefect_client: The Prefect client to use
+
+    Returns:
+        The duration and throughput of every window
+    """
+    if help_name is None:
+        help_name = flow_name
+
+    if prefect_client is None:
+        prefect_client = Client()
+
+    def launch(parameter: Dict[str, Any]) -> str:
+        flow_parameters = dict(parameter_defaults or {})
+        if datetime_start_param:
+            flow_parameters[datetime_start_param] = parameter["start"]
+        if datetime_end_param:
+            flow_parameters[datetime_end_param] = parameter["end"]
+        return run_registered(
+            flow_name=flow_name,
+            flow_project=flow_project,
+            labels=[agent_label],
+            parameters=flow_parameters,
+            run_description=f"Backfill - {help_name} - {parameter['start']} to {parameter['end']}",
+        )
+
+    progress = None
+    if resume:
+        if progress_key is None:
+            progress_key = build_backfill_progress_key(
+                flow_name=flow_name,
+                flow_project=flow_project,
+                parameter_defaults=parameter_defaults,
+                datetime_start_param=datetime_start_param,
+                datetime_end_param=datetime_end_param,
+            )
+        log(f"Backfill progress is saved on Redis key {progress_key}")
+        progress = BackfillProgress(progress_key)
+
+    report = BackfillScheduler(
+        windows=parameters,
+        launch=launch,
+        get_states=lambda flow_run_ids: get_flow_runs_states(
+            flow_run_ids, prefect_client
+        ),
+        max_concurrency=max_concurrency,
+        poll_interval=fetch_flow_run_info_sleep_time,
+        progress=progress,
+        datetime_format=datetime_format,
+    ).run()
+
+    failed = [window for window, info in report.items() if not info["success"]]
+    if failed:
+        raise Exception(f"Runs for windows {', '.join(failed)} failed")
+    return report
+
+
 @task
 def parse_datetime(
     datetime_string: str,
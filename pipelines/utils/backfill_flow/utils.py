@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers for the backfill flow: scheduling of the windows, batched state
+queries and progress saved on Redis.
+"""
+
+from collections import deque
+from hashlib import sha1
+import json
+from time import monotonic, sleep
+from typing import Any, Callable, Dict, List
+
+import pendulum
+from prefect import Client
+from prefect.engine.state import State
+
+from pipelines.utils.utils import get_redis_client, log
+
+
+def get_window_id(parameter: Dict[str, Any]) -> str:
+    """
+    Returns the identifier of a backfill window.
+    """
+    return f"{parameter['start']}/{parameter['end']}"
+
+
+def build_backfill_progress_key(**config: Any) -> str:
+    """
+    Returns the Redis key for the progress of a backfill, built from its
+    configuration (flow, project, parameters...). A backfill restarted with the
+    same configuration gets the same key and resumes from where it stopped.
+    """
+    digest = sha1(
+        json.dumps(config, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"backfill.{config.get('flow_name')}.{digest[:16]}"
+
+
+class BackfillProgress:
+    """
+    Windows of a backfill that already succeeded, kept on the Redis hash `key` as
+    {window_id: JSON with the flow run id and durations}.
+    """
+
+    def __init__(self, key: str, redis_client=None):
+        self.key = key
+        self.redis_client = redis_client or get_redis_client()
+
+    def finished(self) -> Dict[str, dict]:
+        """
+        Returns the windows already finished, by window id.
+        """
+        finished = {}
+        for field, value in self.redis_client.hgetall(self.key).items():
+            if isinstance(field, bytes):
+                field = field.decode("utf-8")
+            finished[field] = json.loads(value)
+        return finished
+
+    def save(self, window_id: str, info: Dict[str, Any]) -> None:
+        """
+        Saves a finished window.
+        """
+        self.redis_client.hset(self.key, window_id, json.dumps(info, default=str))
+
+
+def get_flow_runs_states(
+    flow_run_ids: List[str], prefect_client: Client = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetches the state, start time and end time of many flow runs with a single
+    GraphQL query.
+
+    Returns:
+        A dict {flow_run_id: {"state": State, "start_time": str, "end_time": str}}
+    """
+    if not flow_run_ids:
+        return {}
+    if prefect_client is None:
+        prefect_client = Client()
+    query = """
+        query($ids: [uuid!]) {
+            flow_run(where: {id: {_in: $ids}}) {
+                id
+                serialized_state
+                start_time
+                end_time
+            }
+        }
+    """
+    response = prefect_client.graphql(
+        query=query, variables=dict(ids=list(flow_run_ids))
+    )
+    return {
+        flow_run["id"]: {
+            "state": State.deserialize(flow_run["serialized_state"]),
+            "start_time": flow_run["start_time"],
+            "end_time": flow_run["end_time"],
+        }
+        for flow_run in response["data"]["flow_run"]
+    }
+
+
+def get_run_duration(info: Dict[str, Any], launched_at: float, now: float) -> float:
+    """
+    Duration of a flow run in seconds, from its start and end times on Prefect
+    or, if not available, from the time it was launched.
+    """
+    if info.get("start_time") and info.get("end_time"):
+        start = pendulum.parse(info["start_time"])
+        end = pendulum.parse(info["end_time"])
+        return max((end - start).total_seconds(), 0.0)
+    return now - launched_at
+
+
+def get_window_span(parameter: Dict[str, Any], datetime_format: str) -> float:
+    """
+    Size of a backfill window in seconds, or 0 if its bounds can't be parsed.
+    """
+    try:
+        start = pendulum.from_format(parameter["start"], datetime_format)
+        end = pendulum.from_format(parameter["end"], datetime_format)
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+    return abs((end - start).total_seconds())
+
+
+class BackfillScheduler:  # pylint: disable=too-many-instance-attributes
+    """
+    Runs the windows of a backfill with at most `max_concurrency` flow runs at a
+    time, launched in the order of `windows`. The states of every running flow run
+    are fetched with one call of `get_states` every `poll_interval` seconds.
+    Successful windows are saved on `progress`, so they are skipped when a
+    backfill is restarted.
+
+    `launch` receives a window and returns the id of its flow run; `get_states`
+    receives a list of flow run ids (see `get_flow_runs_states`).
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        windows: List[Dict[str, Any]],
+        launch: Callable[[Dict[str, Any]], str],
+        get_states: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+        max_concurrency: int = 4,
+        poll_interval: float = 30,
+        progress: BackfillProgress = None,
+        datetime_format: str = "YYYY-MM-DD",
+        wait: Callable[[float], None] = sleep,
+    ):
+        self.windows = windows
+        self.launch = launch
+        self.get_states = get_states
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.poll_interval = poll_interval
+        self.progress = progress
+        self.datetime_format = datetime_format
+        self.wait = wait
+        self.report: Dict[str, Dict[str, Any]] = {}
+
+    def _finish(
+        self, window: Dict[str, Any], flow_run_id: str, info: dict, launched_at: float
+    ) -> None:
+        """
+        Records a finished window, logging its duration and throughput.
+        """
+        window_id = get_window_id(window)
+        seconds = get_run_duration(info, launched_at, monotonic())
+        span = get_window_span(window, self.datetime_format)
+        state: State = info["state"]
+        result = {
+            "flow_run_id": flow_run_id,
+            "state": type(state).__name__,
+            "success": state.is_successful(),
+            "seconds": round(seconds, 1),
+            # Seconds of data backfilled per second of run
+            "throughput": round(span / seconds, 1) if seconds > 0 else None,
+        }
+        self.report[window_id] = result
+        if result["success"]:
+            log(
+                f"Run for window {window['start']} to {window['end']} succeeded in "
+                f"{seconds:.0f}s ({result['throughput']}x real time)"
+            )
+            if self.progress is not None:
+                self.progress.save(window_id, result)
+        else:
+            log(
+                f"Run for window {window['start']} to {window['end']} failed",
+                level="error",
+            )
+
+    def run(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Runs the backfill.
+
+        Returns:
+            A report {window_id: {"flow_run_id", "state", "seconds",
+            "throughput"}} of the windows run now and of the ones skipped.
+        """
+        finished = self.progress.finished() if self.progress is not None else {}
+        pending = deque()
+        for window in self.windows:
+            window_id = get_window_id(window)
+            if window_id in finished:
+                self.report[window_id] = {**finished[window_id], "skipped": True}
+            else:
+                pending.append(window)
+        if finished:
+            log(f"Skipping {len(self.windows) - len(pending)} finished windows")
+
+        started_at = monotonic()
+        running: Dict[str, tuple] = {}
+        while pending or running:
+            while pending and len(running) < self.max_concurrency:
+                window = pending.popleft()
+                log(f"Launching run for window {window['start']} to {window['end']}")
+                running[self.launch(window)] = (window, monotonic())
+
+            self.wait(self.poll_interval)
+            states = self.get_states(list(running))
+            for flow_run_id, info in states.items():
+                if flow_run_id in running and info["state"].is_finished():
+                    window, launched_at = running.pop(flow_run_id)
+                    self._finish(window, flow_run_id, info, launched_at)
+
+        elapsed = max(monotonic() - started_at, 1e-6)
+        ran = [info for info in self.report.values() if not info.get("skipped")]
+        failed = [info for info in ran if not info["success"]]
+        log(
+            f"Backfill ran {len(ran)} windows in {elapsed:.0f}s "
+            f"({len(ran) / elapsed * 3600:.1f} windows/hour): "
+            f"{len(ran) - len(failed)} succeeded, {len(failed)} failed, "
+            f"{len(self.report) - len(ran)} skipped"
+        )
+        return self.report
@@ -6,6 +6,7 @@ Customizing stuff for the pipelines package.
 
 from datetime import timedelta
 from functools import partial
+import sys
 from typing import Callable, Iterable, List, Optional, Set, Union
 
 import prefect
@@ -27,6 +28,18 @@ from pipelines.constants import constants
 from pipelines.utils.utils import notify_discord_on_failure, skip_if_running_handler
 
 
+def flush_metrics_on_finish(obj, old_state, new_state):
+    """
+    State handler that flushes the Elasticsearch metrics buffer when a flow
+    finishes. The metrics module is only used if a task already imported it, so
+    flows that don't emit metrics never load the Elasticsearch client.
+    """
+    metrics = sys.modules.get("pipelines.utils.elasticsearch_metrics.utils")
+    if metrics is None:
+        return new_state
+    return metrics.flush_metrics_on_finish(obj, old_state, new_state)
+
+
 class CustomFlow(Flow):
     """
     A custom Flow class that implements code ownership in order to make it easier to
@@ -53,10 +66,11 @@ class CustomFlow(Flow):
         code_owners: Optional[List[str]] = None,
         skip_if_running: bool = False,
     ):
+        if state_handlers is None:
+            state_handlers = []
         if skip_if_running:
-            if state_handlers is None:
-                state_handlers = []
             state_handlers.append(skip_if_running_handler)
+        state_handlers.append(flush_metrics_on_finish)
         super().__init__(
             name=name,
             schedule=schedule,
@@ -46,6 +46,11 @@ with Flow(
     )
     geometry_3d_to_2d = Parameter("geometry_3d_to_2d", default=False, required=False)
     batch_size = Parameter("batch_size", default=100, required=False)
+    # csv or parquet (GeoParquet, with the geometry as WKB)
+    output_format = Parameter("output_format", default="csv", required=False)
+    # Geometry encoding of CSV files: wkt or wkb (hex)
+    geometry_encoding = Parameter("geometry_encoding", default="wkt", required=False)
+    max_workers = Parameter("max_workers", default=4, required=False)
 
     # BigQuery parameters
     dataset_id = Parameter("dataset_id")
@@ -99,6 +104,9 @@ with Flow(
         geometry_column=geometry_column,
         convert_to_crs_4326=convert_to_crs_4326,
         geometry_3d_to_2d=geometry_3d_to_2d,
+        output_format=output_format,
+        geometry_encoding=geometry_encoding,
+        max_workers=max_workers,
         wait=file_path,
     )
     datario_path.set_upstream(file_path)
@@ -109,6 +117,7 @@ with Flow(
         table_id=table_id,
         dump_mode=dump_mode,
         biglake_table=biglake_table,
+        data_type=output_format,
         wait=datario_path,
     )
     CREATE_TABLE_AND_UPLOAD_TO_GCS_DONE.set_upstream(datario_path)
@@ -4,20 +4,21 @@ General purpose tasks for dumping database data.
 """
 # pylint: disable=unused-argument, W0613, R0913, W0108
 
+from functools import partial
 from pathlib import Path
 from typing import Union
 from datetime import datetime, timedelta
 
 from geojsplit import geojsplit
-import geopandas as gpd
 from prefect import task
 import requests
 
-from pipelines.utils.utils import log, log_mod, remove_columns_accents
+from pipelines.utils.utils import log, log_mod, ParquetSink
 
 from pipelines.utils.dump_datario.utils import (
-    load_wkt,
-    remove_third_dimension,
+    get_geoparquet_schema,
+    map_batches,
+    transform_geojson_batch,
 )
 from pipelines.constants import constants
 
@@ -78,10 +79,15 @@ def transform_geodataframe(
     geometry_column: str = "geometry",
     convert_to_crs_4326: bool = False,
     geometry_3d_to_2d: bool = False,
+    output_format: str = "csv",
+    geometry_encoding: str = "wkt",
+    max_workers: int = 4,
+    max_batches_in_flight: int = None,
     wait=None,
 ):  # sourcery skip: convert-to-enumerate
     """ "
-    Transform a CSV from data.rio API
+    Transform a GeoJSON from data.rio API into CSV or GeoParquet files, saved on a
+    new directory whose path is returned
 
     Parameters:
         - file_path (Union[str, Path]): Path to the geojson file to be transformed.
@@ -89,97 +95,81 @@ def transform_geodataframe(
         - geometry_column (str): Column containing the geometry data.
         - convert_to_crs_4326 (bool): Convert the geometry data to the crs 4326 projection.
         - geometry_3d_to_2d (bool): Convert the geometry data from 3D to 2D.
+        - output_format (str): "csv" or "parquet" (GeoParquet, geometry as WKB).
+        - geometry_encoding (str): Geometry encoding of CSV files, "wkt" or "wkb"
+        (hex).
+        - max_workers (int): Number of processes transforming batches in parallel.
+        - max_batches_in_flight (int): Maximum number of batches read and not yet
+        saved (default: twice max_workers).
         - wait (None): Prefect task wait parameter (default: None)
     """
+    if output_format not in ["csv", "parquet"]:
+        raise ValueError(f"Invalid output format: {output_format}")
+    if geometry_encoding not in ["wkt", "wkb"]:
+        raise ValueError(f"Invalid geometry encoding: {geometry_encoding}")
+
     eventid = datetime.now().strftime("%Y%m%d-%H%M%S")
 
     # move to path file since file_path is path / "geo_data" / "data.geojson"
-    save_path = file_path.parent.parent / "csv_data" / f"{eventid}.csv"
-    save_path.parent.mkdir(parents=True, exist_ok=True)
+    save_dir = file_path.parent.parent / f"{output_format}_data" / eventid
+    save_path = save_dir / f"{eventid}.{output_format}"
+    save_dir.mkdir(parents=True, exist_ok=True)
 
     geojson = geojsplit.GeoJSONBatchStreamer(file_path)
+    features = (
+        feature_collection["features"]
+        for feature_collection in geojson.stream(batch=batch_size)
+    )
+    transform = partial(
+        transform_geojson_batch,
+        geometry_column=geometry_column,
+        convert_to_crs_4326=convert_to_crs_4326,
+        geometry_3d_to_2d=geometry_3d_to_2d,
+        output_format=output_format,
+        geometry_encoding=geometry_encoding,
+    )
 
     # only print every print_mod batches
     mod = 1000
-    count = 1
-    for feature_collection in geojson.stream(batch=batch_size):
-        geodataframe = gpd.GeoDataFrame.from_features(feature_collection["features"])
-        log_mod(
-            msg=f"{count} x {batch_size} rows: geodataframe loaded",
-            index=count,
-            mod=mod,
-        )
-
-        # move geometry column to the end
-        cols = geodataframe.columns.tolist()
-        cols.remove(geometry_column)
-        cols.append(geometry_column)
-        geodataframe = geodataframe[cols]
-
-        # remove accents from columns
-        geodataframe.columns = remove_columns_accents(geodataframe)
-        geodataframe["geometry_wkt"] = geodataframe[geometry_column].copy()
-
-        # convert geometry to crs 4326
-        if convert_to_crs_4326:
-            try:
-                geodataframe.crs = "epsg:4326"
-                geodataframe[geometry_column] = geodataframe[geometry_column].to_crs(
-                    "epsg:4326"
-                )
-            except Exception as err:
-                log(f"{count}: error converting to crs 4326: {err}")
-                raise err
-
+    count = 0
+    rows = 0
+    schema = None
+    with ParquetSink() as parquet_sink:
+        for dataframe in map_batches(
+            transform,
+            features,
+            max_workers=max_workers,
+            max_in_flight=max_batches_in_flight,
+        ):
+            count += 1
+            rows += len(dataframe)
             log_mod(
-                msg=f"{count}: geometry converted to crs 4326",
+                msg=f"{count}: columns: {dataframe.columns.tolist()}",
                 index=count,
                 mod=mod,
             )
 
-        # convert geometry 3d to 2d
-        if geometry_3d_to_2d:
-            try:
-                geodataframe[geometry_column] = (
-                    geodataframe[geometry_column].astype(str).apply(load_wkt)
+            if output_format == "parquet":
+                if schema is None:
+                    schema = get_geoparquet_schema(
+                        dataframe.columns.tolist(), geometry_column
+                    )
+                parquet_sink.write(
+                    dataframe.reindex(columns=schema.names), save_path, schema=schema
                 )
-
-                geodataframe[geometry_column] = geodataframe[geometry_column].apply(
-                    remove_third_dimension
+            else:
+                dataframe.to_csv(
+                    save_path,
+                    index=False,
+                    encoding="utf-8",
+                    mode="a",
+                    header=not save_path.exists(),
                 )
-            except Exception as err:
-                log(f"{count}: error converting 3d to 2d: {err}")
-                raise err
 
             log_mod(
-                msg=f"{count}: geometry converted 3D to 2D",
+                msg=f"{count} x {batch_size} rows: Data saved",
                 index=count,
                 mod=mod,
             )
-
-        log_mod(
-            msg=f"{count}: new columns: {geodataframe.columns.tolist()}",
-            index=count,
-            mod=mod,
-        )
-
-        # save geodataframe to csv
-        geodataframe.to_csv(
-            save_path,
-            index=False,
-            encoding="utf-8",
-            mode="a",
-            header=not save_path.exists(),
-        )
-
-        # clear memory
-        del geodataframe
-
-        log_mod(
-            msg=f"{count} x {batch_size} rows: Data saved",
-            index=count,
-            mod=mod,
-        )
-        count += 1
-    log(f"{count} x {batch_size} DATA TRANSFORMED!!!")
-    return save_path
+    log(f"{count} batches, {rows} rows: DATA TRANSFORMED!!!")
+    return save_dir
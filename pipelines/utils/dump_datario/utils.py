@@ -4,9 +4,16 @@
 General utilities for interacting with datario-dump
 """
 
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
 from datetime import timedelta, datetime
-from typing import List
+import json
+from typing import Callable, Iterable, Iterator, List
 
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
 from shapely.geometry import (
     Polygon,
     MultiPolygon,
@@ -19,9 +26,15 @@ from shapely.geometry import (
 )
 from shapely import wkt
 
+try:
+    from shapely import force_2d, to_wkb, to_wkt
+except ImportError:  # shapely < 2.0
+    force_2d = to_wkb = to_wkt = None
 
 from prefect.schedules.clocks import IntervalClock
 
+from pipelines.utils.utils import remove_columns_accents
+
 
 def generate_dump_datario_schedules(  # pylint: disable=too-many-arguments,too-many-locals
     interval: timedelta,
@@ -57,6 +70,9 @@ def generate_dump_datario_schedules(  # pylint: disable=too-many-arguments,too-m
             ]
         if "geometry_3d_to_2d" in parameters:
             parameter_defaults["geometry_3d_to_2d"] = parameters["geometry_3d_to_2d"]
+        for parameter in ["batch_size", "output_format", "geometry_encoding"]:
+            if parameter in parameters:
+                parameter_defaults[parameter] = parameters[parameter]
 
         new_interval = parameters["interval"] if "interval" in parameters else interval
         clocks.append(
@@ -134,3 +150,156 @@ def load_wkt(x):
         return wkt.loads(x)
     except Exception:
         return None
+
+
+def map_geometries(function: Callable, geometries: np.ndarray) -> np.ndarray:
+    """
+    Apply `function` to each geometry, returning an object array (numpy would
+    otherwise try to unpack multi-part geometries of shapely < 2.0)
+    """
+    result = np.empty(len(geometries), dtype=object)
+    for index, geom in enumerate(geometries):
+        result[index] = function(geom)
+    return result
+
+
+def drop_third_dimension(geometries: Iterable) -> np.ndarray:
+    """
+    Remove third dimension from an array of geometries, at once with shapely 2.x
+    (falls back to `remove_third_dimension` on each geometry on older versions)
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    if force_2d is not None:
+        return force_2d(geometries)
+    return map_geometries(remove_third_dimension, geometries)
+
+
+def encode_geometries(geometries: Iterable, encoding: str = "wkt") -> np.ndarray:
+    """
+    Encode an array of geometries as WKT, WKB (bytes) or WKB hex strings. Missing
+    geometries stay None. WKT is the same text as `str(geometry)`.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    if encoding not in ["wkt", "wkb", "wkb_hex"]:
+        raise ValueError(f"Invalid geometry encoding: {encoding}")
+    if to_wkt is not None:
+        if encoding == "wkt":
+            return to_wkt(geometries, rounding_precision=-1)
+        return to_wkb(geometries, hex=encoding == "wkb_hex")
+    return map_geometries(
+        lambda geom: None if geom is None else getattr(geom, encoding), geometries
+    )
+
+
+def get_geoparquet_metadata(geometry_column: str) -> dict:
+    """
+    GeoParquet metadata for a file whose geometry column is encoded as WKB
+    """
+    return {
+        "geo": json.dumps(
+            {
+                "version": "1.0.0",
+                "primary_column": geometry_column,
+                "columns": {geometry_column: {"encoding": "WKB", "geometry_types": []}},
+            }
+        )
+    }
+
+
+def get_geoparquet_schema(columns: List[str], geometry_column: str) -> pa.Schema:
+    """
+    Arrow schema of a GeoParquet file with the given columns: the geometry column
+    is WKB (binary) and every other column is a string, so every batch is written
+    with the same schema, even if some of its columns are all null.
+    """
+    return pa.schema(
+        [
+            (column, pa.binary() if column == geometry_column else pa.string())
+            for column in columns
+        ],
+        metadata=get_geoparquet_metadata(geometry_column),
+    )
+
+
+def transform_geojson_batch(
+    features: List[dict],
+    geometry_column: str = "geometry",
+    convert_to_crs_4326: bool = False,
+    geometry_3d_to_2d: bool = False,
+    output_format: str = "csv",
+    geometry_encoding: str = "wkt",
+) -> pd.DataFrame:
+    """
+    Transform a batch of GeoJSON features into a dataframe ready to be saved: the
+    geometry column goes to the end (with a `geometry_wkt` copy of the original
+    geometry), column accents are removed and the geometries are reprojected and
+    have their third dimension removed for the whole batch at once.
+
+    Geometries are encoded in the batch (WKT or WKB hex for CSV, WKB for Parquet),
+    so this runs on worker processes. For Parquet, the other columns are saved as
+    strings, keeping the same schema between batches.
+    """
+    geodataframe = gpd.GeoDataFrame.from_features(features)
+
+    # move geometry column to the end
+    cols = geodataframe.columns.tolist()
+    cols.remove(geometry_column)
+    cols.append(geometry_column)
+    geodataframe = geodataframe[cols]
+
+    # remove accents from columns
+    geodataframe.columns = remove_columns_accents(geodataframe)
+    geometry_wkt = encode_geometries(geodataframe[geometry_column], "wkt")
+
+    # convert geometry to crs 4326
+    if convert_to_crs_4326:
+        geodataframe.crs = "epsg:4326"
+        geodataframe[geometry_column] = geodataframe[geometry_column].to_crs(
+            "epsg:4326"
+        )
+
+    geometries = geodataframe[geometry_column].values
+    # convert geometry 3d to 2d
+    if geometry_3d_to_2d:
+        geometries = drop_third_dimension(geometries)
+
+    if output_format == "parquet":
+        geometry_encoding = "wkb"
+    elif geometry_encoding == "wkb":
+        geometry_encoding = "wkb_hex"
+
+    dataframe = pd.DataFrame(geodataframe.drop(columns=[geometry_column]))
+    if output_format == "parquet":
+        dataframe = dataframe.astype(str).where(dataframe.notna(), None)
+    dataframe[geometry_column] = encode_geometries(geometries, geometry_encoding)
+    dataframe["geometry_wkt"] = geometry_wkt
+    return dataframe
+
+
+def map_batches(
+    function: Callable,
+    batches: Iterable,
+    max_workers: int = 1,
+    max_in_flight: int = None,
+    executor_class: Callable[..., Executor] = ProcessPoolExecutor,
+) -> Iterator:
+    """
+    Yields `function(batch)` for every batch, in order. With more than one worker,
+    batches are transformed in parallel, keeping at most `max_in_flight` batches
+    (default: twice the number of workers) read and not yet yielded, so memory
+    stays bounded however large the input is.
+    """
+    if not max_workers or max_workers <= 1:
+        for batch in batches:
+            yield function(batch)
+        return
+
+    max_in_flight = max(max_in_flight or 2 * max_workers, 1)
+    with executor_class(max_workers=max_workers) as executor:
+        futures = deque()
+        for batch in batches:
+            futures.append(executor.submit(function, batch))
+            if len(futures) >= max_in_flight:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
@@ -13,3 +13,4 @@ class constants(Enum):  # pylint: disable=c0103
 
     WAIT_FOR_MATERIALIZATION_RETRY_ATTEMPTS = 3
     WAIT_FOR_MATERIALIZATION_RETRY_INTERVAL = 5
+    DUMP_MEMORY_BUDGET_BYTES = 2 * 1024**3
@@ -4,11 +4,13 @@ Database definitions for SQL pipelines.
 """
 
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Any, Dict, List
 
 import cx_Oracle
+import pyarrow as pa
 import pymssql
 import pymysql.cursors
+from pymysql.constants import FIELD_TYPE
 
 
 class Database(ABC):
@@ -16,6 +18,10 @@ class Database(ABC):
     Database abstract class.
     """
 
+    # Maps cursor description type codes to Arrow types. Columns with unmapped
+    # type codes have their Arrow type inferred from the fetched values.
+    ARROW_TYPES: Dict[Any, pa.DataType] = {}
+
     # pylint: disable=too-many-arguments
     def __init__(
         self,
@@ -82,12 +88,65 @@ class Database(ABC):
         Fetches all rows from the database.
         """
 
+    def get_arrow_types(self) -> List[pa.DataType]:
+        """
+        Returns the Arrow types of the columns, based on the cursor description.
+        Unknown types are returned as `None`.
+        """
+        return [self.ARROW_TYPES.get(column[1]) for column in self._cursor.description]
+
+    def fetch_arrow_batch(self, batch_size: int) -> pa.RecordBatch:
+        """
+        Fetches a batch of rows from the database as an Arrow record batch, building
+        columns straight from the fetched tuples.
+        """
+        names = self.get_columns()
+        types = self.get_arrow_types()
+        rows = self._cursor.fetchmany(batch_size)
+        if rows:
+            columns = list(zip(*rows))
+        else:
+            columns = [()] * len(names)
+        del rows
+        arrays = [
+            build_arrow_array(values, arrow_type)
+            for values, arrow_type in zip(columns, types)
+        ]
+        return pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def build_arrow_array(values: tuple, arrow_type: pa.DataType = None) -> pa.Array:
+    """
+    Builds an Arrow array from a column of values. Falls back to type inference if
+    the values don't fit `arrow_type`, and to strings if they can't be inferred
+    (e.g. LOB objects).
+    """
+    if arrow_type is not None:
+        try:
+            return pa.array(values, type=arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+            pass
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+        return pa.array(
+            [str(value) if value is not None else None for value in values],
+            type=pa.string(),
+        )
+
 
 class SqlServer(Database):
     """
     SQL Server database.
     """
 
+    # pymssql type codes: 1 = STRING, 2 = BINARY, 4 = DATETIME
+    ARROW_TYPES = {
+        1: pa.string(),
+        2: pa.binary(),
+        4: pa.timestamp("us"),
+    }
+
     # pylint: disable=too-many-arguments
     def __init__(
         self,
@@ -167,6 +226,22 @@ class MySql(Database):
     MySQL database.
     """
 
+    ARROW_TYPES = {
+        FIELD_TYPE.VARCHAR: pa.string(),
+        FIELD_TYPE.VAR_STRING: pa.string(),
+        FIELD_TYPE.STRING: pa.string(),
+        FIELD_TYPE.TINY: pa.int64(),
+        FIELD_TYPE.SHORT: pa.int64(),
+        FIELD_TYPE.INT24: pa.int64(),
+        FIELD_TYPE.LONG: pa.int64(),
+        FIELD_TYPE.LONGLONG: pa.int64(),
+        FIELD_TYPE.FLOAT: pa.float64(),
+        FIELD_TYPE.DOUBLE: pa.float64(),
+        FIELD_TYPE.DATE: pa.date32(),
+        FIELD_TYPE.DATETIME: pa.timestamp("us"),
+        FIELD_TYPE.TIMESTAMP: pa.timestamp("us"),
+    }
+
     # pylint: disable=too-many-arguments
     def __init__(
         self,
@@ -247,6 +322,18 @@ class Oracle(Database):
     Oracle Database
     """
 
+    ARROW_TYPES = {
+        cx_Oracle.DB_TYPE_CHAR: pa.string(),
+        cx_Oracle.DB_TYPE_NCHAR: pa.string(),
+        cx_Oracle.DB_TYPE_VARCHAR: pa.string(),
+        cx_Oracle.DB_TYPE_NVARCHAR: pa.string(),
+        cx_Oracle.DB_TYPE_LONG: pa.string(),
+        cx_Oracle.DB_TYPE_BINARY_FLOAT: pa.float64(),
+        cx_Oracle.DB_TYPE_BINARY_DOUBLE: pa.float64(),
+        cx_Oracle.DB_TYPE_DATE: pa.timestamp("us"),
+        cx_Oracle.DB_TYPE_TIMESTAMP: pa.timestamp("us"),
+    }
+
     # pylint: disable=too-many-arguments
     def __init__(
         self,
@@ -7,6 +7,7 @@ from datetime import timedelta
 from uuid import uuid4
 
 from prefect import Parameter, case
+from prefect.tasks.control_flow import merge
 from prefect.run_configs import KubernetesRun
 from prefect.storage import GCS
 from prefect.tasks.prefect import create_flow_run, wait_for_flow_run
@@ -28,7 +29,9 @@ from pipelines.utils.dump_db.tasks import (
     database_fetch,
     database_get,
     dump_batches_to_file,
+    dump_batches_to_file_parallel,
     format_partitioned_query,
+    format_range_partitioned_queries,
     parse_comma_separated_string_to_list,
 )
 from pipelines.utils.dump_to_gcs.constants import constants as dump_to_gcs_constants
@@ -83,6 +86,25 @@ with Flow(
 
     # Data file parameters
     batch_size = Parameter("batch_size", default=50000, required=False)
+    batch_max_file_size = Parameter(
+        "batch_max_file_size", default=None, required=False
+    )  # in bytes, only for parquet
+    batch_memory_budget = Parameter(
+        "batch_memory_budget", default=None, required=False
+    )  # in bytes, for the batches being processed at the same time
+    batch_transform_workers = Parameter(
+        "batch_transform_workers", default=1, required=False
+    )
+    batch_write_workers = Parameter("batch_write_workers", default=1, required=False)
+
+    # Parallel extraction parameters
+    parallel_concurrency = Parameter("parallel_concurrency", default=1, required=False)
+    parallel_range_column = Parameter(
+        "parallel_range_column", default="", required=False
+    )  # numeric or date column
+    parallel_num_ranges = Parameter(
+        "parallel_num_ranges", default=None, required=False
+    )  # defaults to `parallel_concurrency`
 
     # BigQuery parameters
     dataset_id = Parameter("dataset_id")
@@ -140,41 +162,93 @@ with Flow(
         wait=user,
     )
 
-    # Format partitioned query if required
-    formated_query = format_partitioned_query(
-        query=query,
-        dataset_id=dataset_id,
-        table_id=table_id,
-        database_type=database_type,
-        partition_columns=partition_columns,
-        lower_bound_date=lower_bound_date,
-        date_format=partition_date_format,
-        wait=db_object,
-    )
+    use_parallel_dump = greater_than(parallel_concurrency, 1)
 
-    db_execute = database_execute(  # pylint: disable=invalid-name
-        database=db_object,
-        query=formated_query,
-        wait=formated_query,
-        flow_name="dump_db",
-        labels=current_flow_labels,
-        dataset_id=dataset_id,
-        table_id=table_id,
-    )
+    with case(use_parallel_dump, False):
+        # Format partitioned query if required
+        formated_query = format_partitioned_query(
+            query=query,
+            dataset_id=dataset_id,
+            table_id=table_id,
+            database_type=database_type,
+            partition_columns=partition_columns,
+            lower_bound_date=lower_bound_date,
+            date_format=partition_date_format,
+            wait=db_object,
+        )
 
-    # Dump batches to files
-    batches_path, num_batches = dump_batches_to_file(
-        database=db_object,
-        batch_size=batch_size,
-        prepath=f"data/{uuid4()}/",
-        partition_columns=partition_columns,
-        batch_data_type=batch_data_type,
-        wait=db_execute,
-        flow_name="dump_db",
-        labels=current_flow_labels,
-        dataset_id=dataset_id,
-        table_id=table_id,
-    )
+        db_execute = database_execute(  # pylint: disable=invalid-name
+            database=db_object,
+            query=formated_query,
+            wait=formated_query,
+            flow_name="dump_db",
+            labels=current_flow_labels,
+            dataset_id=dataset_id,
+            table_id=table_id,
+        )
+
+        # Dump batches to files
+        serial_batches_path, serial_num_batches = dump_batches_to_file(
+            database=db_object,
+            batch_size=batch_size,
+            prepath=f"data/{uuid4()}/",
+            partition_columns=partition_columns,
+            batch_data_type=batch_data_type,
+            wait=db_execute,
+            flow_name="dump_db",
+            labels=current_flow_labels,
+            dataset_id=dataset_id,
+            table_id=table_id,
+            max_file_size=batch_max_file_size,
+            memory_budget=batch_memory_budget,
+            transform_workers=batch_transform_workers,
+            write_workers=batch_write_workers,
+        )
+
+    with case(use_parallel_dump, True):
+        # Split the (partitioned, if required) query in ranges
+        range_queries = format_range_partitioned_queries(
+            database=db_object,
+            query=query,
+            dataset_id=dataset_id,
+            table_id=table_id,
+            database_type=database_type,
+            range_column=parallel_range_column,
+            num_ranges=parallel_num_ranges,
+            concurrency=parallel_concurrency,
+            partition_columns=partition_columns,
+            lower_bound_date=lower_bound_date,
+            date_format=partition_date_format,
+            wait=db_object,
+        )
+
+        # Dump ranges to files, each one on its own connection
+        parallel_batches_path, parallel_num_batches = dump_batches_to_file_parallel(
+            database_type=database_type,
+            hostname=hostname,
+            port=port,
+            user=user,
+            password=password,
+            database=database,
+            queries=range_queries,
+            batch_size=batch_size,
+            prepath=f"data/{uuid4()}/",
+            partition_columns=partition_columns,
+            batch_data_type=batch_data_type,
+            concurrency=parallel_concurrency,
+            wait=range_queries,
+            flow_name="dump_db",
+            labels=current_flow_labels,
+            dataset_id=dataset_id,
+            table_id=table_id,
+            max_file_size=batch_max_file_size,
+            memory_budget=batch_memory_budget,
+            transform_workers=batch_transform_workers,
+            write_workers=batch_write_workers,
+        )
+
+    batches_path = merge(serial_batches_path, parallel_batches_path)
+    num_batches = merge(serial_num_batches, parallel_num_batches)
 
     data_exists = greater_than(num_batches, 0)
 
@@ -3,16 +3,15 @@
 """
 General purpose tasks for dumping database data.
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from queue import Empty, Queue
 from pathlib import Path
 from threading import Event, Thread
-from time import sleep, time
-from typing import Dict, List, Union
+from time import time
+from typing import Dict, List, Tuple, Union
 from uuid import uuid4
 
-import basedosdados as bd
-import pandas as pd
+import prefect
 from prefect import task
 
 from pipelines.utils.dump_db.db import (
@@ -21,9 +20,14 @@ from pipelines.utils.dump_db.db import (
     Oracle,
     SqlServer,
 )
+from pipelines.utils.dump_db.constants import constants as dump_db_constants
 from pipelines.utils.dump_db.utils import (
-    extract_last_partition_date,
+    MemoryBoundedQueue,
+    build_filtered_query,
     build_query_new_columns,
+    build_range_filters,
+    get_partition_filter,
+    split_range,
 )
 from pipelines.utils.elasticsearch_metrics.utils import (
     format_document,
@@ -32,12 +36,10 @@ from pipelines.utils.elasticsearch_metrics.utils import (
 from pipelines.utils.utils import (
     batch_to_dataframe,
     dataframe_to_csv,
-    dataframe_to_parquet,
     parse_date_columns,
-    clean_dataframe,
+    ParquetSink,
+    PartitionWriter,
     to_partitions,
-    parser_blobs_to_partition_dict,
-    get_storage_blobs,
     remove_columns_accents,
 )
 from pipelines.constants import constants
@@ -185,59 +187,73 @@ def format_partitioned_query(
     """
     Formats a query for fetching partitioned data.
     """
-    # If no partition column is specified, return the query as is.
-    if not partition_columns or partition_columns[0] == "":
-        log("NO partition column specified. Returning query as is")
-        return query
-
-    partition_column = partition_columns[0]
-
-    # Check if the table already exists in BigQuery.
-    table = bd.Table(dataset_id, table_id)
-
-    # If it doesn't, return the query as is, so we can fetch the whole table.
-    if not table.table_exists("staging"):
-        log("NO tables was found. Returning query as is")
+    partition_filter = get_partition_filter(
+        dataset_id=dataset_id,
+        table_id=table_id,
+        database_type=database_type,
+        partition_columns=partition_columns,
+        lower_bound_date=lower_bound_date,
+        date_format=date_format,
+    )
+    if partition_filter is None:
         return query
+    return build_filtered_query(query, [partition_filter])
 
-    blobs = get_storage_blobs(dataset_id, table_id)
 
-    # extract only partitioned folders
-    storage_partitions_dict = parser_blobs_to_partition_dict(blobs)
-    # get last partition date
-    last_partition_date = extract_last_partition_date(
-        storage_partitions_dict, date_format
+@task(
+    checkpoint=False,
+    max_retries=constants.TASK_MAX_RETRIES.value,
+    retry_delay=timedelta(seconds=constants.TASK_RETRY_DELAY.value),
+)
+def format_range_partitioned_queries(
+    database: Database,
+    query: str,
+    dataset_id: str,
+    table_id: str,
+    database_type: str,
+    range_column: str = None,
+    num_ranges: int = None,
+    concurrency: int = 1,
+    partition_columns: List[str] = None,
+    lower_bound_date: str = None,
+    date_format: str = None,
+    wait=None,  # pylint: disable=unused-argument
+) -> List[str]:
+    """
+    Splits a query in `num_ranges` queries (defaults to `concurrency`) over
+    `range_column`, which must be a numeric or date column. Filters for partitioned
+    data are applied just like in `format_partitioned_query`.
+    """
+    partition_filter = get_partition_filter(
+        dataset_id=dataset_id,
+        table_id=table_id,
+        database_type=database_type,
+        partition_columns=partition_columns,
+        lower_bound_date=lower_bound_date,
+        date_format=date_format,
     )
+    base_filters = [partition_filter] if partition_filter else []
 
-    if lower_bound_date:
-        last_date = min(lower_bound_date, last_partition_date)
-    else:
-        last_date = last_partition_date
-
-    # Using the last partition date, get the partitioned query.
-    # `aux_name` must be unique and start with a letter, for better compatibility with
-    # multiple DBMSs.
-    aux_name = f"a{uuid4().hex}"[:8]
+    num_ranges = int(num_ranges or concurrency or 1)
+    if not range_column or num_ranges <= 1:
+        log("NO range column specified. Fetching with a single query")
+        return [build_filtered_query(query, base_filters)]
 
-    log(
-        f"Partitioned DETECTED: {partition_column}, retuning a NEW QUERY "
-        "with partitioned columns and filters"
+    database.execute_query(
+        build_filtered_query(
+            query, base_filters, select=f"min({range_column}), max({range_column})"
+        )
     )
-    if database_type == "oracle":
+    lower, upper = database.fetch_all()[0]
+    log(f"Range column {range_column} goes from {lower} to {upper}")
 
-        oracle_date_format = "YYYY-MM-DD" if date_format == "%Y-%m-%d" else date_format
-
-        return f"""
-        with {aux_name} as ({query})
-        select * from {aux_name}
-        where {partition_column} >= TO_DATE('{last_date}', '{oracle_date_format}')
-        """
-
-    return f"""
-    with {aux_name} as ({query})
-    select * from {aux_name}
-    where {partition_column} >= '{last_date}'
-    """
+    boundaries = split_range(lower, upper, num_ranges)
+    queries = []
+    for range_filter in build_range_filters(range_column, boundaries, database_type):
+        filters = base_filters + ([range_filter] if range_filter else [])
+        queries.append(build_filtered_query(query, filters))
+    log(f"Split query in {len(queries)} ranges over {range_column}")
+    return queries
 
 
 ###############
@@ -273,25 +289,39 @@ def parse_comma_separated_string_to_list(text: str) -> List[str]:
     return result
 
 
-@task(
-    max_retries=constants.TASK_MAX_RETRIES.value,
-    retry_delay=timedelta(seconds=constants.TASK_RETRY_DELAY.value),
-    nout=2,
-)
-def dump_batches_to_file(  # pylint: disable=too-many-locals,too-many-statements
+def dump_database_to_file(  # pylint: disable=too-many-locals,too-many-statements
     database: Database,
     batch_size: int,
     prepath: Union[str, Path],
     partition_columns: List[str] = None,
     batch_data_type: str = "csv",
-    wait=None,  # pylint: disable=unused-argument
     flow_name: str = None,
     labels: List[str] = None,
     dataset_id: str = None,
     table_id: str = None,
-) -> Path:
+    max_file_size: int = None,
+    file_suffix: str = None,
+    memory_budget: int = None,
+    transform_workers: int = 1,
+    write_workers: int = 1,
+) -> Tuple[Path, int]:
     """
-    Dumps batches of data to FILE.
+    Dumps batches of data from an already executed query to FILE.
+
+    Batches are fetched as Arrow record batches and are only converted to
+    dataframes by the transform worker.
+
+    Parquet batches are appended as row groups to files kept open during the
+    whole dump, which are rolled over to a new file once `max_file_size` bytes
+    are reached (if set).
+
+    If `file_suffix` is set, it's added to every file name, so that multiple dumps
+    can write to the same `prepath` at the same time.
+
+    Fetched batches and parsed dataframes wait for the next stage in queues that
+    hold at most `memory_budget` bytes (half each), so fetching blocks when the
+    transform (`transform_workers` threads) or write (`write_workers` threads, each
+    one with its own files) stages fall behind.
     """
     # Get columns
     columns = database.get_columns()
@@ -314,74 +344,61 @@ def dump_batches_to_file(  # pylint: disable=too-many-locals,too-many-statements
     else:
         log(f"Partition column: {partition_column} FOUND!! Write to partitioned files")
 
-    # Initialize queues
-    batches = Queue()
-    dataframes = Queue()
+    # Initialize queues, bounded by the memory budget
+    memory_budget = memory_budget or dump_db_constants.DUMP_MEMORY_BUDGET_BYTES.value
+    batches = MemoryBoundedQueue(max_bytes=memory_budget // 2)
+    dataframes = MemoryBoundedQueue(max_bytes=memory_budget // 2)
+    failed = Event()
+    errors: List[Exception] = []
+
+    def queues_metrics() -> Dict[str, int]:
+        return {
+            "batches_queue_depth": batches.depth,
+            "batches_queue_bytes": batches.nbytes,
+            "dataframes_queue_depth": dataframes.depth,
+            "dataframes_queue_bytes": dataframes.nbytes,
+        }
 
     # Define thread functions
-    def thread_batch_to_dataframe(
-        batches: Queue,
-        dataframes: Queue,
-        done: Event,
-        columns: List[str],
-        flow_name: str,
-        labels: List[str],
-        dataset_id: str,
-        table_id: str,
-    ):
-        while not done.is_set():
-            try:
-                batch = batches.get(timeout=1)
+    def thread_batch_to_dataframe():
+        try:
+            while True:
+                batch, nbytes = batches.get_until(failed)
+                if batch is None:
+                    break
                 start_time = time()
-                dataframe = batch_to_dataframe(batch, columns)
+                dataframe = batch_to_dataframe(batch, columns, clean=True)
                 elapsed_time = time() - start_time
-                dataframes.put(dataframe)
+                del batch
+                dataframes.put_until((dataframe, nbytes), failed)
                 doc = format_document(
                     flow_name=flow_name,
                     labels=labels,
                     event_type="batch_to_dataframe",
                     dataset_id=dataset_id,
                     table_id=table_id,
-                    metrics={"batch_to_dataframe": elapsed_time},
+                    metrics={"batch_to_dataframe": elapsed_time, **queues_metrics()},
                 )
                 index_document(doc)
-                batches.task_done()
-            except Empty:
-                sleep(1)
-
-    def thread_dataframe_to_csv(
-        dataframes: Queue,
-        done: Event,
-        flow_name: str,
-        labels: List[str],
-        dataset_id: str,
-        table_id: str,
-        partition_column: str,
-        partition_columns: List[str],
-        prepath: Path,
-        batch_data_type: str,
-        eventid: str,
-    ):
-        while not done.is_set():
-            try:
-                # Get dataframe from queue
-                dataframe: pd.DataFrame = dataframes.get(timeout=1)
-                # Clean dataframe
-                start_time = time()
+        except Exception as exc:  # pylint: disable=broad-except
+            errors.append(exc)
+            failed.set()
+
+    def thread_dataframe_to_file(worker_idx: int):
+        partition_writer = partition_writers[worker_idx]
+        parquet_sink = parquet_sinks[worker_idx]
+        parquet_path = prepath / f"{eventid}.parquet"
+        if write_workers > 1:
+            parquet_path = prepath / f"{eventid}-w{worker_idx}.parquet"
+        try:
+            while True:
+                dataframe, _ = dataframes.get_until(failed)
+                if dataframe is None:
+                    break
+                # Dataframes are already cleaned by `batch_to_dataframe`
                 old_columns = dataframe.columns.tolist()
                 dataframe.columns = remove_columns_accents(dataframe)
                 new_columns_dict = dict(zip(old_columns, dataframe.columns.tolist()))
-                dataframe = clean_dataframe(dataframe)
-                elapsed_time = time() - start_time
-                doc = format_document(
-                    flow_name=flow_name,
-                    labels=labels,
-                    event_type="clean_dataframe",
-                    dataset_id=dataset_id,
-                    table_id=table_id,
-                    metrics={"clean_dataframe": elapsed_time},
-                )
-                index_document(doc)
                 # Dump dataframe to file
                 start_time = time()
                 if partition_column:
@@ -396,13 +413,12 @@ def dump_batches_to_file(  # pylint: disable=too-many-locals,too-many-statements
                         partition_columns=partitions,
                         savepath=prepath,
                         data_type=batch_data_type,
+                        partition_writer=partition_writer,
                     )
                 elif batch_data_type == "csv":
                     dataframe_to_csv(dataframe, prepath / f"{eventid}-{uuid4()}.csv")
                 elif batch_data_type == "parquet":
-                    dataframe_to_parquet(
-                        dataframe, prepath / f"{eventid}-{uuid4()}.parquet"
-                    )
+                    parquet_sink.write(dataframe, parquet_path)
                 elapsed_time = time() - start_time
                 doc = format_document(
                     flow_name=flow_name,
@@ -410,70 +426,55 @@ def dump_batches_to_file(  # pylint: disable=too-many-locals,too-many-statements
                     event_type=f"batch_to_{batch_data_type}",
                     dataset_id=dataset_id,
                     table_id=table_id,
-                    metrics={f"batch_to_{batch_data_type}": elapsed_time},
+                    metrics={
+                        f"batch_to_{batch_data_type}": elapsed_time,
+                        **queues_metrics(),
+                    },
                 )
                 index_document(doc)
-                dataframes.task_done()
-            except Empty:
-                sleep(1)
+        except Exception as exc:  # pylint: disable=broad-except
+            errors.append(exc)
+            failed.set()
 
     # Initialize threads
-    done = Event()
     eventid = datetime.now().strftime("%Y%m%d-%H%M%S")
-    worker_batch_to_dataframe = Thread(
-        target=thread_batch_to_dataframe,
-        args=(
-            batches,
-            dataframes,
-            done,
-            columns,
-            flow_name,
-            labels,
-            dataset_id,
-            table_id,
-        ),
-    )
-    worker_dataframe_to_csv = Thread(
-        target=thread_dataframe_to_csv,
-        args=(
-            dataframes,
-            done,
-            flow_name,
-            labels,
-            dataset_id,
-            table_id,
-            partition_column,
-            partition_columns,
-            prepath,
-            batch_data_type,
-            eventid,
-        ),
-    )
-    worker_batch_to_dataframe.start()
-    worker_dataframe_to_csv.start()
+    if file_suffix:
+        eventid = f"{eventid}-{file_suffix}"
+    transform_workers = max(1, int(transform_workers))
+    write_workers = max(1, int(write_workers))
+    # Each writer has its own files, so that no file is written by two threads
+    partition_writers = []
+    for worker_idx in range(write_workers):
+        suffixes = [file_suffix] if file_suffix else []
+        if write_workers > 1:
+            suffixes.append(f"w{worker_idx}")
+        partition_writers.append(
+            PartitionWriter(
+                savepath=prepath,
+                data_type=batch_data_type,
+                suffix="-".join(suffixes) or None,
+                max_file_size=max_file_size,
+            )
+        )
+    parquet_sinks = [
+        ParquetSink(max_file_size=max_file_size) for _ in range(write_workers)
+    ]
+
+    transform_threads = [
+        Thread(target=thread_batch_to_dataframe) for _ in range(transform_workers)
+    ]
+    write_threads = [
+        Thread(target=thread_dataframe_to_file, args=(worker_idx,))
+        for worker_idx in range(write_workers)
+    ]
+    for thread in transform_threads + write_threads:
+        thread.start()
 
     # Dump batches
-    start_fetch_batch = time()
-    batch = database.fetch_batch(batch_size)
-    time_fetch_batch = time() - start_fetch_batch
-    doc = format_document(
-        flow_name=flow_name,
-        labels=labels,
-        event_type="fetch_batch",
-        dataset_id=dataset_id,
-        table_id=table_id,
-        metrics={"fetch_batch": time_fetch_batch},
-    )
-    index_document(doc)
     idx = 0
-    while len(batch) > 0:
-        if idx % 100 == 0:
-            log(f"Dumping batch {idx} with size {len(batch)}")
-        # Add current batch to queue
-        batches.put(batch)
-        # Get next batch
+    try:
         start_fetch_batch = time()
-        batch = database.fetch_batch(batch_size)
+        batch = database.fetch_arrow_batch(batch_size)
         time_fetch_batch = time() - start_fetch_batch
         doc = format_document(
             flow_name=flow_name,
@@ -481,36 +482,210 @@ def dump_batches_to_file(  # pylint: disable=too-many-locals,too-many-statements
             event_type="fetch_batch",
             dataset_id=dataset_id,
             table_id=table_id,
-            metrics={"fetch_batch": time_fetch_batch},
+            metrics={"fetch_batch": time_fetch_batch, **queues_metrics()},
         )
         index_document(doc)
-        idx += 1
-
-    log("Waiting for batches queue...")
-    start_sleep = 1
-    max_sleep = 300
-    while batches.unfinished_tasks > 0:
-        sleep(start_sleep)
-        start_sleep = min(start_sleep * 2, max_sleep)
-        log(
-            f"Waiting for {batches.unfinished_tasks} batches to be parsed as dataframes..."
-        )
-    batches.join()
-    start_sleep = 1
-    log("Waiting for dataframes queue...")
-    while dataframes.unfinished_tasks > 0:
-        sleep(start_sleep)
-        start_sleep = min(start_sleep * 2, max_sleep)
-        log(f"Waiting for {dataframes.unfinished_tasks} dataframes to be dumped...")
-    dataframes.join()
-    done.set()
-
-    log("Waiting for threads to finish...")
-    worker_batch_to_dataframe.join()
-    worker_dataframe_to_csv.join()
+        while len(batch) > 0 and not failed.is_set():
+            if idx % 100 == 0:
+                log(f"Dumping batch {idx} with size {len(batch)}")
+            # Add current batch to queue, waiting if the memory budget is exhausted
+            batches.put_until((batch, batch.nbytes), failed)
+            # Get next batch
+            start_fetch_batch = time()
+            batch = database.fetch_arrow_batch(batch_size)
+            time_fetch_batch = time() - start_fetch_batch
+            doc = format_document(
+                flow_name=flow_name,
+                labels=labels,
+                event_type="fetch_batch",
+                dataset_id=dataset_id,
+                table_id=table_id,
+                metrics={"fetch_batch": time_fetch_batch, **queues_metrics()},
+            )
+            index_document(doc)
+            idx += 1
+
+        # Signal the end of the data to each stage and wait for it to drain
+        log("Waiting for batches to be parsed as dataframes...")
+        for _ in transform_threads:
+            batches.put_until((None, 0), failed)
+        for thread in transform_threads:
+            thread.join()
+        log("Waiting for dataframes to be dumped...")
+        for _ in write_threads:
+            dataframes.put_until((None, 0), failed)
+        for thread in write_threads:
+            thread.join()
+    except BaseException:
+        # Stop every worker before re-raising
+        failed.set()
+        raise
+    finally:
+        for thread in transform_threads + write_threads:
+            thread.join()
+        log("Closing open files...")
+        for partition_writer, parquet_sink in zip(partition_writers, parquet_sinks):
+            partition_writer.close()
+            parquet_sink.close()
+
+    if errors:
+        raise errors[0]
 
     log(
         f"Successfully dumped {idx} batches with size {len(batch)}, total of {idx*batch_size}"
     )
 
     return prepath, idx
+
+
+@task(
+    max_retries=constants.TASK_MAX_RETRIES.value,
+    retry_delay=timedelta(seconds=constants.TASK_RETRY_DELAY.value),
+    nout=2,
+)
+def dump_batches_to_file(
+    database: Database,
+    batch_size: int,
+    prepath: Union[str, Path],
+    partition_columns: List[str] = None,
+    batch_data_type: str = "csv",
+    wait=None,  # pylint: disable=unused-argument
+    flow_name: str = None,
+    labels: List[str] = None,
+    dataset_id: str = None,
+    table_id: str = None,
+    max_file_size: int = None,
+    memory_budget: int = None,
+    transform_workers: int = 1,
+    write_workers: int = 1,
+) -> Path:
+    """
+    Dumps batches of data to FILE.
+    """
+    return dump_database_to_file(
+        database=database,
+        batch_size=batch_size,
+        prepath=prepath,
+        partition_columns=partition_columns,
+        batch_data_type=batch_data_type,
+        flow_name=flow_name,
+        labels=labels,
+        dataset_id=dataset_id,
+        table_id=table_id,
+        max_file_size=max_file_size,
+        memory_budget=memory_budget,
+        transform_workers=transform_workers,
+        write_workers=write_workers,
+    )
+
+
+@task(
+    max_retries=constants.TASK_MAX_RETRIES.value,
+    retry_delay=timedelta(seconds=constants.TASK_RETRY_DELAY.value),
+    nout=2,
+)
+def dump_batches_to_file_parallel(  # pylint: disable=too-many-locals
+    database_type: str,
+    hostname: str,
+    port: int,
+    user: str,
+    password: str,
+    database: str,
+    queries: List[str],
+    batch_size: int,
+    prepath: Union[str, Path],
+    partition_columns: List[str] = None,
+    batch_data_type: str = "csv",
+    concurrency: int = 4,
+    wait=None,  # pylint: disable=unused-argument
+    flow_name: str = None,
+    labels: List[str] = None,
+    dataset_id: str = None,
+    table_id: str = None,
+    max_file_size: int = None,
+    memory_budget: int = None,
+    transform_workers: int = 1,
+    write_workers: int = 1,
+) -> Path:
+    """
+    Dumps the results of multiple queries (usually ranges of the same query, from
+    `format_range_partitioned_queries`) to FILE, running up to `concurrency` of them
+    at the same time, each one on its own database connection. All of them write to
+    the same `prepath` and partition layout. The `memory_budget` is split evenly
+    between the ranges running at the same time.
+    """
+    if database_type not in DATABASE_MAPPING:
+        raise ValueError(f"Unknown database type: {database_type}")
+    prepath = Path(prepath)
+    concurrency = max(1, min(int(concurrency), len(queries)))
+    memory_budget = memory_budget or dump_db_constants.DUMP_MEMORY_BUDGET_BYTES.value
+    log(f"Dumping {len(queries)} ranges with concurrency {concurrency}")
+
+    # Prefect's context is thread local, so it's copied to the workers for logging
+    context = prefect.context.to_dict()
+
+    def dump_range(idx: int, query: str) -> Tuple[int, float]:
+        with prefect.context(**context):
+            return dump_range_in_context(idx, query)
+
+    def dump_range_in_context(idx: int, query: str) -> Tuple[int, float]:
+        start_time = time()
+        range_database = DATABASE_MAPPING[database_type](
+            hostname=hostname,
+            port=port,
+            user=user,
+            password=password,
+            database=database,
+        )
+        log(f"Executing range {idx}: {query}")
+        range_database.execute_query(query)
+        _, range_batches = dump_database_to_file(
+            database=range_database,
+            batch_size=batch_size,
+            prepath=prepath,
+            partition_columns=partition_columns,
+            batch_data_type=batch_data_type,
+            flow_name=flow_name,
+            labels=labels,
+            dataset_id=dataset_id,
+            table_id=table_id,
+            max_file_size=max_file_size,
+            file_suffix=f"range{idx}",
+            memory_budget=memory_budget // concurrency,
+            transform_workers=transform_workers,
+            write_workers=write_workers,
+        )
+        elapsed_time = time() - start_time
+        log(f"Range {idx} dumped {range_batches} batches in {elapsed_time:.2f}s")
+        return range_batches, elapsed_time
+
+    start_time = time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(dump_range, range(len(queries)), queries))
+    wall_time = time() - start_time
+
+    num_batches = sum(range_batches for range_batches, _ in results)
+    ranges_time = sum(elapsed_time for _, elapsed_time in results)
+    # Ranges dumped at the same time slow each other down, so this is not the
+    # speedup over a serial dump, which would take less than `ranges_time`
+    range_time_over_wall_time = ranges_time / wall_time if wall_time > 0 else 1.0
+    log(
+        f"Dumped {num_batches} batches from {len(queries)} ranges in {wall_time:.2f}s "
+        f"(sum of range times: {ranges_time:.2f}s, "
+        f"{range_time_over_wall_time:.2f}x the wall time)"
+    )
+    doc = format_document(
+        flow_name=flow_name,
+        labels=labels,
+        event_type="parallel_dump",
+        dataset_id=dataset_id,
+        table_id=table_id,
+        metrics={
+            "parallel_dump_wall_time": wall_time,
+            "parallel_dump_ranges_time": ranges_time,
+            "parallel_dump_range_time_over_wall_time": range_time_over_wall_time,
+        },
+    )
+    index_document(doc)
+
+    return prepath, num_batches
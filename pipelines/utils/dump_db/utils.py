@@ -3,13 +3,88 @@
 Utilities for the Database Dump flows.
 """
 
-from datetime import datetime, timedelta
-from typing import List, Union
+from collections import deque
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import math
+from queue import Empty, Full, Queue
+from threading import Event
+from typing import Any, List, Tuple, Union
+from uuid import uuid4
 
+import basedosdados as bd
 import pandas as pd
 
 from prefect.schedules.clocks import IntervalClock
-from pipelines.utils.utils import log, query_to_line, remove_columns_accents, is_date
+from pipelines.utils.utils import (
+    get_storage_blobs,
+    is_date,
+    log,
+    parser_blobs_to_partition_dict,
+    query_to_line,
+    remove_columns_accents,
+)
+
+
+class MemoryBoundedQueue(Queue):
+    """
+    Queue bounded by the size in bytes of its items instead of their count.
+
+    Items must be `(item, nbytes)` pairs. `put` blocks while the queue holds
+    `max_bytes` or more, so the queue may go over the budget by one item at most.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__(maxsize=max(1, max_bytes))
+
+    # pylint: disable=attribute-defined-outside-init
+    def _init(self, maxsize: int) -> None:
+        self.queue = deque()
+        self.nbytes = 0
+
+    def _qsize(self) -> int:
+        # Used by `Queue` to check whether it's empty or full
+        return self.nbytes
+
+    def _put(self, item: Tuple[Any, int]) -> None:
+        self.queue.append(item)
+        self.nbytes += max(1, item[1])
+
+    def _get(self) -> Tuple[Any, int]:
+        item = self.queue.popleft()
+        self.nbytes -= max(1, item[1])
+        return item
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of items in the queue.
+        """
+        return len(self.queue)
+
+    def put_until(self, item: Tuple[Any, int], stop: Event) -> bool:
+        """
+        Puts an item in the queue, giving up if `stop` is set while waiting.
+        """
+        while not stop.is_set():
+            try:
+                self.put(item, timeout=1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def get_until(self, stop: Event) -> Tuple[Any, int]:
+        """
+        Gets an item from the queue, returning `(None, 0)` if `stop` is set while
+        waiting.
+        """
+        while not stop.is_set():
+            try:
+                return self.get(timeout=1)
+            except Empty:
+                continue
+        return None, 0
 
 
 def extract_last_partition_date(partitions_dict: dict, date_format: str):
@@ -38,6 +113,134 @@ def extract_last_partition_date(partitions_dict: dict, date_format: str):
     return last_partition_date
 
 
+def get_partition_filter(
+    dataset_id: str,
+    table_id: str,
+    database_type: str,
+    partition_columns: List[str] = None,
+    lower_bound_date: str = None,
+    date_format: str = None,
+) -> Union[str, None]:
+    """
+    Builds the filter for fetching only data newer than the last partition already
+    uploaded to storage. Returns `None` if the whole table must be fetched.
+    """
+    # If no partition column is specified, fetch the whole table.
+    if not partition_columns or partition_columns[0] == "":
+        log("NO partition column specified. Returning query as is")
+        return None
+
+    partition_column = partition_columns[0]
+
+    # Check if the table already exists in BigQuery.
+    table = bd.Table(dataset_id, table_id)
+
+    # If it doesn't, return the query as is, so we can fetch the whole table.
+    if not table.table_exists("staging"):
+        log("NO tables was found. Returning query as is")
+        return None
+
+    blobs = get_storage_blobs(dataset_id, table_id)
+
+    # extract only partitioned folders
+    storage_partitions_dict = parser_blobs_to_partition_dict(blobs)
+    # get last partition date
+    last_partition_date = extract_last_partition_date(
+        storage_partitions_dict, date_format
+    )
+
+    if lower_bound_date:
+        last_date = min(lower_bound_date, last_partition_date)
+    else:
+        last_date = last_partition_date
+
+    log(
+        f"Partitioned DETECTED: {partition_column}, retuning a NEW QUERY "
+        "with partitioned columns and filters"
+    )
+    if database_type == "oracle":
+        oracle_date_format = "YYYY-MM-DD" if date_format == "%Y-%m-%d" else date_format
+        return f"{partition_column} >= TO_DATE('{last_date}', '{oracle_date_format}')"
+    return f"{partition_column} >= '{last_date}'"
+
+
+def build_filtered_query(query: str, filters: List[str], select: str = "*") -> str:
+    """
+    Wraps a query so that only rows matching all `filters` are returned, selecting
+    `select` from them.
+    """
+    if not filters and select == "*":
+        return query
+    # `aux_name` must be unique and start with a letter, for better compatibility with
+    # multiple DBMSs.
+    aux_name = f"a{uuid4().hex}"[:8]
+    where = ""
+    if filters:
+        where = "where " + "\n    and ".join(f"({condition})" for condition in filters)
+    return f"""
+    with {aux_name} as ({query})
+    select {select} from {aux_name}
+    {where}
+    """
+
+
+def format_range_value(value: Any, database_type: str) -> str:
+    """
+    Formats a range boundary as a SQL literal.
+    """
+    if isinstance(value, (datetime, date)):
+        value = value.strftime("%Y-%m-%d %H:%M:%S")
+        if database_type == "oracle":
+            return f"TO_DATE('{value}', 'YYYY-MM-DD HH24:MI:SS')"
+        return f"'{value}'"
+    return str(value)
+
+
+def split_range(lower: Any, upper: Any, num_ranges: int) -> List[Any]:
+    """
+    Splits the `[lower, upper]` interval into `num_ranges` ranges, returning the
+    `num_ranges - 1` inner boundaries. Integers and dates are split on whole
+    values, so boundaries may repeat for small intervals (they are deduplicated).
+    """
+    if num_ranges <= 1 or lower is None or upper is None or lower >= upper:
+        return []
+    if isinstance(lower, (datetime, date)):
+        if not isinstance(lower, datetime):
+            lower = datetime.combine(lower, datetime.min.time())
+            upper = datetime.combine(upper, datetime.min.time())
+        step = (upper - lower) / num_ranges
+        boundaries = [lower + step * i for i in range(1, num_ranges)]
+        boundaries = [boundary.replace(microsecond=0) for boundary in boundaries]
+    elif isinstance(lower, int) or (
+        isinstance(lower, Decimal) and lower == int(lower) and upper == int(upper)
+    ):
+        lower, upper = int(lower), int(upper)
+        step = math.ceil((upper - lower) / num_ranges)
+        boundaries = [lower + step * i for i in range(1, num_ranges)]
+    else:
+        lower, upper = float(lower), float(upper)
+        step = (upper - lower) / num_ranges
+        boundaries = [lower + step * i for i in range(1, num_ranges)]
+    return sorted({boundary for boundary in boundaries if lower < boundary < upper})
+
+
+def build_range_filters(
+    range_column: str, boundaries: List[Any], database_type: str
+) -> List[str]:
+    """
+    Builds one filter per range delimited by `boundaries`. Rows with a null
+    `range_column` go to the first range.
+    """
+    if not boundaries:
+        return [None]
+    literals = [format_range_value(boundary, database_type) for boundary in boundaries]
+    filters = [f"{range_column} < {literals[0]} or {range_column} is null"]
+    for lower, upper in zip(literals[:-1], literals[1:]):
+        filters.append(f"{range_column} >= {lower} and {range_column} < {upper}")
+    filters.append(f"{range_column} >= {literals[-1]}")
+    return filters
+
+
 def build_query_new_columns(table_columns: List[str]) -> List[str]:
     """ "
     Creates the query without accents.
@@ -15,9 +15,9 @@ from googleapiclient.http import MediaIoBaseDownload
 import gspread
 import pandas as pd
 from prefect import task
-import requests
 
 from pipelines.constants import constants
+from pipelines.utils.http_client import get_http_client
 from pipelines.utils.utils import (
     remove_columns_accents,
 )
@@ -25,6 +25,7 @@ from pipelines.utils.dump_url.utils import handle_dataframe_chunk
 from pipelines.utils.utils import (
     get_credentials_from_env,
     log,
+    PartitionWriter,
 )
 
 
@@ -99,7 +100,7 @@ def download_url(  # pylint: disable=too-many-arguments
         dataframe.to_csv(filepath, index=False)
     elif url_type == "direct":
         log(">>>>> URL is not a Google Drive URL, downloading directly")
-        req = requests.get(url, stream=True)
+        req = get_http_client().get(url, stream=True)
         with open(fname, "wb") as file:
             for chunk in req.iter_content(chunk_size=1024):
                 if chunk:
@@ -156,14 +157,21 @@ def dump_files(
     Dump files according to chunk size
     """
     event_id = datetime.now().strftime("%Y%m%d-%H%M%S")
-    for idx, chunk in enumerate(pd.read_csv(Path(file_path), chunksize=chunksize)):
-        log(f"Dumping batch {idx} with size {chunksize}")
-        handle_dataframe_chunk(
-            dataframe=chunk,
-            save_path=save_path,
-            partition_columns=partition_columns,
-            event_id=event_id,
-            idx=idx,
-            build_json_dataframe=build_json_dataframe,
-            dataframe_key_column=dataframe_key_column,
-        )
+    with PartitionWriter(
+        savepath=save_path,
+        data_type="csv",
+        build_json_dataframe=build_json_dataframe,
+        dataframe_key_column=dataframe_key_column,
+    ) as partition_writer:
+        for idx, chunk in enumerate(pd.read_csv(Path(file_path), chunksize=chunksize)):
+            log(f"Dumping batch {idx} with size {chunksize}")
+            handle_dataframe_chunk(
+                dataframe=chunk,
+                save_path=save_path,
+                partition_columns=partition_columns,
+                event_id=event_id,
+                idx=idx,
+                build_json_dataframe=build_json_dataframe,
+                dataframe_key_column=dataframe_key_column,
+                partition_writer=partition_writer,
+            )
@@ -12,6 +12,7 @@ from pipelines.utils.utils import (
     log,
     remove_columns_accents,
     parse_date_columns,
+    PartitionWriter,
     to_partitions,
     clean_dataframe,
     dataframe_to_csv,
@@ -27,9 +28,11 @@ def handle_dataframe_chunk(
     idx: int,
     build_json_dataframe: bool = False,
     dataframe_key_column: str = None,
+    partition_writer: PartitionWriter = None,
 ):
     """
-    Handles a chunk of dataframe.
+    Handles a chunk of dataframe. If `partition_writer` is provided, partitioned
+    chunks are appended through it, keeping partition files open between chunks.
     """
     if not partition_columns or partition_columns[0] == "":
         partition_column = None
@@ -67,6 +70,7 @@ def handle_dataframe_chunk(
             data_type="csv",
             build_json_dataframe=build_json_dataframe,
             dataframe_key_column=dataframe_key_column,
+            partition_writer=partition_writer,
         )
     else:
         dataframe_to_csv(
@@ -2,21 +2,45 @@
 """
 Utilities for handling metrics with Elasticsearch
 """
+import atexit
 import base64
 import json
+from threading import Event, Lock, Thread
+from time import time
 from typing import Any, Dict, List
 
 from elasticsearch import Elasticsearch
+from elasticsearch.helpers import bulk
 import pendulum
+from prefect.utilities.logging import get_logger
 
 from pipelines.utils.utils import get_vault_secret, log
 
+ES_CLIENTS: Dict[str, Elasticsearch] = {}
+ES_CLIENTS_LOCK = Lock()
+
 
 def get_elasticsearch_client(
     es_config_secret_path: str = "elasticsearch-config",
 ) -> Elasticsearch:
     """
-    Get an Elasticsearch client with configuration from Vault
+    Get an Elasticsearch client with configuration from Vault. Clients are cached
+    per secret path for the whole process.
+    """
+    with ES_CLIENTS_LOCK:
+        if es_config_secret_path not in ES_CLIENTS:
+            es_client = build_elasticsearch_client(es_config_secret_path)
+            if not es_client:
+                return None
+            ES_CLIENTS[es_config_secret_path] = es_client
+        return ES_CLIENTS[es_config_secret_path]
+
+
+def build_elasticsearch_client(
+    es_config_secret_path: str = "elasticsearch-config",
+) -> Elasticsearch:
+    """
+    Build a new Elasticsearch client with configuration from Vault
     """
     try:
         es_config: str = get_vault_secret(es_config_secret_path)["data"]["config"]
@@ -54,12 +78,113 @@ def format_document(
     }
 
 
+class MetricsBuffer:
+    """
+    Process-wide buffer of documents to be indexed in Elasticsearch.
+
+    Documents are sent with the bulk API by a background thread, whenever
+    `max_size` documents are buffered or every `flush_interval` seconds, so
+    callers never wait for Elasticsearch. Remaining documents are sent on `flush`,
+    which runs on interpreter shutdown and when flows finish.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 500,
+        flush_interval: float = 10,
+        es_config_secret_path: str = "elasticsearch-config",
+    ) -> None:
+        self._max_size = max_size
+        self._flush_interval = flush_interval
+        self._es_config_secret_path = es_config_secret_path
+        self._documents: List[Dict[str, Any]] = []
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._wake_up = Event()
+        self._thread: Thread = None
+        self._logger = get_logger("elasticsearch_metrics")
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, document: dict, index: str = "prefect-dados-rio") -> None:
+        """
+        Buffers a document to be indexed.
+        """
+        with self._lock:
+            self._documents.append({"_index": index, "_source": document})
+            size = len(self._documents)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+        if size >= self._max_size:
+            self._wake_up.set()
+
+    def _run(self) -> None:
+        """
+        Flushes the buffer periodically or when it's full.
+        """
+        while True:
+            self._wake_up.wait(timeout=self._flush_interval)
+            self._wake_up.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Sends every buffered document to Elasticsearch, returning how many were
+        indexed.
+        """
+        with self._flush_lock:
+            with self._lock:
+                documents, self._documents = self._documents, []
+            if not documents:
+                return 0
+            es_client = get_elasticsearch_client(self._es_config_secret_path)
+            if not es_client:
+                self._logger.error(
+                    f"Impossible to index {len(documents)} documents, "
+                    "no Elasticsearch client available"
+                )
+                return 0
+            start_time = time()
+            try:
+                indexed, _ = bulk(es_client, documents, raise_on_error=False)
+            except Exception as exc:  # pylint: disable=broad-except
+                self._logger.error(f"Failed to index documents: {exc}")
+                return 0
+            self._logger.debug(
+                f"Indexed {indexed} documents in {time() - start_time:.2f}s"
+            )
+            return indexed
+
+
+METRICS_BUFFER = MetricsBuffer()
+atexit.register(METRICS_BUFFER.flush)
+
+
+def flush_metrics_on_finish(obj, old_state, new_state):  # pylint: disable=W0613
+    """
+    State handler that flushes the metrics buffer when a flow finishes.
+    """
+    if new_state.is_finished():
+        METRICS_BUFFER.flush()
+    return new_state
+
+
 def index_document(
-    document: dict, es_client: Elasticsearch = None, index: str = "prefect-dados-rio"
+    document: dict,
+    es_client: Elasticsearch = None,
+    index: str = "prefect-dados-rio",
+    buffered: bool = True,
 ) -> dict:
     """
-    Indexes a document in Elasticsearch
+    Indexes a document in Elasticsearch. Unless an `es_client` is provided or
+    `buffered` is `False`, the document is only added to the process-wide
+    `METRICS_BUFFER`, which is sent in bulk in the background.
     """
+    if not es_client and buffered:
+        METRICS_BUFFER.add(document, index=index)
+        return document
     if not es_client:
         es_client = get_elasticsearch_client()
     if not es_client:
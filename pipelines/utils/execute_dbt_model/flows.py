@@ -49,6 +49,7 @@ with Flow(
         "dbt_model_secret_parameters", default={}, required=False
     )
     dbt_alias = Parameter("dbt_alias", default=False, required=False)
+    stream_logs = Parameter("stream_logs", default=True, required=False)
 
     #####################################
     #
@@ -85,6 +86,7 @@ with Flow(
         flags=flags,
         _vars=model_parameters,
         sync=True,
+        stream_logs=stream_logs,
     )
 
     with case(materialize_to_datario, True):
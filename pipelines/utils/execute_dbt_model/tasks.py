@@ -12,7 +12,10 @@ from prefect import task
 
 from pipelines.utils.execute_dbt_model.utils import (
     get_dbt_client,
+    get_model_timings,
     parse_dbt_logs,
+    record_model_timings,
+    stream_dbt_command,
 )
 from pipelines.constants import constants
 from pipelines.utils.utils import get_vault_secret, log
@@ -54,11 +57,21 @@ def run_dbt_model(
     flags: str = None,
     _vars: Union[dict, List[Dict]] = None,
     sync: bool = True,
+    stream_logs: bool = False,
+    poll_interval: float = 5,
+    regression_factor: float = 1.5,
     wait=None,
 ):
     """
     Run a DBT model.
 
+    With `stream_logs`, the command runs asynchronously and its logs are shown
+    while it runs. The execution time and bytes processed of every model are
+    then indexed in Elasticsearch (event type `dbt_model_timing`) and compared
+    with the previous runs of the model, logging a warning for models that took
+    more than `regression_factor` times their usual time. Runs with
+    `--full-refresh` in `flags` are left out of that comparison.
+
     Args:
         dbt_client (DbtClient): DBT client.
         dataset_id (str): Dataset ID of the dbt model.
@@ -76,6 +89,12 @@ def run_dbt_model(
         _vars (Union[dict, List[Dict]], optional): Variables to pass to
         dbt. Defaults to None.
         sync (bool, optional): Whether to run the command synchronously.
+        Ignored if `stream_logs` is True.
+        stream_logs (bool, optional): Whether to stream the logs and capture
+        the timings of the models. Defaults to False.
+        poll_interval (float, optional): Seconds between polls of the logs.
+        regression_factor (float, optional): Slowdown, relative to the median
+        of the previous runs, from which a model is flagged as a regression.
     """
 
     # Set models and upstream/downstream for dbt
@@ -115,6 +134,21 @@ def run_dbt_model(
         run_command += f" {flags}"
 
     log(f"Will run the following command:\n{run_command}")
+    if stream_logs:
+        response = stream_dbt_command(
+            dbt_client,
+            run_command,
+            poll_interval=poll_interval,
+            log_queries=True,
+        )
+        record_model_timings(
+            get_model_timings(response),
+            dataset_id=dataset_id,
+            regression_factor=regression_factor,
+            use_baseline="--full-refresh" not in (flags or ""),
+        )
+        return log("Finished running dbt model")
+
     logs_dict = dbt_client.cli(
         run_command,
         sync=sync,
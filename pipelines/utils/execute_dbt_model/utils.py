@@ -3,12 +3,20 @@
 General utilities for interacting with dbt-rpc
 """
 from datetime import timedelta, datetime
-from typing import List
+import json
+from statistics import median
+from time import sleep
+from typing import Any, Callable, Dict, List
 
 from dbt_client import DbtClient
+import prefect
 from prefect.schedules.clocks import IntervalClock
 
-from pipelines.utils.utils import log
+from pipelines.utils.elasticsearch_metrics.utils import (
+    format_document,
+    index_document,
+)
+from pipelines.utils.utils import get_redis_client, log
 
 
 def get_dbt_client(
@@ -78,3 +86,220 @@ def parse_dbt_logs(logs_dict: dict, log_queries: bool = False):
         if event["levelname"] == "DEBUG" and log_queries:
             if "On model" in event["message"]:
                 log(event["message"])
+
+
+def stream_dbt_command(
+    dbt_client: DbtClient,
+    command: str,
+    poll_interval: float = 5,
+    log_queries: bool = False,
+    wait: Callable[[float], None] = sleep,
+) -> dict:
+    """
+    Runs a dbt command asynchronously, polling the RPC server every
+    `poll_interval` seconds and logging the new log events as they arrive.
+
+    Like a synchronous `DbtClient.cli`, raises if the server returns an error, if
+    the command doesn't finish successfully or if it has no results.
+
+    Returns:
+        The last poll response, with the state, logs and results of the command.
+    """
+    response = check_dbt_error(dbt_client.cli(command, sync=False))
+    request_token = response["result"]["request_token"]
+    logs_start = 0
+    while True:
+        response = check_dbt_error(
+            dbt_client.poll(
+                request_token=request_token, logs=True, logs_start=logs_start
+            )
+        )
+        events = response["result"].get("logs") or []
+        parse_dbt_logs({"result": {"logs": events}}, log_queries=log_queries)
+        logs_start += len(events)
+        state = response["result"].get("state")
+        if state != "running":
+            break
+        wait(poll_interval)
+    if state != "success":
+        raise Exception(f"dbt command `{command}` finished with state {state!r}")
+    if not response["result"].get("results"):
+        raise Exception(f"dbt command `{command}` returned no results")
+    return response
+
+
+def check_dbt_error(response: dict) -> dict:
+    """
+    Raises if a response of the dbt RPC server is an error, otherwise returns it.
+    """
+    if "error" in response:
+        raise Exception(f"dbt RPC server returned an error: {response['error']}")
+    return response
+
+
+def get_model_timings(response: dict) -> List[Dict[str, Any]]:
+    """
+    Extracts one timing record per model from the response of a `dbt run`, with
+    its status, execution time, bytes processed and rows affected.
+    """
+    timings = []
+    for result in response["result"].get("results") or []:
+        node = result.get("node") or {}
+        adapter_response = result.get("adapter_response") or {}
+        execute = {}
+        for step in result.get("timing") or []:
+            if step.get("name") == "execute":
+                execute = step
+        timings.append(
+            {
+                "unique_id": node.get("unique_id") or result.get("unique_id"),
+                "model": node.get("name"),
+                "schema": node.get("schema"),
+                "materialized": (node.get("config") or {}).get("materialized"),
+                "status": result.get("status"),
+                "execution_time": result.get("execution_time"),
+                "bytes_processed": adapter_response.get("bytes_processed"),
+                "rows_affected": adapter_response.get("rows_affected"),
+                "started_at": execute.get("started_at"),
+                "completed_at": execute.get("completed_at"),
+            }
+        )
+    return timings
+
+
+class DbtTimingBaseline:
+    """
+    Rolling baseline of the execution times of dbt models, kept on Redis as a
+    list with the last `size` timing records of each model.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        prefix: str = "dbt_timings",
+        size: int = 20,
+    ):
+        self.redis_client = redis_client or get_redis_client()
+        self.prefix = prefix
+        self.size = size
+
+    def _key(self, unique_id: str) -> str:
+        return f"{self.prefix}.{unique_id}"
+
+    def history(self, unique_id: str) -> List[Dict[str, Any]]:
+        """
+        Returns the last timing records of a model, most recent first.
+        """
+        return [
+            json.loads(value)
+            for value in self.redis_client.lrange(self._key(unique_id), 0, -1)
+        ]
+
+    def check(
+        self,
+        timing: Dict[str, Any],
+        factor: float = 1.5,
+        min_runs: int = 3,
+    ) -> Dict[str, Any]:
+        """
+        Compares a timing record with the median of the previous successful runs
+        of the model. The run is a regression if it took more than `factor` times
+        the median, once there are at least `min_runs` runs on the baseline.
+
+        Returns:
+            The timing record with the keys `baseline_runs`,
+            `baseline_execution_time`, `baseline_bytes_processed` and `regression`.
+        """
+        history = [
+            record
+            for record in self.history(timing["unique_id"])
+            if record.get("status") == "success"
+        ]
+        times = [
+            record["execution_time"]
+            for record in history
+            if record.get("execution_time") is not None
+        ]
+        sizes = [
+            record["bytes_processed"]
+            for record in history
+            if record.get("bytes_processed") is not None
+        ]
+        baseline_time = median(times) if times else None
+        regression = (
+            len(times) >= min_runs
+            and timing.get("execution_time") is not None
+            and baseline_time > 0
+            and timing["execution_time"] > factor * baseline_time
+        )
+        return {
+            **timing,
+            "baseline_runs": len(times),
+            "baseline_execution_time": baseline_time,
+            "baseline_bytes_processed": median(sizes) if sizes else None,
+            "regression": regression,
+        }
+
+    def add(self, timing: Dict[str, Any]) -> None:
+        """
+        Adds a timing record to the baseline of its model, dropping the oldest
+        records beyond `size`.
+        """
+        record = {
+            key: timing.get(key)
+            for key in ("status", "execution_time", "bytes_processed", "completed_at")
+        }
+        key = self._key(timing["unique_id"])
+        pipeline = self.redis_client.pipeline()
+        pipeline.lpush(key, json.dumps(record, default=str))
+        pipeline.ltrim(key, 0, self.size - 1)
+        pipeline.execute()
+
+
+def record_model_timings(
+    timings: List[Dict[str, Any]],
+    dataset_id: str = None,
+    regression_factor: float = 1.5,
+    use_baseline: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Compares the timings of a dbt run with the baseline of each model, updates
+    the baseline and indexes the timings in Elasticsearch. Without
+    `use_baseline` (ie on full refreshes, much slower than the usual runs), the
+    timings are only indexed.
+    """
+    try:
+        if use_baseline:
+            baseline = DbtTimingBaseline()
+            timings = [
+                baseline.check(timing, factor=regression_factor) for timing in timings
+            ]
+            for timing in timings:
+                baseline.add(timing)
+    except Exception as exc:  # pylint: disable=broad-except
+        log(f"Failed to compare dbt timings with the baseline: {exc}", "warning")
+
+    flow_name = prefect.context.get("flow_name")
+    for timing in timings:
+        seconds = timing["execution_time"] or 0
+        log(
+            f"Model {timing['unique_id']}: {timing['status']} in {seconds:.1f}s, "
+            f"{timing['bytes_processed']} bytes processed"
+        )
+        if timing.get("regression"):
+            log(
+                f"Model {timing['unique_id']} took {seconds:.1f}s, more than "
+                f"{regression_factor}x its median of {timing['baseline_runs']} "
+                f"runs ({timing['baseline_execution_time']:.1f}s)",
+                "warning",
+            )
+        index_document(
+            format_document(
+                flow_name=flow_name,
+                event_type="dbt_model_timing",
+                dataset_id=dataset_id,
+                table_id=timing["model"],
+                metrics=timing,
+            )
+        )
+    return timings
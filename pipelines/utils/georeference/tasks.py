@@ -9,13 +9,16 @@ from typing import List, Tuple
 from uuid import uuid4
 
 import basedosdados as bd
-from geopy.extra.rate_limiter import RateLimiter
 from geopy.geocoders import Nominatim
 from geopy.location import Location
 import pandas as pd
 from prefect import task
 
-from pipelines.utils.georeference.utils import check_if_belongs_to_rio
+from pipelines.utils.georeference.utils import (
+    filter_points_in_rio,
+    geocode_addresses,
+    GeocodingCache,
+)
 from pipelines.utils.utils import log
 
 
@@ -92,10 +95,15 @@ def get_new_addresses(  # pylint: disable=too-many-arguments, too-many-locals
 
 @task
 def georeference_dataframe(
-    new_addresses: pd.DataFrame, log_divider: int = 60
+    new_addresses: pd.DataFrame,
+    log_divider: int = 60,
+    max_workers: int = 2,
+    requests_per_second: float = 1,
 ) -> pd.DataFrame:
     """
-    Georeference all addresses in a dataframe
+    Georeference all addresses in a dataframe. Results are cached on Redis and
+    addresses are geocoded by `max_workers` threads, within the Nominatim limit
+    of `requests_per_second`.
     """
     start_time = time()
 
@@ -103,34 +111,29 @@ def georeference_dataframe(
     all_addresses = [f"{address}, Rio de Janeiro" for address in all_addresses]
 
     geolocator = Nominatim(user_agent="prefeitura-rio")
-    geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1)
+
+    def geocode(address: str) -> List[float]:
+        location: Location = geolocator.geocode(address)
+        if location is None:
+            return None
+        return [location.latitude, location.longitude]
 
     log(f"There are {len(all_addresses)} addresses to georeference")
 
-    locations: List[Location] = []
-    for i, address in enumerate(all_addresses):
-        if i % log_divider == 0:
-            log(f"Georeferencing address {i} of {len(all_addresses)}...")
-        location = geocode(address)
-        locations.append(location)
-
-    geolocated_addresses = [
-        {
-            "latitude": location.latitude,
-            "longitude": location.longitude,
-        }
-        if location is not None
-        else {"latitude": None, "longitude": None}
-        for location in locations
-    ]
-
-    output = pd.DataFrame(geolocated_addresses)
-    output["address"] = new_addresses["address"]
-    output[["latitude", "longitude"]] = output.apply(
-        lambda x: check_if_belongs_to_rio(x.latitude, x.longitude),
-        axis=1,
-        result_type="expand",
+    locations, stats = geocode_addresses(
+        all_addresses,
+        geocode=geocode,
+        provider="nominatim",
+        rate=requests_per_second,
+        max_workers=max_workers,
+        cache=GeocodingCache(),
+        log_divider=log_divider,
     )
+    log(f"Geocoding stats: {stats}")
+
+    output = pd.DataFrame(locations, columns=["latitude", "longitude"])
+    output["address"] = new_addresses["address"]
+    output = filter_points_in_rio(output, "latitude", "longitude")
 
     log(f"--- {(time() - start_time)} seconds ---")
 
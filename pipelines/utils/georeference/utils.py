@@ -3,31 +3,369 @@
 Helper functions for georeferencing
 """
 
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+from pathlib import Path
+import re
+from threading import Lock
+from time import monotonic, sleep
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import unicodedata
+
 from geobr import read_municipality
-from shapely.geometry import Point
+import numpy as np
+import pandas as pd
+from shapely import wkb
+from shapely.geometry.base import BaseGeometry
 
+try:
+    from shapely import contains_xy, prepare
+except ImportError:  # shapely < 2.0
+    from shapely.prepared import prep as prepare
+    from shapely.vectorized import contains as contains_xy
 
-def check_if_belongs_to_rio(lat: float, long: float) -> list:
+from pipelines.utils.utils import get_redis_client, log
+
+RIO_CODE_MUNI = 3304557
+RIO_YEAR = 2020
+GEOMETRY_CACHE_DIR = Path("/tmp/pipelines/geobr")
+
+# Expansions applied to each word of an address by `normalize_address`
+ADDRESS_ABBREVIATIONS = {
+    "r": "rua",
+    "av": "avenida",
+    "avn": "avenida",
+    "estr": "estrada",
+    "est": "estrada",
+    "pca": "praca",
+    "pc": "praca",
+    "tv": "travessa",
+    "trav": "travessa",
+    "al": "alameda",
+    "lgo": "largo",
+    "lg": "largo",
+    "rod": "rodovia",
+    "ld": "ladeira",
+    "pres": "presidente",
+    "dr": "doutor",
+    "sta": "santa",
+    "sto": "santo",
+}
+# Trailing parts of an address that don't tell addresses of the city apart
+ADDRESS_SUFFIXES = {"rio de janeiro", "rj", "brasil", "brazil", "rio de janeiro rj"}
+
+# Municipality geometries (prepared) and bounding boxes already loaded
+MUNICIPALITY_GEOMETRIES: Dict[tuple, Tuple[BaseGeometry, Tuple[float, ...]]] = {}
+
+
+def get_municipality_geometry(
+    code_muni: int = RIO_CODE_MUNI,
+    year: int = RIO_YEAR,
+    cache_dir: Union[str, Path] = GEOMETRY_CACHE_DIR,
+) -> BaseGeometry:
     """
-    Verifica se o lat/long retornado pela API do Waze pertence ao geometry
-    da cidade do Rio de Janeiro. Se pertencer retorna o lat, lon, se não retorna None.
+    Geometria de um município do `geobr`. A geometria é salva em disco (WKB) na
+    primeira vez, de forma que as próximas execuções não precisam baixá-la.
+    """
+    cache_file = Path(cache_dir) / f"municipio_{code_muni}_{year}.wkb"
+    if cache_file.exists():
+        return wkb.loads(cache_file.read_bytes())
+
+    municipality = read_municipality(code_muni=code_muni, year=year)
+    geometry = municipality.geometry.unary_union
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(".tmp")
+    tmp_file.write_bytes(geometry.wkb)
+    tmp_file.replace(cache_file)
+    return geometry
+
+
+def get_prepared_municipality_geometry(
+    code_muni: int = RIO_CODE_MUNI, year: int = RIO_YEAR
+) -> Tuple[BaseGeometry, Tuple[float, ...]]:
+    """
+    Geometria preparada de um município e seu bounding box (minx, miny, maxx,
+    maxy), carregada uma vez por processo.
+    """
+    key = (code_muni, year)
+    if key not in MUNICIPALITY_GEOMETRIES:
+        geometry = get_municipality_geometry(code_muni=code_muni, year=year)
+        bounds = geometry.bounds
+        prepared = prepare(geometry)
+        # shapely 2 prepares the geometry in place and returns None
+        if prepared is None:
+            prepared = geometry
+        MUNICIPALITY_GEOMETRIES[key] = (prepared, bounds)
+    return MUNICIPALITY_GEOMETRIES[key]
+
+
+def points_belong_to_rio(latitudes, longitudes) -> np.ndarray:
     """
+    Verifica, de uma vez, quais pontos pertencem ao geometry da cidade do Rio de
+    Janeiro. Pontos fora do bounding box da cidade ou sem coordenadas são
+    descartados antes do teste com o polígono.
+    """
+    latitudes = pd.to_numeric(pd.Series(latitudes), errors="coerce").to_numpy(
+        dtype=float
+    )
+    longitudes = pd.to_numeric(pd.Series(longitudes), errors="coerce").to_numpy(
+        dtype=float
+    )
+    geometry, (minx, miny, maxx, maxy) = get_prepared_municipality_geometry()
 
-    # Acessa dados da cidade do Rio de Janeiro
-    rio = read_municipality(code_muni=3304557, year=2020)
+    # Bounding box prefilter (comparisons with NaN are False)
+    candidates = (
+        (longitudes >= minx)
+        & (longitudes <= maxx)
+        & (latitudes >= miny)
+        & (latitudes <= maxy)
+    )
+    belongs = np.zeros(len(latitudes), dtype=bool)
+    if candidates.any():
+        belongs[candidates] = contains_xy(
+            geometry, longitudes[candidates], latitudes[candidates]
+        )
+    return belongs
 
-    # Cria point com a latitude e longitude
-    point = Point(long, lat)
 
-    # Cria polígono com o geometry do Rio de Janeiro
-    polygon = rio.geometry
+def filter_points_in_rio(
+    dataframe: pd.DataFrame,
+    latitude_column: str = "latitude",
+    longitude_column: str = "longitude",
+) -> pd.DataFrame:
+    """
+    Apaga a latitude e a longitude dos pontos que não pertencem à cidade do Rio
+    de Janeiro.
+    """
+    dataframe = dataframe.copy()
+    belongs = points_belong_to_rio(
+        dataframe[latitude_column], dataframe[longitude_column]
+    )
+    for column in (latitude_column, longitude_column):
+        dataframe[column] = dataframe[column].where(belongs)
+    return dataframe
 
-    # Use polygon.contains(point) to test if point is inside (True) or outside (False) the polygon.
-    pertence = polygon.contains(point)
 
-    # Se pertence retorna lat, lon. Do contrário retorna nan
-    if pertence.iloc[0]:
+def check_if_belongs_to_rio(lat: float, long: float) -> list:
+    """
+    Verifica se o lat/long retornado pela API do Waze pertence ao geometry
+    da cidade do Rio de Janeiro. Se pertencer retorna o lat, lon, se não retorna None.
+    Para vários pontos, prefira `filter_points_in_rio`.
+    """
+    if points_belong_to_rio([lat], [long])[0]:
         lat_lon = [lat, long]
     else:
         lat_lon = [None, None]
     return lat_lon
+
+
+def normalize_address(address: str) -> str:
+    """
+    Normaliza um endereço para ser usado como chave de cache: remove acentos,
+    pontuação e espaços repetidos, expande abreviações comuns e remove o sufixo
+    de cidade/estado/país, de forma que variações do mesmo endereço se juntem.
+    """
+    if address is None:
+        return ""
+    address = unicodedata.normalize("NFKD", str(address))
+    address = "".join(char for char in address if not unicodedata.combining(char))
+    address = re.sub(r"[^\w\s,]", " ", address.lower())
+    words = [ADDRESS_ABBREVIATIONS.get(word, word) for word in address.split()]
+    parts = [part.strip() for part in " ".join(words).split(",")]
+    while parts and (not parts[-1] or parts[-1] in ADDRESS_SUFFIXES):
+        parts.pop()
+    return ", ".join(part for part in parts if part)
+
+
+class TokenBucket:
+    """
+    Limita a taxa de chamadas a `rate` por segundo, permitindo rajadas de até
+    `capacity` chamadas. Pode ser compartilhado entre threads.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = monotonic()
+        self._lock = Lock()
+
+    def acquire(self) -> None:
+        """
+        Espera até que haja uma ficha disponível e a consome.
+        """
+        while True:
+            with self._lock:
+                now = monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            sleep(wait)
+
+
+# One rate limiter per geocoding provider, shared by every worker of the process
+RATE_LIMITERS: Dict[str, TokenBucket] = {}
+RATE_LIMITERS_LOCK = Lock()
+
+
+def get_rate_limiter(provider: str, rate: float, capacity: float = 1) -> TokenBucket:
+    """
+    Retorna o limitador de taxa do provedor, criando-o se necessário.
+    """
+    with RATE_LIMITERS_LOCK:
+        if provider not in RATE_LIMITERS:
+            RATE_LIMITERS[provider] = TokenBucket(rate=rate, capacity=capacity)
+        return RATE_LIMITERS[provider]
+
+
+class GeocodingCache:
+    """
+    Cache persistente de geocodificação no Redis, com chave pelo provedor e pelo
+    endereço normalizado. Resultados expiram depois de `ttl` segundos e endereços
+    não encontrados depois de `negative_ttl`, para serem tentados de novo.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        prefix: str = "georeference:geocoding",
+        ttl: int = 90 * 24 * 60 * 60,
+        negative_ttl: int = 7 * 24 * 60 * 60,
+    ):
+        self.redis_client = redis_client or get_redis_client()
+        self.prefix = prefix
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    def build_key(self, provider: str, address: str) -> str:
+        """
+        Chave do Redis para um endereço já normalizado.
+        """
+        digest = hashlib.sha1(address.encode("utf-8")).hexdigest()
+        return f"{self.prefix}:{provider}:{digest}"
+
+    def get_many(self, provider: str, addresses: List[str]) -> Dict[str, list]:
+        """
+        Busca vários endereços normalizados de uma vez. Retorna somente os que estão
+        no cache, com o [lat, long] salvo ([None, None] se não foi encontrado).
+        """
+        if not addresses:
+            return {}
+        pipeline = self.redis_client.pipeline()
+        for address in addresses:
+            pipeline.get(self.build_key(provider, address))
+        values = pipeline.execute()
+        return {
+            address: json.loads(value)
+            for address, value in zip(addresses, values)
+            if value is not None
+        }
+
+    def set_many(self, provider: str, results: Dict[str, list]) -> None:
+        """
+        Salva vários resultados ([lat, long] por endereço normalizado) de uma vez.
+        Resultados None (falhas ao geocodificar) não são salvos, para que o endereço
+        seja tentado de novo na próxima execução.
+        """
+        results = {
+            address: lat_lon
+            for address, lat_lon in results.items()
+            if lat_lon is not None
+        }
+        if not results:
+            return
+        pipeline = self.redis_client.pipeline()
+        for address, lat_lon in results.items():
+            found = lat_lon[0] is not None and lat_lon[1] is not None
+            pipeline.set(
+                self.build_key(provider, address),
+                json.dumps(lat_lon),
+                ex=self.ttl if found else self.negative_ttl,
+            )
+        pipeline.execute()
+
+
+def geocode_addresses(  # pylint: disable=too-many-arguments, too-many-locals
+    addresses: List[str],
+    geocode: Callable[[str], list],
+    provider: str,
+    rate: float = 1,
+    max_workers: int = 1,
+    cache: GeocodingCache = None,
+    log_divider: int = 60,
+) -> Tuple[List[list], Dict[str, float]]:
+    """
+    Geocodifica uma lista de endereços, retornando um [lat, long] por endereço
+    ([None, None] se não encontrado) e estatísticas da execução.
+
+    Os endereços são normalizados e deduplicados, os já conhecidos vêm do cache e os
+    demais são resolvidos por `geocode` em `max_workers` threads, todas sujeitas ao
+    limite de `rate` chamadas por segundo do provedor. `geocode` recebe o endereço
+    original (o primeiro de cada grupo normalizado) e retorna [lat, long] ou None,
+    se não encontrado. Endereços cuja chamada a `geocode` falha retornam
+    [None, None], mas não são salvos no cache.
+    """
+    start_time = monotonic()
+    normalized = [normalize_address(address) for address in addresses]
+    originals: Dict[str, str] = {}
+    for address, key in zip(addresses, normalized):
+        originals.setdefault(key, address)
+
+    results = cache.get_many(provider, list(originals)) if cache else {}
+    missing = [key for key in originals if key not in results]
+    log(
+        f"{provider}: {len(addresses)} addresses, {len(originals)} unique, "
+        f"{len(originals) - len(missing)} from cache, {len(missing)} to geocode"
+    )
+
+    rate_limiter = get_rate_limiter(provider, rate)
+    counter = {"done": 0}
+    counter_lock = Lock()
+
+    def resolve(key: str) -> Optional[list]:
+        """
+        Retorna [lat, long], [None, None] se não encontrado ou None se falhou.
+        """
+        rate_limiter.acquire()
+        try:
+            lat_lon = geocode(originals[key])
+        except Exception as exc:  # pylint: disable=broad-except
+            log(f"{provider}: failed to geocode {originals[key]}: {exc}", "warning")
+            return None
+        finally:
+            with counter_lock:
+                counter["done"] += 1
+                if counter["done"] % log_divider == 0:
+                    log(f"{provider}: geocoded {counter['done']} of {len(missing)}...")
+        return list(lat_lon) if lat_lon is not None else [None, None]
+
+    new_results = {}
+    if missing:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            new_results = dict(zip(missing, executor.map(resolve, missing)))
+        if cache:
+            cache.set_many(provider, new_results)
+    failed = [key for key, lat_lon in new_results.items() if lat_lon is None]
+    results.update(new_results)
+    results.update({key: [None, None] for key in failed})
+
+    elapsed_time = monotonic() - start_time
+    stats = {
+        "addresses": len(addresses),
+        "unique_addresses": len(originals),
+        "cache_hits": len(originals) - len(missing),
+        "cache_hit_rate": (len(originals) - len(missing)) / len(originals)
+        if originals
+        else 0.0,
+        "geocoded": len(missing),
+        "failed": len(failed),
+        "elapsed_time": elapsed_time,
+        "addresses_per_second": len(addresses) / elapsed_time if elapsed_time else 0.0,
+    }
+    return [results[key] for key in normalized], stats
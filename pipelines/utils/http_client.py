@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Shared HTTP client for pipelines that make many requests to the same hosts.
+
+The client keeps one `requests.Session` per configuration, so connections to a
+host are kept alive and reused (one urllib3 pool per host), instead of a new
+TCP/TLS handshake on every `requests.get`. It also retries with backoff, reads
+headers from the Vault secret cache and supports conditional requests (ETag and
+If-Modified-Since), skipping payloads that did not change since the last request.
+"""
+
+from hashlib import sha1
+import json
+from threading import Lock
+from typing import Any, Dict, Iterable, MutableMapping
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+
+from pipelines.utils.utils import get_vault_secret, log
+
+# Clients already created on this process, by configuration
+HTTP_CLIENTS: Dict[tuple, "HTTPClient"] = {}
+HTTP_CLIENTS_LOCK = Lock()
+
+
+class RedisValidatorStore:
+    """
+    Keeps the validators (ETag, Last-Modified) of conditional requests on Redis,
+    so that they are shared between flow runs. Has the `get` and `__setitem__`
+    methods used by `HTTPClient`.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        prefix: str = "http_validators",
+        ttl: int = 60 * 60 * 24,
+    ):
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, url: str) -> str:
+        return f"{self.prefix}.{sha1(url.encode('utf-8')).hexdigest()}"
+
+    def get(self, url: str, default: dict = None) -> dict:
+        """
+        Returns the validators of `url`, if any.
+        """
+        value = self.redis_client.get(self._key(url))
+        if value is None:
+            return default
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        return json.loads(value) if isinstance(value, str) else value
+
+    def __setitem__(self, url: str, validators: dict) -> None:
+        self.redis_client.set(self._key(url), json.dumps(validators), ex=self.ttl)
+
+
+class HTTPClient:
+    """
+    HTTP client with keep-alive connection pools, retries with backoff, cached
+    Vault headers and conditional requests. Thread safe: a single client can be
+    shared by the workers of a thread pool.
+
+    Counters of requests, connections opened and reused, payloads not modified
+    and bytes received and saved are available on `stats`.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        pool_maxsize: int = 10,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        status_forcelist: Iterable[int] = (429, 502, 503, 504),
+        timeout: float = 60,
+        headers_ttl: float = 300,
+    ):
+        """
+        Args:
+            pool_maxsize (int, optional): Connections kept alive per host. Should be
+            at least the number of threads sharing the client.
+            max_retries (int, optional): Retries of connection errors and of
+            responses with a status in `status_forcelist`.
+            backoff_factor (float, optional): Backoff factor between retries.
+            status_forcelist (Iterable[int], optional): Status codes to retry.
+            timeout (float, optional): Default timeout of the requests, in seconds.
+            headers_ttl (float, optional): Seconds to keep the headers read from
+            Vault.
+        """
+        self.timeout = timeout
+        self.headers_ttl = headers_ttl
+        self.session = requests.Session()
+        retries = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=tuple(status_forcelist or ()),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_maxsize,
+            pool_maxsize=pool_maxsize,
+            max_retries=retries,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.validators: Dict[str, dict] = {}
+        self._pools = set()
+        self._counters = {
+            "requests": 0,
+            "not_modified": 0,
+            "bytes_received": 0,
+            "bytes_saved": 0,
+        }
+        self._lock = Lock()
+
+    def get_secret_headers(self, secret_path: str) -> dict:
+        """
+        Returns the data of a Vault secret to be used as headers, reading it from
+        Vault at most once every `headers_ttl` seconds.
+        """
+        return get_vault_secret(secret_path, ttl=self.headers_ttl)["data"]
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        conditional: bool = False,
+        validator_store: MutableMapping = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Sends a request through the shared session. Accepts the same arguments as
+        `requests.request`.
+
+        Args:
+            method (str): HTTP method
+            url (str): URL to send request
+            conditional (bool, optional): If True, sends the ETag and Last-Modified
+            of the last response of `url`, so the server may answer 304 (Not Modified)
+            instead of the same payload.
+            validator_store (MutableMapping, optional): Where the validators are
+            kept, ie a `RedisValidatorStore` to share them between flow runs.
+            Defaults to the memory of the client.
+
+        Returns:
+            requests.Response: the response, with the attribute `not_modified` set
+            to True if the payload did not change since the last request (the
+            content is then empty).
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        store = self.validators if validator_store is None else validator_store
+        previous = store.get(url) if conditional else None
+        if previous:
+            headers = dict(kwargs.pop("headers", None) or {})
+            if previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous.get("last_modified"):
+                headers["If-Modified-Since"] = previous["last_modified"]
+            kwargs["headers"] = headers
+
+        response = self.session.request(method, url, **kwargs)
+        response.not_modified = bool(previous) and response.status_code == 304
+
+        size = response.headers.get("Content-Length")
+        if not kwargs.get("stream"):
+            size = len(response.content)
+        with self._lock:
+            self._counters["requests"] += 1
+            pool = getattr(response.raw, "_pool", None)
+            if pool is not None:
+                self._pools.add(pool)
+            if response.not_modified:
+                self._counters["not_modified"] += 1
+                self._counters["bytes_saved"] += previous.get("size") or 0
+            elif size is not None:
+                self._counters["bytes_received"] += int(size)
+
+        if conditional and response.ok and not response.not_modified:
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "size": int(size) if size is not None else None,
+            }
+            if validators["etag"] or validators["last_modified"]:
+                store[url] = validators
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a GET request. See `request`.
+        """
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a POST request. See `request`.
+        """
+        return self.request("POST", url, **kwargs)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Counters of the client. Connections are counted on the urllib3 pools used
+        by the requests, so retries are included.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            pools = list(self._pools)
+        stats["connections_opened"] = sum(pool.num_connections for pool in pools)
+        stats["connections_reused"] = sum(
+            max(0, pool.num_requests - pool.num_connections) for pool in pools
+        )
+        return stats
+
+    def log_stats(self) -> None:
+        """
+        Logs the counters of the client.
+        """
+        stats = self.stats
+        log(
+            f"HTTP client: {stats['requests']} requests, "
+            f"{stats['connections_opened']} connections opened, "
+            f"{stats['connections_reused']} reused, "
+            f"{stats['not_modified']} not modified, "
+            f"{stats['bytes_received']} bytes received, "
+            f"{stats['bytes_saved']} bytes saved"
+        )
+
+    def close(self) -> None:
+        """
+        Closes the pooled connections.
+        """
+        self.session.close()
+
+
+def get_http_client(**kwargs: Any) -> HTTPClient:
+    """
+    Returns the client of this process for the configuration in `kwargs` (see
+    `HTTPClient`), creating it on the first call. Tasks that request the same hosts
+    share the client and, with it, the open connections.
+    """
+    key = tuple(sorted(kwargs.items()))
+    with HTTP_CLIENTS_LOCK:
+        if key not in HTTP_CLIENTS:
+            HTTP_CLIENTS[key] = HTTPClient(**kwargs)
+        return HTTP_CLIENTS[key]
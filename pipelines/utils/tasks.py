@@ -21,6 +21,7 @@ from pipelines.utils.utils import (
     get_username_and_password_from_secret,
     log,
     dump_header_to_file,
+    get_staging_source_format,
 )
 
 ##################
@@ -163,10 +164,12 @@ def create_table_and_upload_to_gcs(
     table_id: str,
     dump_mode: str,
     biglake_table: bool = False,
+    data_type: str = "csv",
     wait=None,  # pylint: disable=unused-argument
 ) -> None:
     """
-    Create table using BD+ and upload to GCS.
+    Create table using BD+ and upload to GCS. `data_type` is the format of the
+    files in `data_path` (csv or parquet).
     """
     # pylint: disable=C0103
     tb = bd.Table(dataset_id=dataset_id, table_id=table_id)
@@ -195,10 +198,18 @@ def create_table_and_upload_to_gcs(
                 f"\n{table_staging}"
                 f"\n{storage_path_link}"
             )
+            # appended files can't have a different format than the table's
+            source_format = get_staging_source_format(tb)
+            if source_format and source_format != data_type:
+                raise ValueError(
+                    f"MODE APPEND: {table_staging} reads {source_format} files, "
+                    f"can't append {data_type} files to it. Use a new table or "
+                    "recreate it with dump_mode='overwrite'"
+                )
         else:
             # the header is needed to create a table when dosen't exist
             log("MODE APPEND: Table DOSEN'T EXISTS\nStart to CREATE HEADER file")
-            header_path = dump_header_to_file(data_path=data_path)
+            header_path = dump_header_to_file(data_path=data_path, data_type=data_type)
             log("MODE APPEND: Created HEADER file:\n" f"{header_path}")
 
             tb.create(
@@ -206,6 +217,7 @@ def create_table_and_upload_to_gcs(
                 if_storage_data_exists="replace",
                 if_table_config_exists="replace",
                 if_table_exists="replace",
+                source_format=data_type,
                 biglake_table=biglake_table,
                 dataset_is_public=dataset_is_public,
             )
@@ -249,7 +261,7 @@ def create_table_and_upload_to_gcs(
         # the header is needed to create a table when dosen't exist
         # in overwrite mode the header is always created
         log("MODE OVERWRITE: Table DOSEN'T EXISTS\nStart to CREATE HEADER file")
-        header_path = dump_header_to_file(data_path=data_path)
+        header_path = dump_header_to_file(data_path=data_path, data_type=data_type)
         log("MODE OVERWRITE: Created HEADER file:\n" f"{header_path}")
 
         tb.create(
@@ -257,6 +269,7 @@ def create_table_and_upload_to_gcs(
             if_storage_data_exists="replace",
             if_table_config_exists="replace",
             if_table_exists="replace",
+            source_format=data_type,
             biglake_table=biglake_table,
             dataset_is_public=dataset_is_public,
         )
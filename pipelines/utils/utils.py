@@ -5,6 +5,9 @@ General utilities for all pipelines.
 """
 
 import base64
+from collections import OrderedDict
+from concurrent.futures import Future
+from copy import deepcopy
 from datetime import datetime
 import json
 import logging
@@ -12,6 +15,8 @@ from os import getenv, walk
 from os.path import join
 from pathlib import Path
 import re
+from threading import Lock
+from time import monotonic
 from typing import Any, Dict, List, Optional, Tuple, Union
 from uuid import uuid4
 
@@ -25,6 +30,9 @@ import numpy as np
 import pandas as pd
 import pendulum
 import prefect
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from prefect.client import Client
 from prefect.engine.state import Skipped, State
 from prefect.run_configs import KubernetesRun
@@ -129,12 +137,117 @@ def get_vault_client() -> hvac.Client:
     )
 
 
-def get_vault_secret(secret_path: str, client: hvac.Client = None) -> dict:
+class VaultSecretCache:
     """
-    Returns a secret from Vault.
+    Process-wide cache of Vault secrets, read with a single shared `hvac.Client`.
+
+    Secrets are kept for `ttl` seconds, or for their lease duration if it is
+    shorter. Concurrent reads of a secret that is not cached wait for a single
+    request to Vault. Counters of hits, misses and coalesced reads are available
+    on `stats`.
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self._client: hvac.Client = None
+        self._secrets: Dict[str, Tuple[float, float, dict]] = {}
+        self._in_flight: Dict[str, Future] = {}
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+        self._lock = Lock()
+
+    @property
+    def client(self) -> hvac.Client:
+        """
+        The Vault client shared by every read, created on first use.
+        """
+        with self._lock:
+            if self._client is None:
+                self._client = get_vault_client()
+            return self._client
+
+    def _fetch(self, secret_path: str) -> Tuple[float, float, dict]:
+        """
+        Reads a secret from Vault, returning it with the time it was read and
+        its expiration time.
+        """
+        response = self.client.secrets.kv.read_secret_version(secret_path)
+        lease = response.get("lease_duration") or 0
+        fetched_at = monotonic()
+        ttl = min(self.ttl, lease) if lease > 0 else self.ttl
+        return fetched_at, fetched_at + ttl, response["data"]
+
+    def get(self, secret_path: str, ttl: float = None) -> dict:
+        """
+        Returns a secret, reading it from Vault only if it is not cached or
+        expired. `ttl` overrides the maximum age of the cached secret.
+        """
+        with self._lock:
+            cached = self._secrets.get(secret_path)
+            if cached is not None:
+                fetched_at, expires_at, secret = cached
+                if ttl is not None:
+                    expires_at = min(expires_at, fetched_at + ttl)
+                if monotonic() < expires_at:
+                    self._counters["hits"] += 1
+                    return deepcopy(secret)
+            future = self._in_flight.get(secret_path)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                owner = False
+            else:
+                self._counters["misses"] += 1
+                future = self._in_flight[secret_path] = Future()
+                owner = True
+
+        if owner:
+            try:
+                fetched_at, expires_at, secret = self._fetch(secret_path)
+            except Exception as exc:
+                with self._lock:
+                    self._counters["errors"] += 1
+                    del self._in_flight[secret_path]
+                future.set_exception(exc)
+                raise
+            with self._lock:
+                self._secrets[secret_path] = (fetched_at, expires_at, secret)
+                del self._in_flight[secret_path]
+            future.set_result(secret)
+        return deepcopy(future.result())
+
+    def invalidate(self, secret_path: str = None) -> None:
+        """
+        Drops a secret from the cache, or every secret if no path is given.
+        """
+        with self._lock:
+            if secret_path is None:
+                self._secrets.clear()
+            else:
+                self._secrets.pop(secret_path, None)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Counters of the cache.
+        """
+        with self._lock:
+            return dict(self._counters, cached=len(self._secrets))
+
+
+VAULT_SECRETS = VaultSecretCache()
+
+
+def get_vault_secret(
+    secret_path: str,
+    client: hvac.Client = None,
+    ttl: float = None,
+) -> dict:
+    """
+    Returns a secret from Vault. Unless a `client` is provided, the secret is
+    read through the process-wide `VAULT_SECRETS` cache (see `VaultSecretCache`).
     """
-    vault_client = client or get_vault_client()
-    return vault_client.secrets.kv.read_secret_version(secret_path)["data"]
+    if client is not None:
+        return client.secrets.kv.read_secret_version(secret_path)["data"]
+    return VAULT_SECRETS.get(secret_path, ttl=ttl)
 
 
 def get_username_and_password_from_secret(
@@ -496,26 +609,131 @@ def dataframe_to_parquet(
     dataframe.to_parquet(path, engine="pyarrow")
 
 
-def batch_to_dataframe(batch: Tuple[Tuple], columns: List[str]) -> pd.DataFrame:
+def batch_to_dataframe(
+    batch: Union[Tuple[Tuple], pa.RecordBatch], columns: List[str], clean: bool = False
+) -> pd.DataFrame:
+    """
+    Converts a batch of rows (or an Arrow record batch) to a dataframe. With
+    `clean`, the dataframe is also cleaned like `clean_dataframe` does. The string
+    columns of record batches are cleaned on the Arrow arrays, before the
+    conversion, and only the other object columns are cleaned in pandas.
+    """
+    if not isinstance(batch, pa.RecordBatch):
+        dataframe = pd.DataFrame(batch, columns=columns)
+        return clean_dataframe(dataframe) if clean else dataframe
+
+    if clean:
+        batch = clean_record_batch(batch)
+    try:
+        dataframe = batch.to_pandas()
+    except pa.ArrowInvalid:
+        # Timestamps out of pandas' nanosecond bounds (e.g. year 1) are kept
+        # as Python objects, just like pd.DataFrame would do.
+        dataframe = batch.to_pandas(timestamp_as_object=True)
+    dataframe.columns = columns
+    if clean:
+        cleaned = [
+            column
+            for column, field in zip(columns, batch.schema)
+            if is_arrow_string(field.type)
+        ]
+        for column in cleaned:
+            # Like `clean_series`: nulls are NaN, columns with only nulls are float
+            notna = dataframe[column].notna()
+            if len(dataframe) > 0 and not notna.any():
+                dataframe[column] = dataframe[column].astype(float)
+            elif not notna.all():
+                dataframe[column] = dataframe[column].where(notna, np.nan)
+        dataframe = clean_dataframe(dataframe, skip_columns=cleaned)
+    return dataframe
+
+
+def clean_series(series: pd.Series) -> pd.Series:
+    """
+    Cleans an object series: removes NUL bytes from strings and converts `None`s
+    and "None" strings to NaN. Every other value is converted to `str`.
+
+    Columns holding only strings and `None`s are checked with Arrow compute
+    kernels instead of being converted with `astype(str)`, and NUL bytes are only
+    replaced if there are any.
+    """
+    if pd.api.types.infer_dtype(series, skipna=True) not in ("string", "empty"):
+        return clean_series_as_str(series)
+
+    values = series.to_numpy(dtype=object)
+    none_mask = np.equal(values, None)
+    try:
+        array = pa.array(values, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return clean_series_as_str(series)
+    if array.null_count != none_mask.sum():
+        # NaN, NaT and pd.NA are kept as their string representation
+        return clean_series_as_str(series)
+
+    if pc.any(pc.match_substring(array, "\x00")).as_py():
+        array = pc.replace_substring(array, "\x00", "")
+        values = array.to_numpy(zero_copy_only=False)
+    else:
+        values = values.copy()
+    none_str_mask = pc.fill_null(pc.equal(array, "None"), False)
+    null_mask = none_mask | none_str_mask.to_numpy(zero_copy_only=False)
+    values[null_mask] = np.nan
+    if len(values) > 0 and null_mask.all():
+        # `replace` infers float for columns left with only NaN
+        return pd.Series(values, index=series.index, name=series.name, dtype=float)
+    return pd.Series(values, index=series.index, name=series.name, dtype=object)
+
+
+def clean_series_as_str(series: pd.Series) -> pd.Series:
+    """
+    Cleans an object series by converting every value to `str`.
+    """
+    return series.astype(str).str.replace("\x00", "").replace("None", np.nan)
+
+
+def is_arrow_string(arrow_type: pa.DataType) -> bool:
     """
-    Converts a batch of rows to a dataframe.
+    Whether an Arrow type is a (large) string.
     """
-    return pd.DataFrame(batch, columns=columns)
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
 
 
-def clean_dataframe(dataframe: pd.DataFrame) -> pd.DataFrame:
+def clean_arrow_array(array: pa.Array) -> pa.Array:
     """
-    Cleans a dataframe.
+    Cleans an Arrow string array: removes NUL bytes and converts "None" strings to
+    null. Arrays of other types are returned as they are.
     """
+    if not is_arrow_string(array.type):
+        return array
+    if pc.any(pc.match_substring(array, "\x00")).as_py():
+        array = pc.replace_substring(array, "\x00", "")
+    none_mask = pc.equal(array, "None")
+    if pc.any(none_mask).as_py():
+        array = pc.if_else(none_mask, pa.scalar(None, type=array.type), array)
+    return array
+
+
+def clean_record_batch(batch: pa.RecordBatch) -> pa.RecordBatch:
+    """
+    Cleans every string column of an Arrow record batch with `clean_arrow_array`.
+    """
+    return pa.RecordBatch.from_arrays(
+        [clean_arrow_array(column) for column in batch.columns],
+        names=batch.schema.names,
+    )
+
+
+def clean_dataframe(
+    dataframe: pd.DataFrame, skip_columns: List[str] = None
+) -> pd.DataFrame:
+    """
+    Cleans a dataframe, except for the columns in `skip_columns`.
+    """
+    skip_columns = set(skip_columns or [])
     for col in dataframe.columns.tolist():
-        if dataframe[col].dtype == object:
+        if col not in skip_columns and dataframe[col].dtype == object:
             try:
-                dataframe[col] = (
-                    dataframe[col]
-                    .astype(str)
-                    .str.replace("\x00", "")
-                    .replace("None", np.nan)
-                )
+                dataframe[col] = clean_series(dataframe[col])
             except Exception as exc:
                 print(
                     "Column: ",
@@ -555,21 +773,286 @@ def remove_columns_accents(dataframe: pd.DataFrame) -> list:
     )
 
 
+class ParquetSink:
+    """
+    Appends dataframes to Parquet files as new row groups.
+
+    One `pyarrow.parquet.ParquetWriter` is kept open per target path, so existing
+    data is never read back nor rewritten. Files that already exist on disk when
+    the target is first opened, batches whose schema can't be cast to the open
+    file's schema and files that reach `max_file_size` bytes are rolled over to
+    a new file named `<stem>_<n>.parquet`. Always call `close` after the last
+    batch, otherwise the Parquet footers won't be written.
+    """
+
+    def __init__(self, max_file_size: int = None) -> None:
+        self._max_file_size = max_file_size
+        self._writers: Dict[Path, Tuple[pq.ParquetWriter, Any, Path]] = {}
+        self._rolls: Dict[Path, int] = {}
+
+    def __enter__(self) -> "ParquetSink":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __contains__(self, path: Union[str, Path]) -> bool:
+        return Path(path) in self._writers
+
+    def __len__(self) -> int:
+        return len(self._writers)
+
+    def _next_file_path(self, path: Path) -> Path:
+        """
+        Returns the first file path for `path` that doesn't exist yet.
+        """
+        file_path = path
+        while file_path.exists():
+            self._rolls[path] = self._rolls.get(path, 0) + 1
+            file_path = path.with_name(f"{path.stem}_{self._rolls[path]}{path.suffix}")
+        return file_path
+
+    def _open(self, path: Path, schema: pa.Schema) -> pq.ParquetWriter:
+        """
+        Opens a new Parquet file for `path`.
+        """
+        file_path = self._next_file_path(path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        sink = pa.OSFile(str(file_path), "wb")
+        writer = pq.ParquetWriter(sink, schema)
+        self._writers[path] = (writer, sink, file_path)
+        return writer
+
+    def write(
+        self,
+        dataframe: pd.DataFrame,
+        path: Union[str, Path],
+        metadata: dict = None,
+        schema: pa.Schema = None,
+    ) -> Path:
+        """
+        Appends a dataframe to the Parquet file at `path`. `metadata` is added to
+        the schema metadata of new files (ie the `geo` key of GeoParquet files).
+        If `schema` is given, the dataframe is converted with it instead of having
+        its schema inferred, so batches with all-null columns don't roll over.
+
+        Returns:
+            The path of the file actually written to.
+        """
+        path = Path(path)
+        table = pa.Table.from_pandas(dataframe, schema=schema, preserve_index=False)
+        if metadata:
+            table = table.replace_schema_metadata(
+                {**(table.schema.metadata or {}), **metadata}
+            )
+        if path in self._writers:
+            writer = self._writers[path][0]
+            if not table.schema.equals(writer.schema, check_metadata=False):
+                try:
+                    table = table.cast(writer.schema)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError):
+                    log(f"Schema changed for {path}, rolling to a new file")
+                    self.close_file(path)
+        if path not in self._writers:
+            self._open(path, table.schema)
+        writer, sink, file_path = self._writers[path]
+        writer.write_table(table)
+        if self._max_file_size and sink.tell() >= self._max_file_size:
+            self.close_file(path)
+        return file_path
+
+    def close_file(self, path: Union[str, Path]) -> None:
+        """
+        Closes the file open for `path`, if any. Next writes go to a new file.
+        """
+        path = Path(path)
+        if path in self._writers:
+            writer, sink, _ = self._writers.pop(path)
+            writer.close()
+            sink.close()
+
+    def close(self) -> None:
+        """
+        Closes every open Parquet file.
+        """
+        for path in list(self._writers):
+            self.close_file(path)
+
+
+class PartitionWriter:
+    """
+    Writes dataframes into a hive partitioned folder tree.
+
+    The dataframe is split in a single groupby pass and every partition file is kept
+    open between calls to `write`, so consecutive batches are appended without
+    re-scanning the whole dataframe for each partition combination. At most
+    `max_open_files` handles are kept open at the same time (least recently used
+    ones are closed first). Always call `close` (or use it as a context manager)
+    after the last batch.
+    """
+
+    # pylint: disable=R0913
+    def __init__(
+        self,
+        savepath: Union[str, Path],
+        data_type: str = "csv",
+        suffix: str = None,
+        build_json_dataframe: bool = False,
+        dataframe_key_column: str = None,
+        max_open_files: int = 256,
+        max_file_size: int = None,
+    ) -> None:
+        if data_type not in ["csv", "parquet"]:
+            raise ValueError(f"Invalid data type: {data_type}")
+        self._savepath = Path(savepath)
+        self._data_type = data_type
+        self._suffix = suffix
+        self._build_json_dataframe = build_json_dataframe
+        self._dataframe_key_column = dataframe_key_column
+        self._max_open_files = max_open_files
+        self._handles: "OrderedDict[Path, Any]" = OrderedDict()
+        self._parquet_sink = ParquetSink(max_file_size=max_file_size)
+
+    def __enter__(self) -> "PartitionWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def check_settings(self, **settings) -> None:
+        """
+        Raises a ValueError if any of the given settings (the arguments of
+        `__init__`, None meaning not given) differs from the writer's.
+        """
+        for name, value in settings.items():
+            if value is None:
+                continue
+            current = getattr(self, f"_{name}")
+            if name == "savepath":
+                value = Path(value)
+            if value != current:
+                raise ValueError(
+                    f"{name}={value!r} doesn't match the partition writer's "
+                    f"{name}={current!r}"
+                )
+
+    def _get_file_path(self, partition_path: str) -> Path:
+        """
+        Returns the file path for a partition, creating its folder if needed.
+        """
+        folder = self._savepath / partition_path
+        folder.mkdir(parents=True, exist_ok=True)
+        if self._suffix is not None:
+            return folder / f"data_{self._suffix}.{self._data_type}"
+        return folder / f"data.{self._data_type}"
+
+    def _evict(self) -> None:
+        """
+        Closes the least recently used file if too many files are open.
+        """
+        if len(self._handles) >= self._max_open_files:
+            oldest_path, oldest = self._handles.popitem(last=False)
+            if oldest is None:
+                self._parquet_sink.close_file(oldest_path)
+            else:
+                oldest.close()
+
+    def _get_csv_handle(self, file_path: Path) -> Tuple[Any, bool]:
+        """
+        Returns an open handle for a CSV file and whether the header must be written.
+        """
+        if file_path in self._handles:
+            self._handles.move_to_end(file_path)
+            return self._handles[file_path], False
+        self._evict()
+        write_header = not file_path.exists() or file_path.stat().st_size == 0
+        # pylint: disable=R1732
+        handle = open(file_path, "a", encoding="utf-8", newline="")
+        self._handles[file_path] = handle
+        return handle, write_header
+
+    def write(self, data: pd.DataFrame, partition_columns: List[str]) -> List[Path]:
+        """
+        Appends a dataframe to its partitions.
+
+        Args:
+            data: Dataframe to be partitioned.
+            partition_columns: List of columns to be used as partitions.
+
+        Returns:
+            The list of files written to.
+        """
+        written = []
+        for values, df_filter in data.groupby(
+            partition_columns, sort=False, dropna=False
+        ):
+            if not isinstance(values, tuple):
+                values = (values,)
+            partition_path = "/".join(
+                f"{partition}={value}"
+                for partition, value in zip(partition_columns, values)
+            )
+            df_filter = df_filter.drop(columns=partition_columns).reset_index(drop=True)
+            if self._build_json_dataframe:
+                df_filter = to_json_dataframe(
+                    df_filter, key_column=self._dataframe_key_column
+                )
+
+            file_path = self._get_file_path(partition_path)
+            if self._data_type == "csv":
+                handle, write_header = self._get_csv_handle(file_path)
+                df_filter.to_csv(handle, index=False, header=write_header)
+            else:
+                if file_path in self._handles:
+                    self._handles.move_to_end(file_path)
+                else:
+                    self._evict()
+                    self._handles[file_path] = None
+                file_path = self._parquet_sink.write(df_filter, file_path)
+            written.append(file_path)
+        return written
+
+    def flush(self) -> None:
+        """
+        Flushes every open partition file.
+        """
+        for handle in self._handles.values():
+            if handle is not None:
+                handle.flush()
+
+    def close(self) -> None:
+        """
+        Closes every open partition file.
+        """
+        while self._handles:
+            _, handle = self._handles.popitem(last=False)
+            if handle is not None:
+                handle.close()
+        self._parquet_sink.close()
+
+
 # pylint: disable=R0913
 def to_partitions(
     data: pd.DataFrame,
     partition_columns: List[str],
     savepath: str,
-    data_type: str = "csv",
+    data_type: str = None,
     suffix: str = None,
-    build_json_dataframe: bool = False,
+    build_json_dataframe: bool = None,
     dataframe_key_column: str = None,
+    partition_writer: PartitionWriter = None,
 ):  # sourcery skip: raise-specific-error
     """Save data in to hive patitions schema, given a dataframe and a list of partition columns.
     Args:
         data (pandas.core.frame.DataFrame): Dataframe to be partitioned.
         partition_columns (list): List of columns to be used as partitions.
         savepath (str, pathlib.PosixPath): folder path to save the partitions
+        partition_writer (PartitionWriter, optional): writer to be reused across
+            calls, keeping partition files open. If not provided, a new one is
+            created and closed before returning. If provided, the other settings
+            given (`savepath`, `data_type`, `suffix`, `build_json_dataframe` and
+            `dataframe_key_column`) must match the writer's, otherwise a
+            ValueError is raised.
     Exemple:
         data = {
             "ano": [2020, 2021, 2020, 2021, 2020, 2021, 2021,2025],
@@ -584,61 +1067,28 @@ def to_partitions(
         )
     """
 
-    if isinstance(data, (pd.core.frame.DataFrame)):
-
-        savepath = Path(savepath)
+    if not isinstance(data, (pd.core.frame.DataFrame)):
+        raise BaseException("Data need to be a pandas DataFrame")
 
-        # create unique combinations between partition columns
-        unique_combinations = (
-            data[partition_columns]
-            .drop_duplicates(subset=partition_columns)
-            .to_dict(orient="records")
+    if partition_writer is not None:
+        partition_writer.check_settings(
+            savepath=savepath,
+            data_type=data_type,
+            suffix=suffix,
+            build_json_dataframe=build_json_dataframe,
+            dataframe_key_column=dataframe_key_column,
         )
+        partition_writer.write(data, partition_columns)
+        return
 
-        for filter_combination in unique_combinations:
-            patitions_values = [
-                f"{partition}={value}"
-                for partition, value in filter_combination.items()
-            ]
-
-            # get filtered data
-            df_filter = data.loc[
-                data[filter_combination.keys()]
-                .isin(filter_combination.values())
-                .all(axis=1),
-                :,
-            ]
-            df_filter = df_filter.drop(columns=partition_columns).reset_index(drop=True)
-
-            # create folder tree
-            filter_save_path = Path(savepath / "/".join(patitions_values))
-            filter_save_path.mkdir(parents=True, exist_ok=True)
-            if suffix is not None:
-                file_filter_save_path = (
-                    Path(filter_save_path) / f"data_{suffix}.{data_type}"
-                )
-            else:
-                file_filter_save_path = Path(filter_save_path) / f"data.{data_type}"
-
-            if build_json_dataframe:
-                df_filter = to_json_dataframe(
-                    df_filter, key_column=dataframe_key_column
-                )
-
-            if data_type == "csv":
-                # append data to csv
-                df_filter.to_csv(
-                    file_filter_save_path,
-                    index=False,
-                    mode="a",
-                    header=not file_filter_save_path.exists(),
-                )
-            elif data_type == "parquet":
-                dataframe_to_parquet(dataframe=df_filter, path=file_filter_save_path)
-            else:
-                raise ValueError(f"Invalid data type: {data_type}")
-    else:
-        raise BaseException("Data need to be a pandas DataFrame")
+    with PartitionWriter(
+        savepath=savepath,
+        data_type=data_type or "csv",
+        suffix=suffix,
+        build_json_dataframe=bool(build_json_dataframe),
+        dataframe_key_column=dataframe_key_column,
+    ) as writer:
+        writer.write(data, partition_columns)
 
 
 def to_json_dataframe(
@@ -794,6 +1244,20 @@ def parser_blobs_to_partition_dict(blobs: list) -> dict:
     return partitions_dict
 
 
+def get_staging_source_format(table: bd.Table) -> Optional[str]:
+    """
+    Returns the format of the files read by the staging table of a BD+ table
+    ("csv", "parquet", ...), or None if it isn't an external table.
+    """
+    bq_table = table.client["bigquery_staging"].get_table(
+        table.table_full_name["staging"]
+    )
+    config = bq_table.external_data_configuration
+    if config is None:
+        return None
+    return config.source_format.lower()
+
+
 def dump_header_to_file(data_path: Union[str, Path], data_type: str = "csv"):
     """
     Writes a header to a CSV file.
@@ -966,7 +1430,75 @@ def compare_dates_between_tables_redis(
     return date_1 < date_2
 
 
-# pylint: disable=W0106
+class WatermarkStore:
+    """
+    Last date (watermark) saved on Redis for each unique_id of a table, kept on
+    the hash `key` as {unique_id: "%Y-%m-%d %H:%M:%S"}. The hash is read once and
+    cached, and new watermarks are written back with a single HSET.
+    """
+
+    DEFAULT_WATERMARK = "1900-01-01 00:00:00"
+    WATERMARK_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+    def __init__(self, key: str, redis_client: RedisPal = None):
+        self.key = key
+        self.redis_client = redis_client or get_redis_client()
+        self._watermarks: Dict[str, str] = None
+
+    @property
+    def watermarks(self) -> Dict[str, str]:
+        """
+        Watermarks saved on Redis, as strings. Read from Redis on first access.
+        """
+        if self._watermarks is None:
+            self._watermarks = {
+                k.decode("utf-8"): v.decode("utf-8")
+                for k, v in self.redis_client.hgetall(self.key).items()
+            }
+        return self._watermarks
+
+    def filter_updated_rows(
+        self,
+        dataframe: pd.DataFrame,
+        unique_id: str,
+        date_column: str,
+        date_format: str,
+    ) -> Tuple[pd.DataFrame, Dict[str, str]]:
+        """
+        Keep only the rows of `dataframe` after the watermark of its unique_id
+        (unique_ids without a watermark are all kept). Returns the rows, with
+        `date_column` parsed and the watermark on a `last_update` column, and the
+        new watermark of each unique_id (its last date on the rows kept).
+        """
+        dataframe = dataframe.reset_index(drop=True)
+        dataframe[date_column] = pd.to_datetime(
+            dataframe[date_column], format=date_format
+        )
+        dataframe["last_update"] = pd.to_datetime(
+            dataframe[unique_id]
+            .map(self.watermarks)
+            .fillna(self.DEFAULT_WATERMARK)
+            .astype(str),
+            format=self.WATERMARK_FORMAT,
+        )
+        dataframe = dataframe[dataframe[date_column] > dataframe["last_update"]].dropna(
+            subset=[unique_id]
+        )
+
+        new_watermarks = dataframe.groupby(unique_id)[date_column].max().astype(str)
+        return dataframe, new_watermarks.to_dict()
+
+    def update(self, new_watermarks: Dict[str, str]) -> None:
+        """
+        Save the new watermarks on Redis with a single HSET
+        """
+        if not new_watermarks:
+            return
+        mapping = {str(k): v for k, v in new_watermarks.items()}
+        self.redis_client.hset(self.key, mapping=mapping)
+        self.watermarks.update(mapping)
+
+
 def save_updated_rows_on_redis(
     dataframe: pd.DataFrame,
     dataset_id: str,
@@ -975,81 +1507,146 @@ def save_updated_rows_on_redis(
     date_column: str = "data_medicao",
     date_format: str = "%Y-%m-%d %H:%M:%S",
     mode: str = "prod",
+    watermark_store: WatermarkStore = None,
 ) -> pd.DataFrame:
     """
     Acess redis to get the last time each unique_id was updated, return
     updated unique_id as a DataFrame and save new dates on redis
     """
+    if watermark_store is None:
+        watermark_store = WatermarkStore(
+            build_redis_key(dataset_id, table_id, mode=mode)
+        )
 
-    redis_client = get_redis_client()
-
-    key = dataset_id + "." + table_id
-    if mode == "dev":
-        key = f"{mode}.{key}"
-
-    # Access all data saved on redis with this key
-    last_updates = redis_client.hgetall(key)
+    dataframe, new_updates = watermark_store.filter_updated_rows(
+        dataframe, unique_id=unique_id, date_column=date_column, date_format=date_format
+    )
+    log(f">>> data to save in redis as a dict: {new_updates}")
 
-    # Convert data in dictionary in format with unique_id in key and last updated time as value
-    # Example > {"12": "2022-06-06 14:45:00"}
-    last_updates = {
-        k.decode("utf-8"): v.decode("utf-8") for k, v in last_updates.items()
-    }
+    # Save this new information on redis
+    watermark_store.update(new_updates)
 
-    # Convert dictionary to dataframe
-    last_updates = pd.DataFrame(
-        last_updates.items(), columns=[unique_id, "last_update"]
-    )
+    return dataframe.reset_index()
 
-    # dataframe and last_updates need to have the same index, in our case unique_id
-    missing_in_dfr = [
-        i
-        for i in last_updates[unique_id].unique()
-        if i not in dataframe[unique_id].unique()
-    ]
-    missing_in_updates = [
-        i
-        for i in dataframe[unique_id].unique()
-        if i not in last_updates[unique_id].unique()
-    ]
 
-    # If unique_id doesn't exists on updates we create a fake date for this station on updates
-    if len(missing_in_updates) > 0:
-        for i in missing_in_updates:
-            last_updates = last_updates.append(
-                {unique_id: i, "last_update": "1900-01-01 00:00:00"},
-                ignore_index=True,
-            )
+class RedisHashState:
+    """
+    State published on Redis as a hash with one field per item (station,
+    occurrence...), each holding the item as JSON, plus a version key that is
+    incremented whenever the state changes. Publishing writes only the fields that
+    changed, in a single transaction, so readers can poll the version key and only
+    read the hash when it changes.
+    """
 
-    # If unique_id doesn't exists on dataframe we remove this stations from last_updates
-    if len(missing_in_dfr) > 0:
-        last_updates = last_updates[~last_updates[unique_id].isin(missing_in_dfr)]
+    def __init__(
+        self, key: str, redis_client: RedisPal = None, version_key: str = None
+    ):
+        self.key = key
+        self.version_key = version_key or f"{key}:version"
+        self.redis_client = redis_client or get_redis_client()
 
-    # Merge dfs using unique_id
-    dataframe = dataframe.merge(last_updates, how="left", on=unique_id)
+    @staticmethod
+    def serialize(value: Any) -> str:
+        """
+        Serialize an item as JSON, with sorted keys so equal items are equal strings
+        """
+        return json.dumps(value, sort_keys=True, default=str)
 
-    # Keep on dataframe only the stations that has a time after the one that is saved on redis
-    dataframe[date_column] = dataframe[date_column].apply(
-        pd.to_datetime, format=date_format
-    )
-    dataframe["last_update"] = dataframe["last_update"].apply(
-        pd.to_datetime, format="%Y-%m-%d %H:%M:%S"
-    )
-    dataframe = dataframe[dataframe[date_column] > dataframe["last_update"]].dropna(
-        subset=[unique_id]
-    )
+    @staticmethod
+    def _decode(value: Union[bytes, str]) -> str:
+        return value.decode("utf-8") if isinstance(value, bytes) else value
 
-    # Keep only the last date for each unique_id
-    keep_cols = [unique_id, date_column]
-    new_updates = dataframe[keep_cols].sort_values(keep_cols)
-    new_updates = new_updates.groupby(unique_id, as_index=False).tail(1)
-    new_updates[date_column] = new_updates[date_column].astype(str)
+    def _parse(self, fields: Dict[Union[bytes, str], bytes]) -> Dict[str, Any]:
+        return {
+            self._decode(field): json.loads(self._decode(value))
+            for field, value in fields.items()
+        }
 
-    # Convert stations with the new updates dates in a dictionary
-    new_updates = dict(zip(new_updates[unique_id], new_updates[date_column]))
-    log(f">>> data to save in redis as a dict: {new_updates}")
+    def read_serialized(self) -> Dict[str, str]:
+        """
+        Returns the items saved on Redis, serialized, by field
+        """
+        return {
+            self._decode(field): self._decode(value)
+            for field, value in self.redis_client.hgetall(self.key).items()
+        }
 
-    # Save this new information on redis
-    [redis_client.hset(key, k, v) for k, v in new_updates.items()]
+    def read(self) -> Dict[str, Any]:
+        """
+        Returns the items saved on Redis, by field
+        """
+        return self._parse(self.redis_client.hgetall(self.key))
 
-    return dataframe.reset_index()
+    def get_version(self) -> int:
+        """
+        Returns the version of the state (0 if it was never published)
+        """
+        # Pipelines don't deserialize values like RedisPal.get does
+        pipeline = self.redis_client.pipeline()
+        pipeline.get(self.version_key)
+        version = pipeline.execute()[0]
+        return int(version) if version is not None else 0
+
+    def read_if_changed(
+        self, known_version: int = None
+    ) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """
+        Returns the current version and the items, or None instead of the items if
+        the version is still `known_version`.
+        """
+        version = self.get_version()
+        if known_version is not None and version == known_version:
+            return version, None
+        pipeline = self.redis_client.pipeline(transaction=True)
+        pipeline.get(self.version_key)
+        pipeline.hgetall(self.key)
+        version, fields = pipeline.execute()
+        return int(version or 0), self._parse(fields)
+
+    @staticmethod
+    def diff(
+        current: Dict[str, str], new: Dict[str, str]
+    ) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Compare two states (serialized items by field). Returns the fields added,
+        changed and removed from `current` to `new`.
+        """
+        added = [field for field in new if field not in current]
+        changed = [
+            field
+            for field, value in new.items()
+            if field in current and current[field] != value
+        ]
+        removed = [field for field in current if field not in new]
+        return added, changed, removed
+
+    def publish(self, items: Dict[Any, Any]) -> Dict[str, Any]:
+        """
+        Make `items` (by field) the published state. Only the fields added or
+        changed are written and the ones not in `items` are removed, in one
+        transaction that also increments the version. Nothing is written if the
+        state didn't change.
+
+        Returns:
+            The fields added, changed and removed, and the version (None if
+            nothing changed).
+        """
+        new = {str(field): self.serialize(value) for field, value in items.items()}
+        added, changed, removed = self.diff(self.read_serialized(), new)
+        version = None
+        if added or changed or removed:
+            pipeline = self.redis_client.pipeline(transaction=True)
+            if added or changed:
+                pipeline.hset(
+                    self.key, mapping={field: new[field] for field in added + changed}
+                )
+            if removed:
+                pipeline.hdel(self.key, *removed)
+            pipeline.incr(self.version_key)
+            version = pipeline.execute()[-1]
+        return {
+            "added": added,
+            "changed": changed,
+            "removed": removed,
+            "version": version,
+        }
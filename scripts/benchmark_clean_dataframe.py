@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks `clean_dataframe` against the previous implementation on a batch
+shaped like the ones produced by dump_db flows.
+
+Usage: python scripts/benchmark_clean_dataframe.py [rows]
+"""
+import sys
+from time import process_time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from pipelines.utils.utils import clean_dataframe
+
+
+def old_clean_dataframe(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Previous implementation of `clean_dataframe`.
+    """
+    for col in dataframe.columns.tolist():
+        if dataframe[col].dtype == object:
+            dataframe[col] = (
+                dataframe[col]
+                .astype(str)
+                .str.replace("\x00", "")
+                .replace("None", np.nan)
+            )
+    return dataframe
+
+
+def build_batch(rows: int) -> pd.DataFrame:
+    """
+    Builds a batch with string columns (some with nulls and NUL bytes), a decimal
+    like object column and numeric columns.
+    """
+    rng = np.random.default_rng(0)
+    names = np.array([f"nome {i}" for i in range(1000)], dtype=object)
+    with_nulls = names[rng.integers(0, 1000, rows)]
+    with_nulls[rng.random(rows) < 0.2] = None
+    with_nul_bytes = names[rng.integers(0, 1000, rows)].copy()
+    with_nul_bytes[rng.random(rows) < 0.01] = "nome\x00 com nul"
+    return pd.DataFrame(
+        {
+            "id": np.arange(rows),
+            "nome": names[rng.integers(0, 1000, rows)],
+            "observacao": with_nulls,
+            "descricao": with_nul_bytes,
+            "codigo": pd.Series(rng.integers(0, 100, rows)).astype(str).astype(object),
+            "valor": rng.random(rows),
+        }
+    )
+
+
+def measure(function, dataframe: pd.DataFrame):
+    """
+    Returns the result, CPU time and peak memory of `function(dataframe)`. Memory
+    is traced on a second run, so tracing doesn't affect the CPU time.
+    """
+    start = process_time()
+    result = function(dataframe.copy())
+    elapsed = process_time() - start
+    tracemalloc.start()
+    function(dataframe.copy())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    """
+    Runs the benchmark.
+    """
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    batch = build_batch(rows)
+    old_result, old_time, old_peak = measure(old_clean_dataframe, batch)
+    new_result, new_time, new_peak = measure(clean_dataframe, batch)
+    assert old_result.to_csv(index=False) == new_result.to_csv(index=False)
+    print(f"rows: {rows}")
+    print(f"old: {old_time:.3f}s CPU, {old_peak / 2**20:.1f} MiB peak")
+    print(f"new: {new_time:.3f}s CPU, {new_peak / 2**20:.1f} MiB peak")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the startup of a process that needs a single flow, importing it
+through `pipelines.flow_registry`, against importing every flow of every project
+(`pipelines.flows`). Each case runs on a new interpreter, measuring the import
+time, the peak RSS and the number of modules loaded.
+
+Usage: python scripts/benchmark_flow_imports.py [flow_name] [--repeat N]
+"""
+import json
+import subprocess
+import sys
+
+CASES = {
+    "interpreter": "pass",
+    "single flow": "from pipelines.flow_registry import get_flow; get_flow({flow!r})",
+    "full import": "import pipelines.flows",
+}
+
+CHILD = """
+import json, resource, sys
+from time import perf_counter
+start = perf_counter()
+{statement}
+elapsed = perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+}}))
+"""
+
+
+def measure(statement: str, repeat: int) -> dict:
+    """
+    Runs `statement` on `repeat` new interpreters, returning the best time and
+    the peak RSS and modules of the last run.
+    """
+    results = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD.format(statement=statement)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {**results[-1], "seconds": min(result["seconds"] for result in results)}
+
+
+def main():
+    """
+    Runs the benchmark.
+    """
+    args = sys.argv[1:]
+    repeat = 3
+    if "--repeat" in args:
+        position = args.index("--repeat")
+        repeat = int(args[position + 1])
+        del args[position : position + 2]
+    flow = args[0] if args else "captura_sppo_v2"
+
+    print(f"Flow: {flow} ({repeat} runs per case)\n")
+    for name, statement in CASES.items():
+        result = measure(statement.format(flow=flow), repeat)
+        print(
+            f"{name:<12} time={result['seconds']:>7.2f}s  "
+            f"rss={result['rss_mb']:>7.1f} MB  "
+            f"modules={result['modules']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks `geocode_addresses` against a local fake geocoder, comparing the
+previous behaviour (one address at a time, no cache) with concurrent workers and
+a cold and a warm cache.
+
+Usage: python scripts/benchmark_geocoding.py [addresses] [latency] [rate]
+"""
+import random
+import sys
+from threading import Lock
+from time import monotonic, sleep
+
+from pipelines.utils.georeference.utils import GeocodingCache, geocode_addresses
+
+
+class FakeGeocoder:
+    """
+    Geocoder that answers after `latency` seconds, like a remote API, and counts
+    how many calls it received.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self._lock = Lock()
+
+    def __call__(self, address: str) -> list:
+        with self._lock:
+            self.calls += 1
+        sleep(self.latency)
+        seed = sum(ord(char) for char in address.lower())
+        return [-22.9 + (seed % 100) / 1000, -43.2 + (seed % 37) / 1000]
+
+
+class InMemoryRedis:
+    """
+    Stands in for Redis with the pipeline commands used by `GeocodingCache`
+    (expiration is ignored).
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self):
+        """
+        Returns a pipeline that runs the commands on `execute`.
+        """
+        return InMemoryPipeline(self.data)
+
+
+class InMemoryPipeline:
+    """
+    Pipeline of `InMemoryRedis`.
+    """
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.commands = []
+
+    def get(self, key: str):
+        """
+        Queues a GET.
+        """
+        self.commands.append(lambda: self.data.get(key))
+
+    def set(self, key: str, value: str, ex: int = None):  # pylint: disable=C0103,W0613
+        """
+        Queues a SET.
+        """
+        self.commands.append(lambda: self.data.__setitem__(key, value.encode()))
+
+    def execute(self) -> list:
+        """
+        Runs the queued commands.
+        """
+        return [command() for command in self.commands]
+
+
+def build_addresses(count: int) -> list:
+    """
+    Builds addresses with repetitions and spelling variations of the same street,
+    like the ones found on the source tables.
+    """
+    rng = random.Random(0)
+    streets = [
+        ("Rua", "R."),
+        ("Avenida", "Av."),
+        ("Estrada", "Estr."),
+        ("Praça", "Pça"),
+    ]
+    names = [f"São João {i}" for i in range(max(1, count // 20))]
+    addresses = []
+    for _ in range(count):
+        full, short = rng.choice(streets)
+        kind = rng.choice([full, short, full.upper()])
+        name = rng.choice(names)
+        if rng.random() < 0.3:
+            name = name.replace("São", "Sao")
+        addresses.append(f"{kind} {name}, {rng.randint(1, 5)}, Rio de Janeiro")
+    return addresses
+
+
+def run(name: str, addresses: list, latency: float, **kwargs) -> None:
+    """
+    Geocodes `addresses` and prints the statistics.
+    """
+    geocoder = FakeGeocoder(latency)
+    start = monotonic()
+    _, stats = geocode_addresses(
+        addresses, geocode=geocoder, log_divider=10**9, **kwargs
+    )
+    elapsed = monotonic() - start
+    print(
+        f"{name:<32} calls={geocoder.calls:>5}  "
+        f"hit rate={stats['cache_hit_rate']:>6.1%}  "
+        f"time={elapsed:>7.2f}s  "
+        f"throughput={len(addresses) / elapsed:>8.1f} addresses/s"
+    )
+
+
+def main():
+    """
+    Runs the benchmark.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 50
+    addresses = build_addresses(count)
+    print(f"{count} addresses, {latency}s per call, {rate} calls/s per provider\n")
+
+    # Previous behaviour: every address is sent, in series
+    geocoder = FakeGeocoder(latency)
+    start = monotonic()
+    for address in addresses:
+        sleep(max(0.0, 1 / rate - latency))
+        geocoder(address)
+    elapsed = monotonic() - start
+    print(
+        f"{'serial, no cache':<32} calls={geocoder.calls:>5}  "
+        f"hit rate={0:>6.1%}  time={elapsed:>7.2f}s  "
+        f"throughput={count / elapsed:>8.1f} addresses/s"
+    )
+
+    cache = GeocodingCache(redis_client=InMemoryRedis())
+    options = {"rate": rate, "max_workers": 8, "cache": cache}
+    run("concurrent, cold cache", addresses, latency, provider="fake", **options)
+    run("concurrent, warm cache", addresses, latency, provider="fake", **options)
+    # Part of the addresses are new, like on the next run
+    run(
+        "concurrent, next run",
+        addresses[: count // 2] + build_addresses(count * 2)[count:],
+        latency,
+        provider="fake",
+        **options,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the shared GPS treatment (`treat_gps_payload`) against the previous
+SPPO (onibus) treatment, on recorded API payloads or, if none is given, on a
+synthetic payload shaped like the v2 API response.
+
+Usage: python scripts/benchmark_gps_treatment.py [payload.json ...] [--vehicles N]
+"""
+from datetime import datetime, timedelta
+import json
+import sys
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from pipelines.rj_smtr.constants import constants
+from pipelines.rj_smtr.utils import treat_gps_payload
+
+TIMEZONE = constants.TIMEZONE.value
+COLUMNS = [
+    "ordem",
+    "latitude",
+    "longitude",
+    "datahora",
+    "velocidade",
+    "linha",
+    "timestamp_captura",
+]
+
+
+def old_treatment(data: list, timestamp: datetime) -> pd.DataFrame:
+    """
+    Previous treatment of `pre_treatment_br_rj_riodejaneiro_onibus_gps` (v2).
+    """
+    df_gps = pd.DataFrame(data)
+    df_gps["timestamp_captura"] = timestamp
+    for col in ["datahora", "datahoraenvio"]:
+        df_gps[col] = (
+            pd.to_datetime(df_gps[col].astype(float), unit="ms")
+            .dt.tz_localize(tz="UTC")
+            .dt.tz_convert(TIMEZONE)
+        )
+    time_delay = constants.GPS_SPPO_CAPTURE_DELAY_V2.value
+    mask = (df_gps["datahoraenvio"] - df_gps["datahora"]).apply(
+        lambda x: timedelta(seconds=0) <= x <= timedelta(minutes=time_delay)
+    )
+    df_gps = df_gps[mask][COLUMNS]
+    return df_gps.drop_duplicates(
+        ["ordem", "latitude", "longitude", "datahora", "timestamp_captura"]
+    )
+
+
+def new_treatment(data: list, timestamp: datetime) -> pd.DataFrame:
+    """
+    Current treatment of `pre_treatment_br_rj_riodejaneiro_onibus_gps` (v2).
+    """
+    dataframe, _ = treat_gps_payload(
+        data,
+        timestamp,
+        delay_filters=[
+            {
+                "column": "datahora",
+                "reference_column": "datahoraenvio",
+                "max_delay": timedelta(
+                    minutes=constants.GPS_SPPO_CAPTURE_DELAY_V2.value
+                ),
+            }
+        ],
+        output_columns=COLUMNS,
+        duplicated_subset=[
+            "ordem",
+            "latitude",
+            "longitude",
+            "datahora",
+            "timestamp_captura",
+        ],
+        columns=COLUMNS[:-1] + ["datahoraenvio"],
+        timestamp_columns=["datahora", "datahoraenvio"],
+    )
+    return dataframe
+
+
+def build_payload(vehicles: int) -> list:
+    """
+    Builds a payload with `vehicles` vehicles sending 10 points each, with stale
+    points and repeated points, like the v2 API does.
+    """
+    rng = np.random.default_rng(0)
+    now = int(datetime.now().timestamp() * 1000)
+    rows = vehicles * 10
+    ordem = rng.integers(0, vehicles, rows)
+    datahora = now - rng.integers(0, 90 * 60 * 1000, rows)
+    envio = datahora + rng.integers(-60 * 1000, 70 * 60 * 1000, rows)
+    payload = [
+        {
+            "ordem": f"A{ordem[i]:05d}",
+            "latitude": f"-22,{rng.integers(0, 10**6):06d}",
+            "longitude": f"-43,{rng.integers(0, 10**6):06d}",
+            "datahora": str(datahora[i]),
+            "velocidade": str(rng.integers(0, 80)),
+            "linha": str(rng.integers(100, 999)),
+            "datahoraenvio": str(envio[i]),
+            "datahoraservidor": str(envio[i] + 1000),
+        }
+        for i in range(rows)
+    ]
+    return payload + payload[: rows // 10]
+
+
+def measure(function, data: list, timestamp: datetime, repeat: int = 5):
+    """
+    Returns the result and the best time of `repeat` runs.
+    """
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        result = function(data, timestamp)
+        times.append(perf_counter() - start)
+    return result, min(times)
+
+
+def main():
+    """
+    Runs the benchmark.
+    """
+    args = sys.argv[1:]
+    vehicles = 5000
+    if "--vehicles" in args:
+        position = args.index("--vehicles")
+        vehicles = int(args[position + 1])
+        del args[position : position + 2]
+
+    payloads = []
+    for path in args:
+        with open(path, encoding="utf-8") as file:
+            payload = json.load(file)
+        payloads.append((path, payload.get("veiculos", payload)))
+    if not payloads:
+        payloads.append((f"synthetic ({vehicles} vehicles)", build_payload(vehicles)))
+
+    timestamp = datetime.now(tz=pd.Timestamp.now(tz=TIMEZONE).tzinfo).replace(
+        second=0, microsecond=0
+    )
+    for name, data in payloads:
+        old, old_time = measure(old_treatment, data, timestamp)
+        new, new_time = measure(new_treatment, data, timestamp)
+        pd.testing.assert_frame_equal(old, new)
+        print(
+            f"{name}: {len(data)} points -> {len(new)} treated | "
+            f"previous: {old_time * 1000:.1f} ms | "
+            f"shared: {new_time * 1000:.1f} ms | "
+            f"speedup: {old_time / new_time:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
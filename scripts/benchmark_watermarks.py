@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks `save_updated_rows_on_redis` (now backed by `WatermarkStore`) against
+its previous implementation, on synthetic station measurements and an in-memory
+Redis with a fixed latency per command. Asserts that both return the same rows
+and save the same watermarks.
+
+Usage: python scripts/benchmark_watermarks.py [stations] [measurements] [latency_ms]
+"""
+import sys
+from time import perf_counter, sleep
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from pipelines.utils.utils import save_updated_rows_on_redis, WatermarkStore
+
+
+class InMemoryRedis:
+    """
+    Stands in for Redis with the hash commands used by the watermarks, sleeping
+    `latency` seconds per command, like a round trip, and counting the commands.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.commands = 0
+        self.data = {}
+
+    def _round_trip(self):
+        self.commands += 1
+        sleep(self.latency)
+
+    def hgetall(self, key: str) -> dict:
+        """
+        Returns the hash as bytes, like Redis.
+        """
+        self._round_trip()
+        return {
+            k.encode("utf-8"): v.encode("utf-8")
+            for k, v in self.data.get(key, {}).items()
+        }
+
+    def hset(self, key: str, field: str = None, value: str = None, mapping=None):
+        """
+        Sets one field or, with `mapping`, many fields at once.
+        """
+        self._round_trip()
+        fields = dict(mapping or {})
+        if field is not None:
+            fields[field] = value
+        self.data.setdefault(key, {}).update(
+            {str(k): str(v) for k, v in fields.items()}
+        )
+
+
+# pylint: disable=W0106
+def previous_save_updated_rows_on_redis(
+    dataframe: pd.DataFrame,
+    redis_client: InMemoryRedis,
+    key: str,
+    unique_id: str = "id_estacao",
+    date_column: str = "data_medicao",
+    date_format: str = "%Y-%m-%d %H:%M:%S",
+) -> pd.DataFrame:
+    """
+    Previous implementation of `save_updated_rows_on_redis`.
+    """
+    last_updates = redis_client.hgetall(key)
+    last_updates = {
+        k.decode("utf-8"): v.decode("utf-8") for k, v in last_updates.items()
+    }
+    last_updates = pd.DataFrame(
+        last_updates.items(), columns=[unique_id, "last_update"]
+    )
+    missing_in_dfr = [
+        i
+        for i in last_updates[unique_id].unique()
+        if i not in dataframe[unique_id].unique()
+    ]
+    missing_in_updates = [
+        i
+        for i in dataframe[unique_id].unique()
+        if i not in last_updates[unique_id].unique()
+    ]
+    if len(missing_in_updates) > 0:
+        for i in missing_in_updates:
+            last_updates = last_updates.append(
+                {unique_id: i, "last_update": "1900-01-01 00:00:00"},
+                ignore_index=True,
+            )
+    if len(missing_in_dfr) > 0:
+        last_updates = last_updates[~last_updates[unique_id].isin(missing_in_dfr)]
+    dataframe = dataframe.merge(last_updates, how="left", on=unique_id)
+    dataframe[date_column] = dataframe[date_column].apply(
+        pd.to_datetime, format=date_format
+    )
+    dataframe["last_update"] = dataframe["last_update"].apply(
+        pd.to_datetime, format="%Y-%m-%d %H:%M:%S"
+    )
+    dataframe = dataframe[dataframe[date_column] > dataframe["last_update"]].dropna(
+        subset=[unique_id]
+    )
+    keep_cols = [unique_id, date_column]
+    new_updates = dataframe[keep_cols].sort_values(keep_cols)
+    new_updates = new_updates.groupby(unique_id, as_index=False).tail(1)
+    new_updates[date_column] = new_updates[date_column].astype(str)
+    new_updates = dict(zip(new_updates[unique_id], new_updates[date_column]))
+    [redis_client.hset(key, k, v) for k, v in new_updates.items()]
+    return dataframe.reset_index()
+
+
+def build_measurements(stations: int, measurements: int, start: str) -> pd.DataFrame:
+    """
+    Builds `measurements` measurements every 5 minutes for each station, starting
+    at `start`, in random order.
+    """
+    rng = np.random.default_rng(0)
+    dates = pd.date_range(start, periods=measurements, freq="5min")
+    dataframe = pd.DataFrame(
+        {
+            "id_estacao": np.repeat([str(i) for i in range(stations)], measurements),
+            "data_medicao": np.tile(dates.strftime("%Y-%m-%d %H:%M:%S"), stations),
+            "acumulado_chuva_15_min": rng.random(stations * measurements),
+        }
+    )
+    return dataframe.sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+def main():
+    """
+    Runs the benchmark: a first run with an empty Redis and a second run with
+    half of the measurements already saved.
+    """
+    stations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    measurements = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 0.5) / 1000
+    key = "benchmark.watermarks"
+    first = build_measurements(stations, measurements, "2023-01-01 00:00:00")
+    # The next run overlaps half of the measurements of the first one
+    overlap = pd.Timestamp("2023-01-01") + pd.Timedelta(minutes=5 * measurements // 2)
+    second = build_measurements(stations, measurements, str(overlap))
+    print(
+        f"{stations} stations, {len(first)} rows per run, "
+        f"{latency * 1000:.1f} ms per Redis command\n"
+    )
+
+    previous_redis, redis = InMemoryRedis(latency), InMemoryRedis(latency)
+    for name, data in [("first run", first), ("next run", second)]:
+        previous_commands, commands = previous_redis.commands, redis.commands
+
+        start = perf_counter()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            expected = previous_save_updated_rows_on_redis(data, previous_redis, key)
+        previous_time = perf_counter() - start
+
+        start = perf_counter()
+        result = save_updated_rows_on_redis(
+            data,
+            "benchmark",
+            "watermarks",
+            watermark_store=WatermarkStore(key, redis_client=redis),
+        )
+        new_time = perf_counter() - start
+
+        pd.testing.assert_frame_equal(expected, result)
+        assert previous_redis.data == redis.data
+        print(
+            f"{name}: {len(result)} rows kept | "
+            f"previous: {previous_time * 1000:.0f} ms, "
+            f"{previous_redis.commands - previous_commands} commands | "
+            f"watermark store: {new_time * 1000:.0f} ms, "
+            f"{redis.commands - commands} commands | "
+            f"speedup: {previous_time / new_time:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()